@@ -0,0 +1,346 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : benchmark_installer.py
+'''
+import sys, os, logging, argparse, json, time
+import base64, contextlib, hashlib, shutil, subprocess, tempfile, threading, zipfile
+import http.server
+
+installerDirectory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, installerDirectory)
+
+logger = logging.getLogger(__name__)
+
+benchmarkToken = "benchmark-token"
+benchmarkRelease = "2023R3"
+sharedSubmoduleName = "sca-codeinsight-reports-common"
+fixtureCatalogFileName = "catalog.json"
+numberOfPackages = 5   # Packages in the local wheelhouse shared between the synthetic reports
+
+# Local repositories are used for the reports and their submodules so allow the file protocol
+gitEnvironment = {}
+gitEnvironment["GIT_CONFIG_COUNT"] = "1"
+gitEnvironment["GIT_CONFIG_KEY_0"] = "protocol.file.allow"
+gitEnvironment["GIT_CONFIG_VALUE_0"] = "always"
+gitEnvironment["GIT_AUTHOR_NAME"] = gitEnvironment["GIT_COMMITTER_NAME"] = "benchmark"
+gitEnvironment["GIT_AUTHOR_EMAIL"] = gitEnvironment["GIT_COMMITTER_EMAIL"] = "benchmark@localhost"
+
+registrationScript = '''import logging
+if __name__ == "__main__":
+    logging.basicConfig(filename="_registration.log", filemode="w", level=logging.DEBUG)
+    logging.info("Registering benchmark report")
+    print("Report registration succeeded!")
+
+def register_report(context):
+    return {"success" : True, "message" : "Registered in process"}
+
+def update_report(context):
+    return {"success" : True, "message" : "Updated in process"}
+'''
+
+scenarios = ["fresh-install", "no-op-update", "partial-update"]
+
+####################################################################################
+# Create command line argument options
+parser = argparse.ArgumentParser(description="Time install_reports.main() against local stand-ins for git, PyPI and Code Insight")
+parser.add_argument("-sizes", "--sizes", default="10,50,200", help="Comma separated numbers of reports to benchmark (Default: 10,50,200)")
+parser.add_argument("-updateFraction", "--updateFraction", type=float, default=0.1, help="Fraction of the reports changed for the partial-update scenario (Default: 0.1)")
+parser.add_argument("-workDir", "--workDir", help="Folder for the benchmark fixtures (Default: a temporary folder that is removed afterwards)")
+parser.add_argument("-json", "--json", help="Write the results to this JSON file")
+parser.add_argument("-runInstaller", "--runInstaller", metavar="FIXTURE", help=argparse.SUPPRESS)  # Runs one scenario in this process
+parser.add_argument("-scenario", "--scenario", help=argparse.SUPPRESS)
+parser.add_argument("installerArguments", nargs=argparse.REMAINDER, help="Additional install_reports.py arguments after --, for example -- -jobs 8 -gitCache")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def main():
+
+    args = parser.parse_args()
+
+    installerArguments = args.installerArguments
+    if installerArguments and installerArguments[0] == "--":
+        installerArguments = installerArguments[1:]
+
+    if args.runInstaller:
+        run_installer_process(args.runInstaller, args.scenario, installerArguments)
+        return
+
+    reportCounts = [int(size) for size in args.sizes.split(",")]
+
+    workDir = os.path.abspath(args.workDir) if args.workDir else tempfile.mkdtemp(prefix="installer_benchmark_")
+    if not os.path.isdir(workDir):
+        os.makedirs(workDir)
+
+    os.environ.update(gitEnvironment)
+
+    os.environ["PIP_UPGRADE"] = "1"
+    os.environ["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+
+    codeInsightServer = start_codeinsight_stub()
+    serverURL = "http://127.0.0.1:%s" %codeInsightServer.server_address[1]
+
+    wheelhouse = build_wheelhouse(os.path.join(workDir, "wheelhouse"))
+
+    benchmarkResults = []
+    try:
+        for reportCount in reportCounts:
+            print("Benchmarking %s report(s)" %reportCount)
+            fixtureFolder = os.path.join(workDir, "reports_%s" %reportCount)
+            if os.path.isdir(fixtureFolder):
+                shutil.rmtree(fixtureFolder)
+
+            fixture = build_fixture(fixtureFolder, reportCount)
+
+            # Pip installs into a scratch folder for each fixture rather than the interpreter running the benchmark
+            os.environ["PIP_TARGET"] = os.path.join(fixtureFolder, "site-packages")
+
+            installerArgs = ["-server", serverURL, "-token", benchmarkToken, "-installDir", fixture["installDir"], "-wheelhouse", wheelhouse] + installerArguments
+
+            for scenario in scenarios:
+                if scenario == "partial-update":
+                    update_reports(fixture, args.updateFraction)
+
+                benchmarkResult = run_installer(fixtureFolder, scenario, installerArgs)
+                benchmarkResult["reports"] = reportCount
+                benchmarkResult["scenario"] = scenario
+                benchmarkResults.append(benchmarkResult)
+
+                print("    %-16s %10.2f seconds%s" %(scenario, benchmarkResult["seconds"], "" if benchmarkResult["completed"] else "  (did not complete, see %s)" %benchmarkResult["outputFile"]))
+    finally:
+        codeInsightServer.shutdown()
+        if not args.workDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    print_results(benchmarkResults, installerArguments)
+
+    if args.json:
+        benchmarkReport = {}
+        benchmarkReport["installerArguments"] = installerArguments
+        benchmarkReport["pythonVersion"] = sys.version.split()[0]
+        benchmarkReport["results"] = benchmarkResults
+        with open(args.json, "w") as filePtr:
+            json.dump(benchmarkReport, filePtr, indent=4)
+        print("Results written to %s" %args.json)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_installer(fixtureFolder, scenario, installerArgs):
+
+    # Each scenario runs in its own interpreter so nothing the installer keeps at module level
+    # (settings, reference store fetches, run timings) carries over from the previous scenario
+    outputFile = os.path.join(fixtureFolder, scenario + ".log")
+    resultFile = os.path.join(fixtureFolder, scenario + ".json")
+    if os.path.isfile(resultFile):
+        os.remove(resultFile)
+
+    runCommand = [sys.executable, os.path.realpath(__file__), "-runInstaller", fixtureFolder, "-scenario", scenario, "--"] + installerArgs
+
+    startTime = time.perf_counter()
+    with open(outputFile, "w") as filePtr:
+        subprocess.run(runCommand, cwd=fixtureFolder, stdout=filePtr, stderr=subprocess.STDOUT)
+    elapsedTime = time.perf_counter() - startTime
+
+    # The time taken by main() itself, without starting the interpreter, if the scenario got that far
+    try:
+        with open(resultFile, "r") as filePtr:
+            benchmarkResult = json.load(filePtr)
+    except (OSError, ValueError):
+        benchmarkResult = {"seconds" : round(elapsedTime, 3), "completed" : False}
+
+    benchmarkResult["outputFile"] = outputFile
+    return benchmarkResult
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_installer_process(fixtureFolder, scenario, installerArgs):
+
+    # Requirements are installed into the fixture's scratch folder so put it on the path for the
+    # installer to find what is installed there when it checks whether requirements are current
+    sys.path.insert(0, os.environ["PIP_TARGET"])
+
+    with open(os.path.join(fixtureFolder, fixtureCatalogFileName), "r") as filePtr:
+        fixtureCatalog = json.load(filePtr)
+
+    import install_reports, report_repositories
+
+    # The installer reads the report list from the report_repositories catalog
+    del report_repositories.reportCatalog[:]
+    for reportRemote in fixtureCatalog["remotes"]:
+        report_repositories.add_report(reportRemote, tags=["benchmark"])
+
+    # Use the benchmark's interpreter for pip and registration rather than sudo and the system python
+    install_reports.pythonCommand = [sys.executable]
+    install_reports.pipCommand = [sys.executable, "-m", "pip"]
+
+    # Report logs are copied next to the installer so keep them with the fixture instead
+    install_reports.installerDirectory = fixtureFolder
+
+    sys.argv = ["install_reports.py"] + installerArgs
+
+    completed = True
+    startTime = time.perf_counter()
+    try:
+        install_reports.main()
+    except SystemExit:
+        completed = False
+    elapsedTime = time.perf_counter() - startTime
+
+    with open(os.path.join(fixtureFolder, scenario + ".json"), "w") as filePtr:
+        json.dump({"seconds" : round(elapsedTime, 3), "completed" : completed}, filePtr)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def print_results(benchmarkResults, installerArguments):
+
+    print("")
+    print("**************************************")
+    print("Installer Benchmark  %s" %" ".join(installerArguments))
+    print("    %-8s %-16s %12s" %("Reports", "Scenario", "Seconds"))
+    for benchmarkResult in benchmarkResults:
+        print("    %-8s %-16s %12.2f" %(benchmarkResult["reports"], benchmarkResult["scenario"], benchmarkResult["seconds"]))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def build_fixture(fixtureFolder, reportCount):
+    logger.info("Building fixture with %s reports in %s" %(reportCount, fixtureFolder))
+
+    fixture = {}
+    fixture["remotes"] = os.path.join(fixtureFolder, "remotes")
+    fixture["sources"] = os.path.join(fixtureFolder, "sources")
+    fixture["installDir"] = os.path.join(fixtureFolder, "codeinsight")
+    fixture["reports"] = []
+
+    # Folders install_reports.py expects in a Code Insight installation
+    for folder in ["tomcat", "jre", "logs", "7-zip", "dbScripts"]:
+        os.makedirs(os.path.join(fixture["installDir"], folder))
+    os.makedirs(fixture["remotes"])
+    os.makedirs(fixture["sources"])
+
+    # Every report shares one submodule as the real reports do
+    submoduleSource = os.path.join(fixture["sources"], sharedSubmoduleName)
+    os.makedirs(submoduleSource)
+    run_git(["init", "-q"], submoduleSource)
+    write_file(os.path.join(submoduleSource, "common_functions.py"), "def get_common_value():\n    return 1\n")
+    run_git(["add", "."], submoduleSource)
+    run_git(["commit", "-q", "-m", "Common functions"], submoduleSource)
+    submoduleRemote = os.path.join(fixture["remotes"], sharedSubmoduleName + ".git")
+    run_git(["clone", "-q", "--bare", submoduleSource, submoduleRemote], fixture["sources"])
+
+    for reportNumber in range(reportCount):
+        reportName = "sca-codeinsight-reports-benchmark-%03d" %reportNumber
+        reportSource = os.path.join(fixture["sources"], reportName)
+        reportRemote = os.path.join(fixture["remotes"], reportName + ".git")
+
+        os.makedirs(reportSource)
+        run_git(["init", "-q"], reportSource)
+        write_file(os.path.join(reportSource, "requirements.txt"), "benchmark-package-%s>=1.0\nbenchmark-package-shared\n" %(reportNumber % numberOfPackages))
+        write_file(os.path.join(reportSource, "registration.py"), registrationScript)
+        write_file(os.path.join(reportSource, "report.py"), "REPORT_NAME = %r\n" %reportName)
+        run_git(["submodule", "add", "-q", submoduleRemote, "common"], reportSource)
+        run_git(["add", "."], reportSource)
+        run_git(["commit", "-q", "-m", "Initial version"], reportSource)
+        run_git(["tag", "-a", "-m", "Version 1.0.0", "1.0.0"], reportSource)
+
+        run_git(["clone", "-q", "--bare", reportSource, reportRemote], fixture["sources"])
+        run_git(["remote", "add", "origin", reportRemote], reportSource)
+
+        fixture["reports"].append({"reportName" : reportName, "source" : reportSource, "remote" : reportRemote})
+
+    # Each scenario's installer process builds its report catalog from this
+    with open(os.path.join(fixtureFolder, fixtureCatalogFileName), "w") as filePtr:
+        json.dump({"remotes" : [report["remote"] for report in fixture["reports"]]}, filePtr, indent=4)
+
+    return fixture
+
+#------------------------------------------------------------------------------------------------------------------------------
+def update_reports(fixture, updateFraction):
+
+    numberOfUpdates = max(1, int(len(fixture["reports"]) * updateFraction))
+    logger.info("Updating %s report(s)" %numberOfUpdates)
+
+    for report in fixture["reports"][:numberOfUpdates]:
+        write_file(os.path.join(report["source"], "report.py"), "REPORT_NAME = %r\nREPORT_UPDATED = True\n" %report["reportName"])
+        run_git(["commit", "-q", "-a", "-m", "Update report"], report["source"])
+        run_git(["tag", "-a", "-m", "Version 1.0.1", "1.0.1"], report["source"])
+        run_git(["push", "-q", "--follow-tags", "origin", "HEAD"], report["source"])
+
+#------------------------------------------------------------------------------------------------------------------------------
+def build_wheelhouse(wheelhouse):
+
+    if not os.path.isdir(wheelhouse):
+        os.makedirs(wheelhouse)
+
+    packageNames = ["benchmark-package-%s" %packageNumber for packageNumber in range(numberOfPackages)] + ["benchmark-package-shared"]
+    for packageName in packageNames:
+        write_wheel(wheelhouse, packageName, "1.0")
+
+    return wheelhouse
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_wheel(wheelhouse, packageName, version):
+    # A minimal pure python wheel so pip has something real to install without a package index
+    moduleName = packageName.replace("-", "_")
+    distInfo = "%s-%s.dist-info" %(moduleName, version)
+
+    wheelFiles = {}
+    wheelFiles["%s/__init__.py" %moduleName] = "__version__ = %r\n" %version
+    wheelFiles["%s/METADATA" %distInfo] = "Metadata-Version: 2.1\nName: %s\nVersion: %s\n" %(packageName, version)
+    wheelFiles["%s/WHEEL" %distInfo] = "Wheel-Version: 1.0\nGenerator: benchmark_installer\nRoot-Is-Purelib: true\nTag: py3-none-any\n"
+
+    recordLines = []
+    for fileName in wheelFiles:
+        digest = base64.urlsafe_b64encode(hashlib.sha256(wheelFiles[fileName].encode()).digest()).rstrip(b"=").decode()
+        recordLines.append("%s,sha256=%s,%s" %(fileName, digest, len(wheelFiles[fileName].encode())))
+    recordLines.append("%s/RECORD,," %distInfo)
+    wheelFiles["%s/RECORD" %distInfo] = "\n".join(recordLines) + "\n"
+
+    wheelFile = os.path.join(wheelhouse, "%s-%s-py3-none-any.whl" %(moduleName, version))
+    with zipfile.ZipFile(wheelFile, "w") as wheelZip:
+        for fileName in wheelFiles:
+            wheelZip.writestr(fileName, wheelFiles[fileName])
+
+#------------------------------------------------------------------------------------------------------------------------------
+def start_codeinsight_stub():
+
+    class CodeInsightHandler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if not self.path.endswith("/codeinsight/api/v1/agent/supports"):
+                self.send_error(404)
+                return
+            if self.headers.get("Authorization") != "Bearer " + benchmarkToken:
+                self.send_response(401)
+                self.end_headers()
+                self.wfile.write(b"Unauthorized")
+                return
+
+            # The server wraps the release details in a JSON string
+            responseBody = json.dumps({"Content: " : json.dumps({"fnci.release.name" : benchmarkRelease})}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(responseBody)))
+            self.end_headers()
+            self.wfile.write(responseBody)
+
+        def log_message(self, format, *args):
+            logger.debug(format %args)
+
+    codeInsightServer = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CodeInsightHandler)
+    serverThread = threading.Thread(target=codeInsightServer.serve_forever, name="codeinsight_stub", daemon=True)
+    serverThread.start()
+
+    return codeInsightServer
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_git(gitArgs, workingDirectory):
+    subprocess.run(["git"] + gitArgs, cwd=workingDirectory, check=True, stdout=subprocess.DEVNULL)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_file(fileName, contents):
+    with open(fileName, "w") as filePtr:
+        filePtr.write(contents)
+
+
+#----------------------------------------------------------------------#
+if __name__ == "__main__":
+    main()
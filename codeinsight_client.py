@@ -0,0 +1,103 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : codeinsight_client.py
+'''
+import logging, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Default settings for all REST calls made to the Code Insight server
+clientSettings = {}
+clientSettings["connectTimeout"] = 10   # Seconds to wait for the connection to be established
+clientSettings["readTimeout"] = 60      # Seconds to wait for the server to respond
+clientSettings["maxRetries"] = 3        # Retries for connection errors and 5xx responses
+clientSettings["backoffFactor"] = 1     # Seconds to wait before the first retry, doubled for each retry after that
+clientSettings["maxBackoff"] = 60       # Longest wait between retries, including a server's Retry-After time
+clientSettings["poolSize"] = 10         # Keep-alive connections held per host
+
+retryStatusCodes = [429, 500, 502, 503, 504]
+
+sessionLock = threading.Lock()
+session = None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def configure_client(**settings):
+    global session
+
+    for setting in settings:
+        if setting not in clientSettings:
+            raise ValueError("Unknown client setting: %s" %setting)
+        if settings[setting] is not None:
+            clientSettings[setting] = settings[setting]
+
+    # Any new settings apply to a new session
+    with sessionLock:
+        if session is not None:
+            session.close()
+            session = None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_session():
+    global session
+
+    # A single pooled session is shared by every call so connections (and the TLS handshake) are reused
+    with sessionLock:
+        if session is None:
+            logger.debug("Creating Code Insight REST session")
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=clientSettings["poolSize"], pool_maxsize=clientSettings["poolSize"])
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+
+        return session
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_headers(authToken):
+    return {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + authToken}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def request(method, url, authToken=None, **kwargs):
+    # Make a REST call retrying connection errors, timeouts, throttled (429) and 5xx responses
+    # with an exponential backoff.  Any requests exception from the final attempt is raised.
+    if authToken is not None:
+        kwargs.setdefault("headers", get_headers(authToken))
+    kwargs.setdefault("timeout", (clientSettings["connectTimeout"], clientSettings["readTimeout"]))
+
+    attempt = 0
+    while True:
+        backoff = min(clientSettings["backoffFactor"] * (2 ** attempt), clientSettings["maxBackoff"])
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            if attempt >= clientSettings["maxRetries"]:
+                raise
+            logger.warning("    %s %s failed: %s" %(method, url, error))
+        else:
+            if response.status_code not in retryStatusCodes or attempt >= clientSettings["maxRetries"]:
+                return response
+            logger.warning("    %s %s returned %s" %(method, url, response.status_code))
+            # A throttled request says how long to wait
+            if response.headers.get("Retry-After", "").isdigit():
+                backoff = int(response.headers["Retry-After"])
+                if backoff > clientSettings["maxBackoff"]:
+                    logger.warning("    %s %s asked to wait %s seconds, waiting %s" %(method, url, backoff, clientSettings["maxBackoff"]))
+                    backoff = clientSettings["maxBackoff"]
+
+        attempt += 1
+        logger.info("    Retrying %s %s in %s seconds (attempt %s of %s)" %(method, url, backoff, attempt, clientSettings["maxRetries"]))
+        time.sleep(backoff)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get(url, authToken=None, **kwargs):
+    return request("GET", url, authToken, **kwargs)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def post(url, authToken=None, **kwargs):
+    return request("POST", url, authToken, **kwargs)
@@ -0,0 +1,210 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : command_runner.py
+'''
+import logging, os, re, sys, signal, subprocess, threading, collections
+import asyncio
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of seconds each type of step may run before it is killed (None for no limit)
+stepTimeouts = {}
+stepTimeouts["clone"] = 1800
+stepTimeouts["pull"] = 900
+stepTimeouts["pip"] = 1800
+stepTimeouts["registration"] = 600
+stepTimeouts["describe"] = 60
+stepTimeouts["git"] = 300   # Any other git command such as ls-remote or rev-parse
+
+# Only the end of a command's output is kept in memory (where the results are) so a
+# verbose command does not grow the installer.  The full output is in the logs.
+outputLimit = 256 * 1024
+
+# Command line options whose values are masked when a command is logged
+secretOptions = ["-token", "--token"]
+
+# Subprocesses from an event loop outside of the main thread need python 3.8+
+useEventLoop = sys.version_info >= (3, 8)
+
+eventLoopLock = threading.Lock()
+eventLoop = None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def configure_timeouts(timeouts):
+    for stepType in timeouts:
+        if stepType not in stepTimeouts:
+            raise ValueError("Unknown step type: %s" %stepType)
+        stepTimeouts[stepType] = timeouts[stepType]
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_command(commandArgs, workingDirectory, stepType=None, outputHandler=None, environment=None):
+    # Every git, pip and registration command is run with an explicit working directory
+    # so nothing depends on (or changes) the process wide current directory.  Output is
+    # written to the log (and passed to outputHandler) a line at a time as it is produced.
+    logger.debug("Running command: %s  (cwd: %s)" %(format_command(commandArgs), workingDirectory))
+
+    timeout = stepTimeouts.get(stepType)
+
+    try:
+        if useEventLoop:
+            # All commands run on one shared event loop so steps from different reports overlap
+            commandFuture = asyncio.run_coroutine_threadsafe(run_command_async(commandArgs, workingDirectory, timeout, outputHandler, environment), get_event_loop())
+            commandResponse = commandFuture.result()
+        else:
+            commandResponse = run_command_blocking(commandArgs, workingDirectory, timeout, outputHandler, environment)
+    except OSError as error:
+        logger.error("Unable to run command %s: %s" %(commandArgs[0], error))
+        return {"returnCode" : None, "output" : str(error), "timedOut" : False}
+
+    if commandResponse["timedOut"]:
+        logger.error("Command %s did not complete within %s seconds and was stopped" %(format_command(commandArgs), timeout))
+
+    return commandResponse
+
+#------------------------------------------------------------------------------------------------------------------------------
+def format_command(commandArgs):
+    # The command line as it is logged, without tokens or passwords in URLs
+    maskedArgs = []
+    for argNumber, commandArg in enumerate(commandArgs):
+        if argNumber > 0 and commandArgs[argNumber - 1] in secretOptions:
+            maskedArgs.append("*****")
+        else:
+            maskedArgs.append(re.sub(r"(://[^/@\s:]+:)[^/@\s]+@", r"\1*****@", commandArg))
+    return " ".join(maskedArgs)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_event_loop():
+    global eventLoop
+
+    with eventLoopLock:
+        if eventLoop is None:
+            eventLoop = asyncio.new_event_loop()
+            eventLoopThread = threading.Thread(target=eventLoop.run_forever, name="command_runner", daemon=True)
+            eventLoopThread.start()
+
+    return eventLoop
+
+#------------------------------------------------------------------------------------------------------------------------------
+async def run_command_async(commandArgs, workingDirectory, timeout, outputHandler, environment):
+
+    processGroupOptions = process_group_options(commandArgs)
+    process = await asyncio.create_subprocess_exec(*commandArgs, cwd=workingDirectory, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, env=environment, **processGroupOptions)
+
+    commandOutput = CommandOutput(commandArgs, outputHandler)
+
+    async def read_output():
+        while True:
+            # Read in chunks rather than lines since progress output may never end a line
+            outputChunk = await process.stdout.read(65536)
+            if not outputChunk:
+                break
+            commandOutput.add(outputChunk)
+        commandOutput.finish()
+
+        await process.wait()
+
+    timedOut = False
+    try:
+        await asyncio.wait_for(read_output(), timeout)
+    except asyncio.TimeoutError:
+        timedOut = True
+        kill_process_tree(process.pid, bool(processGroupOptions))
+        await process.wait()
+
+    return {"returnCode" : process.returncode, "output" : commandOutput.get_output(), "timedOut" : timedOut}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_command_blocking(commandArgs, workingDirectory, timeout, outputHandler, environment):
+
+    processGroupOptions = process_group_options(commandArgs)
+    process = subprocess.Popen(commandArgs, cwd=workingDirectory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=environment, **processGroupOptions)
+
+    commandOutput = CommandOutput(commandArgs, outputHandler)
+
+    # The output is read as it is produced by a thread of its own so the timeout still applies
+    def read_output():
+        for outputChunk in iter(lambda: process.stdout.read1(65536), b""):
+            commandOutput.add(outputChunk)
+        commandOutput.finish()
+
+    outputThread = threading.Thread(target=read_output, name="command_output", daemon=True)
+    outputThread.start()
+
+    timedOut = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timedOut = True
+        kill_process_tree(process.pid, bool(processGroupOptions))
+        process.wait()
+
+    outputThread.join()
+    process.stdout.close()
+
+    return {"returnCode" : process.returncode, "output" : commandOutput.get_output(), "timedOut" : timedOut}
+
+#------------------------------------------------------------------------------------------------------------------------------
+class CommandOutput(object):
+    # Splits a command's output into lines as it arrives, logging each line, passing it to
+    # the output handler and keeping only the last outputLimit characters
+
+    def __init__(self, commandArgs, outputHandler):
+        self.commandName = os.path.basename(commandArgs[0])
+        self.outputHandler = outputHandler
+        self.outputLines = collections.deque()
+        self.outputSize = 0
+        self.pendingOutput = ""
+
+    def add(self, outputChunk):
+        self.pendingOutput += outputChunk.decode(errors="replace")
+        lines = self.pendingOutput.splitlines(True)
+        self.pendingOutput = lines.pop() if not lines[-1].endswith(("\n", "\r")) else ""
+        for line in lines:
+            self.handle_line(line)
+
+    def finish(self):
+        if self.pendingOutput:
+            self.handle_line(self.pendingOutput)
+            self.pendingOutput = ""
+
+    def handle_line(self, line):
+        self.outputLines.append(line)
+        self.outputSize += len(line)
+        while self.outputSize > outputLimit and len(self.outputLines) > 1:
+            self.outputSize -= len(self.outputLines.popleft())
+        logger.debug("    [%s] %s" %(self.commandName, line.rstrip("\r\n")))
+        if self.outputHandler:
+            self.outputHandler(line.rstrip("\r\n"))
+
+    def get_output(self):
+        return "".join(self.outputLines)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def process_group_options(commandArgs):
+    # Start each command in its own process group so the whole tree can be stopped on a timeout
+    if sys.platform.startswith("win"):
+        return {"creationflags" : subprocess.CREATE_NEW_PROCESS_GROUP}
+    elif commandArgs[0] == "sudo":
+        # sudo needs the controlling terminal to prompt for a password and passes signals on to the command
+        return {}
+    else:
+        return {"start_new_session" : True}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def kill_process_tree(pid, processGroup):
+    logger.warning("Stopping process tree for pid %s" %pid)
+
+    try:
+        if sys.platform.startswith("win"):
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elif processGroup:
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except OSError as error:
+        logger.warning("Unable to stop process tree for pid %s: %s" %(pid, error))
@@ -0,0 +1,98 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : fleet_inventory.py
+'''
+import logging, os, re, json
+
+logger = logging.getLogger(__name__)
+
+# Token references in the inventory so tokens do not need to be stored in the file itself
+#     env:VARIABLE   - read the token from an environment variable
+#     file:PATH      - read the token from the first line of a file
+#     anything else  - the token itself
+
+#------------------------------------------------------------------------------------------------------------------------------
+def load_inventory(inventoryFile):
+    logger.info("Entering load_inventory")
+
+    # The inventory is either a list of installations or a dictionary with an "installations" list
+    try:
+        with open(inventoryFile, "r") as filePtr:
+            inventoryData = json.load(filePtr)
+    except (ValueError, OSError) as error:
+        return {"error" : "Unable to read inventory file %s: %s" %(inventoryFile, error)}
+
+    if isinstance(inventoryData, dict):
+        inventoryData = inventoryData.get("installations")
+
+    if not isinstance(inventoryData, list) or not inventoryData:
+        return {"error" : "The inventory file %s does not list any installations" %inventoryFile}
+
+    # Relative paths in the inventory are relative to the inventory file
+    inventoryFolder = os.path.dirname(os.path.abspath(inventoryFile))
+
+    installations = []
+    installationNames = set()
+    installationFolders = set()
+    for entryNumber, inventoryEntry in enumerate(inventoryData, 1):
+
+        if not isinstance(inventoryEntry, dict):
+            return {"error" : "Inventory entry %s is not a dictionary" %entryNumber}
+
+        for requiredField in ["installDir", "server", "token"]:
+            if not inventoryEntry.get(requiredField):
+                return {"error" : "Inventory entry %s is missing %s" %(entryNumber, requiredField)}
+
+        installation = {}
+        installation["name"] = inventoryEntry.get("name") or inventoryEntry["server"]
+        installation["installDir"] = os.path.join(inventoryFolder, os.path.expanduser(inventoryEntry["installDir"]))
+        installation["server"] = inventoryEntry["server"].rstrip("/")
+        installation["tokenReference"] = inventoryEntry["token"]
+        installation["certificatePath"] = None
+        if inventoryEntry.get("certificatePath"):
+            installation["certificatePath"] = os.path.join(inventoryFolder, os.path.expanduser(inventoryEntry["certificatePath"]))
+
+        # The name is used for the installation's log folder so keep it unique and file system safe
+        installation["folderName"] = re.sub(r"[^A-Za-z0-9._-]+", "_", installation["name"]).strip("_")
+        if installation["folderName"] in installationNames:
+            return {"error" : "Inventory entry %s has a duplicate name: %s" %(entryNumber, installation["name"])}
+        installationNames.add(installation["folderName"])
+
+        # Installing into the same folder from two installers at once would conflict
+        if os.path.normcase(os.path.realpath(installation["installDir"])) in installationFolders:
+            return {"error" : "Inventory entry %s has the same installDir as another entry: %s" %(entryNumber, installation["installDir"])}
+        installationFolders.add(os.path.normcase(os.path.realpath(installation["installDir"])))
+
+        installations.append(installation)
+
+    logger.info("    Loaded %s installation(s) from %s" %(len(installations), inventoryFile))
+
+    return {"installations" : installations}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def resolve_token(tokenReference):
+
+    referenceType, _, referenceValue = tokenReference.partition(":")
+
+    if referenceType == "env":
+        token = os.environ.get(referenceValue)
+        if not token:
+            return {"error" : "The environment variable %s is not set" %referenceValue}
+        return {"token" : token}
+
+    if referenceType == "file":
+        try:
+            with open(os.path.expanduser(referenceValue), "r") as filePtr:
+                token = filePtr.readline().strip()
+        except OSError as error:
+            return {"error" : "Unable to read token file %s: %s" %(referenceValue, error)}
+        if not token:
+            return {"error" : "The token file %s is empty" %referenceValue}
+        return {"token" : token}
+
+    return {"token" : tokenReference}
@@ -0,0 +1,336 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : git_operations.py
+'''
+import logging, os, re, posixpath, threading
+import concurrent.futures
+
+from command_runner import run_command
+
+logger = logging.getLogger(__name__)
+
+maxRemoteQueries = 16  # Upper limit on the number of concurrent ls-remote calls
+
+# Repositories already fetched into the reference store during this run
+referenceStoreLock = threading.Lock()
+referenceStoreFetches = {}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def check_reports_for_updates(reportFolders):
+    logger.info("Entering check_reports_for_updates")
+
+    # Only folders that already contain a clone can be checked
+    reportFolders = [reportFolder for reportFolder in reportFolders if os.path.isdir(os.path.join(reportFolder, ".git"))]
+
+    # The ls-remote calls are network bound so issue them all at once
+    updateChecks = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(maxRemoteQueries, len(reportFolders)))) as executor:
+        futures = {executor.submit(check_report_for_updates, reportFolder) : reportFolder for reportFolder in reportFolders}
+
+        for future in concurrent.futures.as_completed(futures):
+            updateChecks[futures[future]] = future.result()
+
+    return updateChecks
+
+#------------------------------------------------------------------------------------------------------------------------------
+def check_report_for_updates(reportFolder):
+    # Returns the local commit details along with "changed" which is True if the report
+    # needs to be pulled, False if it is current and None if it could not be determined
+    # (in which case a pull should be done)
+    updateCheck = {"changed" : None, "commit" : None, "submodules" : None, "remoteCommit" : None}
+
+    localHead = get_local_head(reportFolder)
+    if "error" in localHead:
+        logger.warning("    Unable to determine local HEAD for %s: %s" %(reportFolder, localHead["error"]))
+        return updateCheck
+
+    updateCheck["commit"] = localHead["commit"]
+
+    remoteResponse = run_command(["git", "ls-remote", localHead["remote"], localHead["remoteRef"]], reportFolder, "git")
+    if remoteResponse["returnCode"] != 0:
+        logger.warning("    Unable to query remote for %s: %s" %(reportFolder, remoteResponse["output"]))
+        return updateCheck
+
+    remoteCommit = None
+    for line in remoteResponse["output"].splitlines():
+        refDetails = line.split()
+        if len(refDetails) == 2 and refDetails[1] == localHead["remoteRef"]:
+            remoteCommit = refDetails[0]
+
+    if remoteCommit is None:
+        logger.warning("    The remote for %s did not advertise %s" %(reportFolder, localHead["remoteRef"]))
+        return updateCheck
+
+    updateCheck["remoteCommit"] = remoteCommit
+    if remoteCommit != localHead["commit"]:
+        logger.info("    %s has remote updates (%s -> %s)" %(reportFolder, localHead["commit"][:10], remoteCommit[:10]))
+        updateCheck["changed"] = True
+        return updateCheck
+
+    # The report itself is current but make sure the submodules match what it expects
+    submoduleStatus = get_submodule_status(reportFolder)
+    updateCheck["submodules"] = submoduleStatus["commits"]
+    if submoduleStatus["drifted"]:
+        logger.info("    %s has submodules that do not match the recorded commits" %reportFolder)
+        updateCheck["changed"] = True
+        return updateCheck
+
+    logger.info("    %s is current at %s" %(reportFolder, localHead["commit"][:10]))
+    updateCheck["changed"] = False
+    return updateCheck
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_remote_ref_commit(reportFolder, ref):
+    # Returns the commit a pinned tag or branch is at on the remote (without fetching) or None
+    remoteResponse = run_command(["git", "ls-remote", "origin", "refs/tags/" + ref, "refs/tags/" + ref + "^{}", "refs/heads/" + ref], reportFolder, "git")
+    if remoteResponse["returnCode"] != 0:
+        logger.warning("    Unable to query remote for %s: %s" %(reportFolder, remoteResponse["output"]))
+        return None
+
+    remoteRefs = {}
+    for line in remoteResponse["output"].splitlines():
+        refDetails = line.split()
+        if len(refDetails) == 2:
+            remoteRefs[refDetails[1]] = refDetails[0]
+
+    # An annotated tag is advertised twice, the peeled (^{}) entry is the commit
+    for remoteRef in ["refs/tags/" + ref + "^{}", "refs/tags/" + ref, "refs/heads/" + ref]:
+        if remoteRef in remoteRefs:
+            return remoteRefs[remoteRef]
+
+    return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_local_head(reportFolder):
+
+    headCommit = get_head_commit(reportFolder)
+    if headCommit is None:
+        return {"error" : "Unable to read HEAD"}
+
+    # The upstream of the current branch is what git pull will merge from
+    upstreamResponse = run_command(["git", "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{upstream}"], reportFolder, "git")
+    if upstreamResponse["returnCode"] != 0 or "/" not in upstreamResponse["output"]:
+        return {"error" : "No upstream branch: %s" %upstreamResponse["output"].strip()}
+
+    remote, remoteBranch = upstreamResponse["output"].strip().split("/", 1)
+
+    localHead = {}
+    localHead["commit"] = headCommit
+    localHead["remote"] = remote
+    localHead["remoteRef"] = "refs/heads/" + remoteBranch
+
+    return localHead
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_head_commit(reportFolder):
+    headResponse = run_command(["git", "rev-parse", "HEAD"], reportFolder, "git")
+    if headResponse["returnCode"] != 0:
+        return None
+    return headResponse["output"].strip()
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_submodule_status(reportFolder):
+    # Returns the checked out commit of each submodule and whether any of them
+    # do not match the commit recorded by the report
+    submoduleStatus = {"commits" : {}, "drifted" : False}
+
+    if not os.path.isfile(os.path.join(reportFolder, ".gitmodules")):
+        return submoduleStatus
+
+    submoduleResponse = run_command(["git", "submodule", "status", "--recursive"], reportFolder, "git")
+    if submoduleResponse["returnCode"] != 0:
+        submoduleStatus["drifted"] = True
+        return submoduleStatus
+
+    for line in submoduleResponse["output"].splitlines():
+        # A leading -, + or U means the submodule is missing, at a different commit or conflicted
+        if line[:1] in ("-", "+", "U"):
+            submoduleStatus["drifted"] = True
+
+        submoduleDetails = line[1:].split()
+        if len(submoduleDetails) >= 2:
+            submoduleStatus["commits"][submoduleDetails[1]] = submoduleDetails[0]
+
+    return submoduleStatus
+
+#------------------------------------------------------------------------------------------------------------------------------
+def fetch_report_updates(reportFolder, ref=None, outputHandler=None):
+    # Fetch without touching the checkout and return the commit the report should be at:
+    # the pinned tag or branch if there is one, otherwise the upstream of the current branch
+    logger.info("Entering fetch_report_updates for %s" %reportFolder)
+
+    fetchResponse = run_command(["git", "fetch", "--tags", "--force"], reportFolder, "pull", outputHandler)
+    fetchResponse["commit"] = None
+    if fetchResponse["returnCode"] != 0:
+        return fetchResponse
+
+    if ref:
+        candidateRefs = ["refs/tags/" + ref, "refs/remotes/origin/" + ref, ref]
+    else:
+        candidateRefs = ["@{upstream}"]
+
+    for candidateRef in candidateRefs:
+        revisionResponse = run_command(["git", "rev-parse", "--verify", "--quiet", candidateRef + "^{commit}"], reportFolder, "git")
+        if revisionResponse["returnCode"] == 0:
+            fetchResponse["commit"] = revisionResponse["output"].strip()
+            return fetchResponse
+
+    fetchResponse["returnCode"] = 1
+    fetchResponse["output"] += "Unable to find %s in %s" %(ref or "the upstream branch", reportFolder)
+    return fetchResponse
+
+#------------------------------------------------------------------------------------------------------------------------------
+def checkout_report_commit(reportFolder, commit, pinned=False, outputHandler=None):
+    logger.info("Entering checkout_report_commit for %s at %s" %(reportFolder, commit))
+
+    # Pinned reports are checked out detached at their ref, others fast forward their branch as git pull would
+    if pinned:
+        checkoutCommand = ["git", "checkout", "--quiet", "--detach", commit]
+    else:
+        checkoutCommand = ["git", "merge", "--ff-only", "--quiet", commit]
+
+    checkoutResponse = run_command(checkoutCommand, reportFolder, "pull", outputHandler)
+    if checkoutResponse["returnCode"] != 0:
+        return checkoutResponse
+
+    submoduleResponse = run_command(["git", "submodule", "update", "--init", "--recursive"], reportFolder, "pull", outputHandler)
+    submoduleResponse["output"] = checkoutResponse["output"] + submoduleResponse["output"]
+
+    return submoduleResponse
+
+#------------------------------------------------------------------------------------------------------------------------------
+def clone_with_reference_store(repository, reportFolder, referenceStore, cloneOptions=[], shallowSubmodules=False, updateStore=True):
+    logger.info("Entering clone_with_reference_store for %s" %repository)
+
+    # Make sure the report objects are in the store so the clone can borrow them.  Installers
+    # sharing a store that was already updated (the fleet command) only borrow from it since
+    # concurrent fetches into the same repository from several processes would conflict.
+    if updateStore:
+        update_reference_store(referenceStore, repository)
+
+    cloneCommand = ["git", "clone", "--reference-if-able", referenceStore] + cloneOptions + [repository, reportFolder]
+    cloneResponse = run_command(cloneCommand, os.path.dirname(reportFolder), "clone")
+    if cloneResponse["returnCode"] != 0:
+        return cloneResponse
+
+    # Now the submodule URLs are known they can be added to the store as well
+    if updateStore:
+        update_submodule_reference_store(referenceStore, repository, reportFolder)
+
+    # Unlike the clone there is no --reference-if-able for submodules so only borrow from a store that exists
+    submoduleCommand = ["git", "submodule", "update", "--init", "--recursive"]
+    if os.path.isdir(referenceStore):
+        submoduleCommand += ["--reference", referenceStore]
+    if shallowSubmodules:
+        submoduleCommand += ["--depth", "1"]
+
+    submoduleResponse = run_command(submoduleCommand, reportFolder, "clone")
+
+    return {"returnCode" : submoduleResponse["returnCode"], "output" : cloneResponse["output"] + submoduleResponse["output"]}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def update_submodule_reference_store(referenceStore, repository, reportFolder):
+
+    if not os.path.isfile(os.path.join(reportFolder, ".gitmodules")):
+        return
+
+    submoduleResponse = run_command(["git", "config", "--file", ".gitmodules", "--get-regexp", r"^submodule\..*\.url$"], reportFolder, "git")
+
+    for line in submoduleResponse["output"].splitlines():
+        submoduleDetails = line.split()
+        if len(submoduleDetails) == 2:
+            update_reference_store(referenceStore, resolve_submodule_url(repository, submoduleDetails[1]))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def update_reference_store(referenceStore, repositoryURL):
+    # The reference store is a single bare repository holding the objects of every
+    # report and submodule.  Each repository is fetched into its own ref namespace
+    # so objects shared between reports (the common submodules) are only stored once.
+
+    with referenceStoreLock:
+        if not os.path.isdir(referenceStore):
+            logger.info("    Creating git reference store %s" %referenceStore)
+            os.makedirs(referenceStore)
+            run_command(["git", "init", "--bare", "--quiet"], referenceStore, "git")
+            run_command(["git", "config", "gc.auto", "0"], referenceStore, "git")
+
+        # Fetch each repository once per run even if several reports share it
+        if repositoryURL not in referenceStoreFetches:
+            referenceStoreFetches[repositoryURL] = {"lock" : threading.Lock(), "fetched" : False}
+        fetchDetails = referenceStoreFetches[repositoryURL]
+
+    with fetchDetails["lock"]:
+        if fetchDetails["fetched"]:
+            return True
+
+        refNamespace = get_reference_namespace(repositoryURL)
+        fetchCommand = ["git", "fetch", "--quiet", "--no-tags", repositoryURL, "+refs/heads/*:%s/heads/*" %refNamespace, "+refs/tags/*:%s/tags/*" %refNamespace]
+
+        fetchResponse = run_command(fetchCommand, referenceStore, "clone")
+        if fetchResponse["returnCode"] != 0:
+            logger.warning("    Unable to fetch %s into the reference store: %s" %(repositoryURL, fetchResponse["output"]))
+            return False
+
+        fetchDetails["fetched"] = True
+        logger.info("    Updated reference store with %s" %repositoryURL)
+
+    return True
+
+#------------------------------------------------------------------------------------------------------------------------------
+def prime_reference_store(referenceStore, repositories):
+    logger.info("Entering prime_reference_store")
+
+    # Fill the store with every report and the submodules of their branches before any
+    # installs start so installs running alongside each other only borrow from it
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(maxRemoteQueries, len(repositories)))) as executor:
+        repositoryFetches = dict(zip(repositories, executor.map(lambda repository: update_reference_store(referenceStore, repository), repositories)))
+
+        submoduleURLs = set()
+        for repository in repositories:
+            if repositoryFetches[repository]:
+                submoduleURLs.update(get_stored_submodule_urls(referenceStore, repository))
+
+        submoduleFetches = list(executor.map(lambda submoduleURL: update_reference_store(referenceStore, submoduleURL), sorted(submoduleURLs)))
+
+    return all(repositoryFetches.values()) and all(submoduleFetches)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_stored_submodule_urls(referenceStore, repository):
+
+    refNamespace = get_reference_namespace(repository)
+    branchResponse = run_command(["git", "for-each-ref", "--format=%(refname)", refNamespace + "/heads/"], referenceStore, "git")
+
+    submoduleURLs = set()
+    for branchRef in branchResponse["output"].split():
+        # Branches without a .gitmodules file return an error which leaves nothing to add
+        submoduleResponse = run_command(["git", "config", "--blob", branchRef + ":.gitmodules", "--get-regexp", r"^submodule\..*\.url$"], referenceStore, "git")
+        if submoduleResponse["returnCode"] != 0:
+            continue
+
+        for line in submoduleResponse["output"].splitlines():
+            submoduleDetails = line.split()
+            if len(submoduleDetails) == 2:
+                submoduleURLs.add(resolve_submodule_url(repository, submoduleDetails[1]))
+
+    return submoduleURLs
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_reference_namespace(repositoryURL):
+    return "refs/stores/" + re.sub(r"[^A-Za-z0-9._-]+", "_", repositoryURL).strip("_")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def resolve_submodule_url(repository, submoduleURL):
+    # Relative submodule URLs are relative to the URL of the superproject
+    if not (submoduleURL.startswith("./") or submoduleURL.startswith("../")):
+        return submoduleURL
+
+    if "://" in repository:
+        scheme, repositoryPath = repository.split("://", 1)
+        return scheme + "://" + posixpath.normpath(posixpath.join(repositoryPath.rstrip("/"), submoduleURL))
+
+    return posixpath.normpath(posixpath.join(repository.rstrip("/"), submoduleURL))
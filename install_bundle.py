@@ -0,0 +1,154 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : install_bundle.py
+'''
+import logging, os, json, hashlib, shutil, tarfile, gzip, datetime
+
+import report_archives
+
+logger = logging.getLogger(__name__)
+
+bundleManifestFileName = "bundle.json"
+bundleArchiveFolderName = "archives"
+bundleWheelhouseFolderName = "wheelhouse"
+bundleChecksumSuffix = ".sha256"
+bundleVersion = 1
+
+# A bundle is a tar.gz holding everything needed to install the reports without a network fetch
+#
+#     bundle.json      - what the bundle contains and the installer version that built it
+#     archives.json    - the archive manifest read by the archive fetch backend (report_archives)
+#     archives/        - a tar.gz of each report's checkout, submodules included, without git metadata
+#     wheelhouse/      - wheels for the merged requirements of all of the reports
+#
+# The sha256 of the bundle is written next to it in <bundle>.sha256 (sha256sum format)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_report_archive(reportFolder, archiveFile, prefix):
+    logger.info("Entering write_report_archive for %s" %reportFolder)
+
+    # Sorted and without owner details or timestamps so the same checkout always gives the same
+    # archive (and checksum) and an unchanged report in a new bundle is not reinstalled
+    def filter_member(tarInfo):
+        tarInfo.uid = tarInfo.gid = 0
+        tarInfo.uname = tarInfo.gname = ""
+        tarInfo.mtime = 0
+        return tarInfo
+
+    with gzip.GzipFile(archiveFile, "wb", mtime=0) as gzipFile, tarfile.open(fileobj=gzipFile, mode="w", format=tarfile.PAX_FORMAT) as tarFile:
+        for folder, subFolders, files in os.walk(reportFolder):
+            subFolders[:] = sorted(subFolder for subFolder in subFolders if subFolder != ".git")
+            # Linked folders are stored as links (os.walk does not descend into them)
+            entryNames = sorted(files + [subFolder for subFolder in subFolders if os.path.islink(os.path.join(folder, subFolder))])
+            for entryName in entryNames:
+                if entryName == ".git":
+                    continue  # Submodules have a .git file pointing at the parent's git folder
+                entryPath = os.path.join(folder, entryName)
+                memberName = "/".join([prefix] + os.path.relpath(entryPath, reportFolder).split(os.sep))
+                tarFile.add(entryPath, arcname=memberName, recursive=False, filter=filter_member)
+
+    return get_file_hash(archiveFile)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_bundle(bundleFolder, bundleFile, bundleContents):
+    logger.info("Entering write_bundle")
+
+    bundleManifest = {}
+    bundleManifest["version"] = bundleVersion
+    bundleManifest["created"] = datetime.datetime.now().isoformat()
+    bundleManifest.update(bundleContents)
+    with open(os.path.join(bundleFolder, bundleManifestFileName), "w") as filePtr:
+        json.dump(bundleManifest, filePtr, indent=4, sort_keys=True)
+
+    # Written to a temporary name so an interrupted build never leaves a bundle that looks complete
+    temporaryBundleFile = bundleFile + ".tmp"
+    with tarfile.open(temporaryBundleFile, "w:gz") as tarFile:
+        for entryName in sorted(os.listdir(bundleFolder)):
+            tarFile.add(os.path.join(bundleFolder, entryName), arcname=entryName)
+
+    bundleHash = get_file_hash(temporaryBundleFile)
+    os.replace(temporaryBundleFile, bundleFile)
+
+    with open(bundleFile + bundleChecksumSuffix, "w") as filePtr:
+        filePtr.write("%s  %s\n" %(bundleHash, os.path.basename(bundleFile)))
+
+    return bundleHash
+
+#------------------------------------------------------------------------------------------------------------------------------
+def extract_bundle(bundleFile, bundlesFolder):
+    logger.info("Entering extract_bundle for %s" %bundleFile)
+
+    checksumFile = bundleFile + bundleChecksumSuffix
+    try:
+        with open(checksumFile, "r") as filePtr:
+            bundleHash = filePtr.read().split()[0].lower()
+    except (OSError, IndexError) as error:
+        return {"error" : "Unable to read the bundle checksum %s: %s" %(checksumFile, error)}
+
+    # A bundle that was already extracted (and so verified) by an earlier run is reused
+    bundleFolder = os.path.join(bundlesFolder, bundleHash[:16])
+    bundleManifest = load_bundle_manifest(bundleFolder)
+    if bundleManifest and bundleManifest.get("bundleHash") == bundleHash:
+        logger.info("    Reusing the extracted bundle in %s" %bundleFolder)
+        return {"folder" : bundleFolder, "manifest" : bundleManifest, "extracted" : False}
+
+    if os.path.isdir(bundleFolder):
+        shutil.rmtree(bundleFolder)
+
+    # Verified while it is extracted, the same way as a report archive
+    bundleEntry = {"archive" : os.path.basename(bundleFile), "sha256" : bundleHash}
+    extractResponse = report_archives.extract_archive(os.path.dirname(os.path.abspath(bundleFile)), bundleEntry, bundleFolder)
+    if "error" in extractResponse:
+        shutil.rmtree(bundleFolder, ignore_errors=True)
+        return extractResponse
+
+    bundleManifest = load_bundle_manifest(bundleFolder)
+    if bundleManifest is None or bundleManifest.get("version") != bundleVersion:
+        shutil.rmtree(bundleFolder, ignore_errors=True)
+        return {"error" : "%s is not a supported install bundle" %bundleFile}
+
+    # Record the verified checksum so a later run can reuse the extracted copy
+    bundleManifest["bundleHash"] = bundleHash
+    with open(os.path.join(bundleFolder, bundleManifestFileName), "w") as filePtr:
+        json.dump(bundleManifest, filePtr, indent=4, sort_keys=True)
+
+    # Only the bundle in use is kept
+    for folderName in os.listdir(bundlesFolder):
+        if folderName != os.path.basename(bundleFolder):
+            shutil.rmtree(os.path.join(bundlesFolder, folderName), ignore_errors=True)
+
+    return {"folder" : bundleFolder, "manifest" : bundleManifest, "extracted" : True}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def read_bundle_file(bundleFile, memberName):
+    # Reads one file from the bundle without extracting anything else
+    try:
+        with tarfile.open(bundleFile, "r|gz") as tarFile:
+            for member in tarFile:
+                if member.isfile() and report_archives.strip_prefix(member.name, "") == memberName:
+                    return {"content" : tarFile.extractfile(member).read()}
+    except (OSError, tarfile.TarError) as error:
+        return {"error" : "Unable to read %s from %s: %s" %(memberName, bundleFile, error)}
+
+    return {"error" : "%s does not contain %s" %(bundleFile, memberName)}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def load_bundle_manifest(bundleFolder):
+    try:
+        with open(os.path.join(bundleFolder, bundleManifestFileName), "r") as filePtr:
+            return json.load(filePtr)
+    except (ValueError, OSError):
+        return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_file_hash(fileName):
+    fileHash = hashlib.sha256()
+    with open(fileName, "rb") as filePtr:
+        for chunk in iter(lambda: filePtr.read(report_archives.archiveChunkSize), b""):
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
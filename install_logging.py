@@ -0,0 +1,144 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : install_logging.py
+'''
+import logging, logging.handlers, os, glob, gzip, shutil, tarfile, threading, datetime, atexit
+
+logger = logging.getLogger(__name__)
+
+logFormat = '%(asctime)s,%(msecs)-3d  %(levelname)-8s [%(filename)-30s:%(lineno)-4d]  %(message)s'
+logDateFormat = '%Y-%m-%d:%H:%M:%S'
+
+# Default settings for the installer log and the per report logs
+logSettings = {}
+logSettings["maxMB"] = 10        # Size of the installer log before it is rotated
+logSettings["backupCount"] = 5   # Rotated (compressed) installer logs kept for the current run
+logSettings["keepRuns"] = 5      # Compressed archives of the logs from previous runs, 0 to keep none
+
+logsFolderName = "_logs"            # Archives of previous runs next to the installer log
+reportLogSuffix = "_installation.log"
+
+reportLogLock = threading.Lock()
+reportLogs = {}
+logHandler = None
+logFolder = None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def configure_logging(logFile, maxMB=None, backupCount=None, keepRuns=None, keepPreviousRun=False):
+    global logHandler, logFolder
+
+    for setting, value in [("maxMB", maxMB), ("backupCount", backupCount), ("keepRuns", keepRuns)]:
+        if value is not None:
+            logSettings[setting] = value
+
+    close_report_logs()
+    logFolder = os.path.dirname(os.path.abspath(logFile))
+
+    rootLogger = logging.getLogger()
+    if logHandler is not None:
+        rootLogger.removeHandler(logHandler)
+        logHandler.close()
+
+    if keepPreviousRun:
+        # Runs that only look at the installation (status, -plan) add to the log of the last
+        # install rather than archiving or rotating it
+        logHandler = logging.FileHandler(logFile, "a")
+    else:
+        # The logs of the previous run are compressed and put aside rather than overwritten
+        archive_previous_run(logFile)
+
+        # Rotated logs are compressed so a run with very verbose output stays within
+        # (maxMB * (backupCount + 1)) before compression
+        logHandler = logging.handlers.RotatingFileHandler(logFile, maxBytes=int(logSettings["maxMB"] * 1024 * 1024), backupCount=logSettings["backupCount"])
+        logHandler.namer = lambda rotatedName: rotatedName + ".gz"
+        logHandler.rotator = compress_rotated_log
+    logHandler.setFormatter(logging.Formatter(logFormat, logDateFormat))
+
+    rootLogger.addHandler(logHandler)
+    rootLogger.setLevel(logging.DEBUG)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def compress_rotated_log(source, destination):
+    with open(source, "rb") as sourcePtr, gzip.open(destination, "wb") as destinationPtr:
+        shutil.copyfileobj(sourcePtr, destinationPtr)
+    os.remove(source)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_run_log_files(logFile):
+    # The installer log, its rotated copies and the per report logs from one run
+    logFiles = [logFile] + sorted(glob.glob(logFile + ".*.gz"))
+    logFiles += sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(logFile)), "*" + reportLogSuffix)))
+    return [fileName for fileName in logFiles if os.path.isfile(fileName)]
+
+#------------------------------------------------------------------------------------------------------------------------------
+def archive_previous_run(logFile):
+
+    runLogFiles = get_run_log_files(logFile)
+    if not runLogFiles:
+        return
+
+    if logSettings["keepRuns"] > 0:
+        archiveFolder = os.path.join(os.path.dirname(os.path.abspath(logFile)), logsFolderName)
+        try:
+            if not os.path.isdir(archiveFolder):
+                os.makedirs(archiveFolder)
+
+            # Named after when the previous run started writing its log
+            runStarted = datetime.datetime.fromtimestamp(min(os.path.getmtime(fileName) for fileName in runLogFiles))
+            archiveFile = os.path.join(archiveFolder, "run_%s_%s.tar.gz" %(runStarted.strftime("%Y%m%d_%H%M%S"), os.getpid()))
+            with tarfile.open(archiveFile, "w:gz") as tarFile:
+                for fileName in runLogFiles:
+                    tarFile.add(fileName, arcname=os.path.basename(fileName))
+
+            for oldArchive in sorted(glob.glob(os.path.join(archiveFolder, "run_*.tar.gz")))[:-logSettings["keepRuns"]]:
+                os.remove(oldArchive)
+        except OSError as error:
+            # Not being able to keep the old logs should not stop the install
+            print("    **WARNING**  Unable to archive the previous logs: %s" %error)
+
+    for fileName in runLogFiles:
+        try:
+            os.remove(fileName)
+        except OSError:
+            pass
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_report_log_file(reportName):
+    return os.path.join(logFolder or os.getcwd(), reportName + reportLogSuffix)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_report_log(reportName, message):
+
+    # Each report has its own log that its messages and command output are written to as they happen
+    with reportLogLock:
+        reportLog = reportLogs.get(reportName)
+        if reportLog is None:
+            reportLog = open(get_report_log_file(reportName), "a", buffering=1, errors="replace")
+            reportLogs[reportName] = reportLog
+        reportLog.write("%s  %s\n" %(datetime.datetime.now().strftime(logDateFormat), message.rstrip("\r\n")))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def append_report_log_file(reportName, logFile):
+
+    write_report_log(reportName, "---- %s ----" %logFile)
+
+    # Streamed in chunks so a large registration log is never held in memory
+    with reportLogLock:
+        reportLog = reportLogs[reportName]
+        with open(logFile, "r", errors="replace") as filePtr:
+            shutil.copyfileobj(filePtr, reportLog, 65536)
+        reportLog.write("\n")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def close_report_logs():
+    with reportLogLock:
+        for reportLog in reportLogs.values():
+            reportLog.close()
+        reportLogs.clear()
+
+atexit.register(close_report_logs)
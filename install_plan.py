@@ -0,0 +1,66 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : install_plan.py
+'''
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds assumed for a step that no previous run has recorded a time for
+defaultStepEstimates = {}
+defaultStepEstimates["clone"] = 20
+defaultStepEstimates["pull"] = 5
+defaultStepEstimates["requirements"] = 30
+defaultStepEstimates["registration"] = 10
+defaultStepEstimates["describe"] = 0
+
+# The steps each planned action runs
+actionSteps = {}
+actionSteps["clone"] = ["clone", "requirements", "registration"]
+actionSteps["update"] = ["pull", "requirements", "registration"]
+actionSteps["requirements"] = ["requirements", "registration"]
+actionSteps["register"] = ["registration"]
+actionSteps["current"] = []
+actionSteps["skip"] = []
+actionSteps["failed"] = []
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_step_estimates(installState):
+    # The average time each step took across the reports that recorded it, for reports with no history of their own
+    stepTimes = {}
+    for reportState in installState["reports"].values():
+        for stepName, seconds in (reportState.get("timings") or {}).items():
+            stepTimes.setdefault(stepName, []).append(seconds)
+
+    stepEstimates = dict(defaultStepEstimates)
+    for stepName, times in stepTimes.items():
+        stepEstimates[stepName] = round(sum(times) / len(times), 3)
+
+    return stepEstimates
+
+#------------------------------------------------------------------------------------------------------------------------------
+def estimate_action(action, reportTimings, stepEstimates):
+    # Returns the estimated seconds for each step of the action and whether they all came from recorded timings
+    stepSeconds = {}
+    recorded = True
+    for stepName in actionSteps[action]:
+        if stepName in (reportTimings or {}):
+            stepSeconds[stepName] = reportTimings[stepName]
+        else:
+            stepSeconds[stepName] = stepEstimates.get(stepName, 0)
+            recorded = False
+
+    return {"steps" : stepSeconds, "seconds" : round(sum(stepSeconds.values()), 3), "recorded" : recorded}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def estimate_wall_clock(reportSeconds, numberOfJobs):
+    # Reports are installed numberOfJobs at a time so the run takes at least as long as the
+    # slowest report and at least the total work shared across the jobs
+    if not reportSeconds:
+        return 0
+    return round(max(max(reportSeconds), sum(reportSeconds) / max(1, numberOfJobs)), 1)
@@ -8,9 +8,16 @@ Created On : Mon Nov 08 2021
 File : install_reports.py
 '''
 import sys, os, logging, argparse, json
-import requests, subprocess, shutil, stat
+import requests, shutil, stat
+import concurrent.futures, tempfile, threading
 
-import report_repositories
+import report_repositories, report_requirements, git_operations, codeinsight_client, report_registration, install_state, fleet_inventory, release_cache, report_selection, virtual_environment, version_inventory, install_plan, report_archives, install_bundle, registration_scheduler, install_logging
+from report_selection import get_report_name
+from install_timing import timed_phase, timed_step
+import install_timing
+from _version import __version__
+import command_runner
+from command_runner import run_command
 
 ###################################################################################
 # Test the version of python to make sure it's at least the version the script
@@ -25,32 +32,74 @@ logfileName = "_" + os.path.basename(__file__).split('.')[0] + ".log"
 defaultRegistrationLogFileName = "_registration.log" # Default log name for report registration scripts
 
 ###################################################################################
-#  Set up logging handler to allow for different levels of logging to be capture
-logging.basicConfig(format='%(asctime)s,%(msecs)-3d  %(levelname)-8s [%(filename)-30s:%(lineno)-4d]  %(message)s', datefmt='%Y-%m-%d:%H:%M:%S', filename=logfileName, filemode='w',level=logging.DEBUG)
+#  The logging handler (a rotating log file) is set up by main once the log options are known
 logger = logging.getLogger(__name__)
 
 propertiesFileName = "server_properties.json"
 reportRequirementsFile = "requirements.txt"
-reportRegistrationFile = "registration.py"
-gitCloneCommandBase = "git clone --recursive"
-gitPullCommand = "git pull --recurse-submodules"
-gitDescribeCommand = "git describe"
+mergedRequirementsFileName = "_merged_requirements.txt"
+requirementsCacheFileName = "_requirements_cache.json"
+installStateFileName = "_install_state.json"
+virtualEnvironmentsFolderName = "_venvs"  # Virtual environments used to register the reports
+releaseCacheFileName = "_server_check_cache.json"  # Recent successful server checks within the installer directory
+fleetFolderName = "_fleet"  # Output and run reports for each installation in the inventory
+bundlesFolderName = "_bundles"  # Extracted install bundle within the installer directory
+gitReferenceStoreFolderName = "_git_cache"  # Shared object store within the installer directory
+tokenEnvironmentVariable = "CODEINSIGHT_INSTALLER_TOKEN"  # Token used when -token is not given (keeps it off the command line)
+gitCloneCommandBase = ["git", "clone", "--recursive"]
+gitBloblessCloneOptions = ["--filter=blob:none"]  # Full commit/tag graph for git describe but blobs on demand
+gitShallowCloneOptions = gitBloblessCloneOptions + ["--shallow-submodules"]
+
+printLock = threading.Lock()  # Console output from concurrent reports
+releaseCheckLock = threading.Lock()  # Only the first report waiting on the server check reports the result
+requirementsInstallLock = threading.Lock()  # pip runs one at a time since concurrent installs into one environment conflict
 
 # Based on how the shell pass the arguemnts clean up the options if on a linux system
 if sys.platform.startswith('linux'):
-    pythonCommand = "python3"
-    pipCommand = "sudo pip3"
+    pythonCommand = ["python3"]
+    pipCommand = ["sudo", "pip3"]
 else:
-    pythonCommand = "python"
-    pipCommand = "pip"    
+    pythonCommand = ["python"]
+    pipCommand = ["pip"]
 
 ####################################################################################
 # Create command line argument options
 parser = argparse.ArgumentParser()
+parser.add_argument("command", nargs="?", default="install", choices=["install", "prefetch", "fleet", "status", "bundle"], help="install (Default) the reports, prefetch the report requirements into a wheelhouse, install the reports on every installation in a fleet inventory, show the status of the installed reports or bundle the reports and their requirements into one file")
 parser.add_argument('-server', "--server", help="Code Insight server URL - http(s)://FQDN:port")
 parser.add_argument("-token", "--token", help="Auth token with admin access")
 parser.add_argument("-installDir", "--installationDirctory", help="Code Insight base installation folder?")
 parser.add_argument("-certificatePath", "--certificatePath", help="Path to self signed certificate")
+parser.add_argument("-connectTimeout", "--connectTimeout", type=float, help="Seconds to wait when connecting to the Code Insight server (Default: %s)" %codeinsight_client.clientSettings["connectTimeout"])
+parser.add_argument("-readTimeout", "--readTimeout", type=float, help="Seconds to wait for a response from the Code Insight server (Default: %s)" %codeinsight_client.clientSettings["readTimeout"])
+parser.add_argument("-retries", "--retries", type=int, help="Number of retries for failed Code Insight server requests (Default: %s)" %codeinsight_client.clientSettings["maxRetries"])
+parser.add_argument("-serverCheckTTL", "--serverCheckTTL", type=int, default=300, help="Seconds a successful server and token check is reused by later runs, 0 to always check (Default: 300)")
+parser.add_argument("-only", "--only", action="append", default=[], help="Only install the reports matching these names or tags (comma separated, may be repeated)")
+parser.add_argument("-exclude", "--exclude", action="append", default=[], help="Do not install the reports matching these names or tags (comma separated, may be repeated)")
+parser.add_argument("-jobs", "--jobs", type=int, default=1, help="Number of reports to install concurrently (Default: 1)")
+parser.add_argument("-batchRequirements", "--batchRequirements", action="store_true", help="Merge all report requirements and install them with a single pip run")
+parser.add_argument("-forceRequirements", "--forceRequirements", action="store_true", help="Reinstall report requirements even if they have not changed")
+parser.add_argument("-shallow", "--shallow", action="store_true", help="Use blobless clones with shallow submodules for new reports")
+parser.add_argument("-gitCache", "--gitCache", action="store_true", help="Share git objects between reports through a local reference store")
+parser.add_argument("-gitCacheReadOnly", "--gitCacheReadOnly", action="store_true", help="With -gitCache only borrow objects from the reference store without fetching into it (used by the fleet command once it has updated the store)")
+parser.add_argument("-alwaysPull", "--alwaysPull", action="store_true", help="Pull every report instead of first checking the remotes for updates")
+parser.add_argument("-virtualEnvironment", "--virtualEnvironment", "-venv", dest="virtualEnvironment", action="store_true", help="Install the report requirements into a dedicated virtual environment that is reused until the requirements change")
+parser.add_argument("-registrationJobs", "--registrationJobs", type=int, help="Number of reports to register with the server at the same time (Default: %s)" %registration_scheduler.schedulerSettings["maxConcurrent"])
+parser.add_argument("-registrationRetries", "--registrationRetries", type=int, help="Retries for a registration the server throttles or fails with a 5xx response (Default: %s)" %registration_scheduler.schedulerSettings["maxRetries"])
+parser.add_argument("-inProcessRegistration", "--inProcessRegistration", action="store_true", help="Register reports that support it within the installer process")
+parser.add_argument("-stepTimeout", "--stepTimeout", action="append", default=[], metavar="STEP=SECONDS", help="Timeout for a type of step (clone, pull, pip, registration, describe, git).  May be repeated")
+parser.add_argument("-streamOutput", "--streamOutput", action="store_true", help="Display the output of each git, pip and registration command while it runs")
+parser.add_argument("-reportJson", "--reportJson", "-report-json", dest="reportJson", metavar="PATH", help="Write a JSON report of the run including the time taken by each step")
+parser.add_argument("-inventory", "--inventory", help="JSON file listing the installations (installDir, server, token, certificatePath) for the fleet command")
+parser.add_argument("-fleetJobs", "--fleetJobs", type=int, default=4, help="Number of installations to update concurrently with the fleet command (Default: 4)")
+parser.add_argument("-archiveSource", "--archiveSource", metavar="URL_OR_DIR", help="Fetch the reports from the source archives listed in archives.json at this URL or directory instead of cloning them with git")
+parser.add_argument("-bundleFile", "--bundleFile", metavar="PATH", help="File to write the bundle of reports and wheels to with the bundle command")
+parser.add_argument("-fromBundle", "--fromBundle", "-from-bundle", dest="fromBundle", metavar="PATH", help="Install the reports and their requirements from a bundle written by the bundle command without fetching anything")
+parser.add_argument("-logMaxMB", "--logMaxMB", type=float, help="Size in MB the installer log may grow to before it is rotated and compressed (Default: %s)" %install_logging.logSettings["maxMB"])
+parser.add_argument("-logBackups", "--logBackups", type=int, help="Number of rotated installer logs kept for a run (Default: %s)" %install_logging.logSettings["backupCount"])
+parser.add_argument("-keepLogs", "--keepLogs", type=int, help="Number of previous runs whose logs are kept compressed in the _logs folder, 0 to keep none (Default: %s)" %install_logging.logSettings["keepRuns"])
+parser.add_argument("-plan", "--plan", action="store_true", help="Show what the install would do (clone, pull, reinstall requirements or register each report) and how long it should take without changing anything")
+parser.add_argument("-wheelhouse", "--wheelhouse", help="Local wheel directory used to install requirements without a package index")
 
 #------------------------------------------------------------------------------------------------------------------------------
 def main():
@@ -59,141 +108,119 @@ def main():
 
     args = parser.parse_args()
 
-    systemDetails = validate_arguments(args)
+    # A plan is only made for an install so do not run anything else in its place
+    if args.plan and args.command != "install":
+        print("    **ERROR**  -plan can only be used with the install command")
+        sys.exit()
 
-    reportInstallationFolder = systemDetails["reportInstallationFolder"]
-    propertiesFile = systemDetails["propertiesFile"]
-   
-    # Create or update the properties files since the report registration script uses it 
-    manage_properties_file(systemDetails)
+    install_logging.configure_logging(logfileName, args.logMaxMB, args.logBackups, args.keepLogs, keepPreviousRun=args.plan or args.command == "status")
 
-    # Now install the reports
-    for repository in report_repositories.repositories:
-        print("\n+++++++++++++++++++++++++++++++++++++++++++++++++++++")
-        logger.info("    Installing: %s" %repository)
-        print("    Installing: %s" %repository)
+    configure_step_timeouts(args.stepTimeout)
 
-        reportName = repository.split("/")[-1].split(".")[0]  # Remove the base and .git from the repo name
-        reportFolder = os.path.join(reportInstallationFolder, reportName)
+    selectedReports = get_selected_reports(args)
 
-        # Does the directory repo already exist?
-        if os.path.isdir(reportFolder):
-            logger.info("        The report folder for %s already exists. Checking for updates." %reportName)
-            print("        The report folder for %s already exists. Checking for updates." %reportName)
+    if args.command == "prefetch":
+        prefetch_wheels(args, selectedReports)
+        return
 
-            os.chdir(reportFolder)
-            pullResponse = subprocess.run(gitPullCommand, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if args.plan:
+        plan_install(args, selectedReports)
+        return
 
-            if "Already up to date." in pullResponse.stdout.decode() or  "Already up-to-date" in pullResponse.stdout.decode():
-                logger.info("        The latest updates are already available.")
-                print("        The latest updates are already available.")
+    # The bundle stands in for the report archives and the wheelhouse
+    if args.fromBundle and args.command in ("install", "fleet"):
+        open_install_bundle(args)
 
-            else:
+    if args.command == "fleet":
+        install_fleet(args, selectedReports)
+        return
 
-                logger.info("        Latest updates have been pulled.")
-                print("        Latest updates have been pulled.")
-                
-                # Since there was an update verify requiremetns are met
-                sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
-                logger.info("        Updating requirements")
-                print("        Updating requirements")
-                requirementsCommand = pipCommand + " install -r " + reportRequirementsFile
-                requirementsResponse = subprocess.run(requirementsCommand, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                logger.debug(requirementsResponse.stdout.decode())
-                
-                # Since there was an update update the registration
-                sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
-                logger.info("        Updating report registration for %s" %reportName)
-                print("        Updating report registration for %s" %reportName)
-                registrationCommand = pythonCommand + " " + reportRegistrationFile + " -update"
-                registrationResponse = subprocess.run(registrationCommand, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                logger.debug(registrationResponse.stdout.decode())
-
-        else:
-            logger.info("        Cloning (recursively) %s" %repository)
-            print("        Cloning (recursively) %s" %repository)
+    if args.command == "status":
+        show_report_status(args, selectedReports)
+        return
 
-            sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
-            # Clone the repsoitory and bring in the submodules
-        
-            gitCloneCommand = gitCloneCommandBase + " " + repository + " " + reportFolder
-
-            cloneResponse = subprocess.run(gitCloneCommand, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            logger.debug(cloneResponse.stdout.decode())
-
-            requirementsCommand = pipCommand + " install -r " + reportRequirementsFile + " --quiet"
-            registrationCommand = pythonCommand + " " + reportRegistrationFile + " -reg"
-            os.chdir(reportFolder)
-
-            sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
-            logger.info("        Installing requirements")
-            print("        Installing requirements")
-            requirementsResponse = subprocess.run(requirementsCommand, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            logger.debug(requirementsResponse.stdout.decode())
-
-            sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
-            logger.info("        Registering report %s" %reportName)
-            print("        Registering report %s" %reportName)
-            registrationResponse = subprocess.run(registrationCommand, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            
-            if "Report registration succeeded!" in registrationResponse.stdout.decode():
-                print("        The report has been reigstered")
-                logging.info("        The report has been reigstered")
-
-            elif "Report registration failed!" in registrationResponse.stdout.decode():
-                logger.error(registrationResponse.stdout.decode())
-                print("        There was a probem encountered while attempting to register the report")
-                print("            %s" %registrationResponse.stdout.decode())
-
-                # Copy the installation log file to the installer directory
-                if os.path.isfile(defaultRegistrationLogFileName):
-                
-                    movedLogFile = os.path.join(installerDirectory, reportName + "_installation.log")
-                    logger.info("Moving report registration logfile to %s" %movedLogFile)
-                    try:
-                        shutil.copyfile(defaultRegistrationLogFileName, movedLogFile)
-                    except:
-                        logger.error("Unable to copy logfile to %s" %movedLogFile)
-                else:
-                    logger.error("Log file does not exist: %s" %defaultRegistrationLogFileName)
+    if args.command == "bundle":
+        bundle_reports(args, selectedReports)
+        return
 
-                os.chdir(reportInstallationFolder)
+    with timed_phase("validate_arguments"):
+        systemDetails = validate_arguments(args)
 
-                try:
-                    shutil.rmtree(reportFolder, onerror=change_file_read_attribute)
-                    print("        Removing folder: %s" %reportFolder)
-                except:
-                    print("        Manually remove folder: %s" %reportFolder)
-                print("        Verify server/token information and attempt to install again") 
-                sanitize_properties_file(propertiesFile)              
-                sys.exit()
-            else:
-                print("        Unknown response while attempting to register report")
-                logger.error("        Unknown response while attempting to register report")
-                logger.error(registrationResponse.stdout.decode())
-
-
-        # Collect the report version for summary
-        reportVersion = subprocess.check_output(gitDescribeCommand, shell=True)
-        reportVersions[reportName] = reportVersion.rstrip().decode()
+    propertiesFile = systemDetails["propertiesFile"]
 
-        # Copy the installation log file to the installer directory
-        if os.path.isfile(defaultRegistrationLogFileName):
-        
-            movedLogFile = os.path.join(installerDirectory, reportName + "_installation.log")
-            logger.info("Moving report registration logfile to %s" %movedLogFile)
-            print("        Moving report registration logfile to %s" %movedLogFile)
-            try:
-                shutil.copyfile(defaultRegistrationLogFileName, movedLogFile)
-            except:
-                logger.error("Unable to copy logfile to %s" %movedLogFile)
-                print("Unable to copy logfile to %s" %movedLogFile)
+    # A cached (or very quick) server check is already known so report it up front
+    if systemDetails["releaseCheck"]["future"].done() and not wait_for_release_check(systemDetails):
+        print("Exiting installer")
+        sys.exit()
 
+    # Keep track of which requirements have already been installed so unchanged requirements can skip pip
+    requirementsCacheFile = os.path.join(systemDetails["reportInstallationFolder"], requirementsCacheFileName)
+    systemDetails["requirementsCache"] = report_requirements.load_requirements_cache(requirementsCacheFile)
+    if args.forceRequirements:
+        systemDetails["requirementsCache"]["reports"] = {}
+
+    # What was installed and registered by previous runs so only missing or changed steps are done
+    installStateFile = os.path.join(systemDetails["reportInstallationFolder"], installStateFileName)
+    systemDetails["installState"] = install_state.load_install_state(installStateFile)
+
+    # Reports can be fetched as source archives rather than cloned
+    if args.archiveSource:
+        systemDetails["archiveSource"] = args.archiveSource
+        systemDetails["archiveManifest"] = load_archive_manifest(args.archiveSource)
+
+    systemDetails["shallowClone"] = args.shallow
+    # The registration scripts need the virtual environment's interpreter so they can not run in process
+    systemDetails["inProcessRegistration"] = args.inProcessRegistration and not args.virtualEnvironment
+    systemDetails["streamOutput"] = args.streamOutput
+    if args.gitCache:
+        systemDetails["gitReferenceStore"] = os.path.join(installerDirectory, gitReferenceStoreFolderName)
+        systemDetails["updateReferenceStore"] = not args.gitCacheReadOnly
+
+    numberOfJobs = max(1, args.jobs)
+    logger.info("Installing %s reports using %s job(s)" %(len(selectedReports), numberOfJobs))
+
+    registration_scheduler.configure_scheduler(maxConcurrent=args.registrationJobs, maxRetries=args.registrationRetries)
+
+    # Compare the local and remote heads up front so only reports that changed are pulled
+    if not args.alwaysPull and not args.archiveSource:
+        print("    Checking report repositories for updates")
+        # Pinned reports are compared with their ref rather than the remote branch
+        reportFolders = [os.path.join(systemDetails["reportInstallationFolder"], get_report_name(report["repository"])) for report in selectedReports if not report["ref"]]
+        with timed_phase("update_check"):
+            systemDetails["remoteChanges"] = git_operations.check_reports_for_updates(reportFolders)
+
+    if args.batchRequirements or args.virtualEnvironment:
+        # Bring all of the reports up to date first so every requirements file is
+        # available, resolve them in a single pip run and then finish each report
+        with timed_phase("report_sources"):
+            sourceResults = run_report_tasks(update_report_source, [(report, systemDetails) for report in selectedReports], numberOfJobs, displayOutput=False)
+        if args.virtualEnvironment:
+            with timed_phase("virtual_environment"):
+                prepare_virtual_environment(sourceResults, systemDetails)
+            batchInstalled = True
         else:
-            print("Log file does not exist: %s" %defaultRegistrationLogFileName)
-            logger.error("Log file does not exist: %s" %defaultRegistrationLogFileName)
+            with timed_phase("batch_requirements"):
+                batchInstalled = install_batch_requirements(sourceResults, systemDetails)
+        # What is left is mostly registration so allow as many tasks as registrations
+        installJobs = max(numberOfJobs, registration_scheduler.schedulerSettings["maxConcurrent"])
+        with timed_phase("report_installs"):
+            reportResults = run_report_tasks(complete_report_install, [(reportResult, systemDetails, not batchInstalled) for reportResult in sourceResults], installJobs)
+    else:
+        # Each report is handled as its own task so the clone/pull -> requirements
+        # -> registration chain can overlap across reports
+        with timed_phase("report_installs"):
+            reportResults = run_report_tasks(install_report, [(report, systemDetails) for report in selectedReports], numberOfJobs)
 
-        os.chdir(reportInstallationFolder)  # Go back to the custom_report_scripts folder for the next iteration
+    for reportResult in reportResults:
+        if reportResult["version"] is not None:
+            reportVersions[reportResult["reportName"]] = reportResult["version"]
+
+    # Reports that were already current never waited on the server check so confirm it now
+    if not wait_for_release_check(systemDetails):
+        print("Exiting installer")
+        sanitize_properties_file(propertiesFile)
+        write_run_report(args, systemDetails, reportResults)
+        sys.exit()
 
     #----------------------------------------------
     # Now that that reports are installed remove the token from the properties file
@@ -206,136 +233,1457 @@ def main():
 
         print(f"    {report:70} - {reportVersions[report]:10}")
 
+    skippedReports = sorted([reportResult for reportResult in reportResults if reportResult["action"] == "skipped"], key=lambda reportResult: reportResult["reportName"])
+    if skippedReports:
+        print("")
+        print("Reports Not Supported By Code Insight %s" %systemDetails["releaseVersion"])
+        for reportResult in skippedReports:
+            print("    %-70s - %s" %(reportResult["reportName"], reportResult["skipReason"]))
+
+    # A failed report does not stop the others so list them all at the end
+    failedReports = sorted([reportResult for reportResult in reportResults if reportResult["action"] == "failed" or reportResult["registrationFailed"]], key=lambda reportResult: reportResult["reportName"])
+    if failedReports:
+        print("")
+        print("Reports That Could Not Be Installed")
+        for reportResult in failedReports:
+            print("    %-70s - %s" %(reportResult["reportName"], reportResult["failureReason"]))
+        print("    These reports will be retried the next time the installer is run")
+        if any(reportResult["registrationFailed"] for reportResult in failedReports):
+            print("        Verify server/token information and attempt to install again") 
+
+    write_run_report(args, systemDetails, reportResults)
 
 #------------------------------------------------------------
-def validate_arguments(args):
+def write_run_report(args, systemDetails, reportResults):
 
-    installDir = args.installationDirctory
-    serverURL = args.server
-    adminAuthToken = args.token
-    certificatePath = args.certificatePath
+    if not args.reportJson:
+        return
 
-    systemDetails = {}
+    runDetails = {}
+    runDetails["installerVersion"] = __version__
+    runDetails["serverURL"] = systemDetails["serverURL"]
+    runDetails["releaseVersion"] = systemDetails.get("releaseVersion")
+    runDetails["jobs"] = max(1, args.jobs)
+    runDetails["batchRequirements"] = args.batchRequirements
+    runDetails["virtualEnvironment"] = args.virtualEnvironment
 
-    # Verify the Code Insight installation to ensure there is a location for the reports to go
-    reportInstallationFolder =  verify_installation_directory(installDir)
-    if "error" in reportInstallationFolder:
-        print(reportInstallationFolder["error"])
+    if install_timing.write_run_report(args.reportJson, reportResults, runDetails):
+        print("    Run report written to %s" %args.reportJson)
+
+#------------------------------------------------------------
+def run_report_tasks(taskFunction, taskArguments, numberOfJobs, displayOutput=True):
+
+    reportResults = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=numberOfJobs) as executor:
+        futures = [executor.submit(taskFunction, *arguments) for arguments in taskArguments]
+
+        for future in concurrent.futures.as_completed(futures):
+            if future.cancelled():
+                continue
+
+            reportResult = future.result()
+            reportResults.append(reportResult)
+
+            # Display the captured output for the report as a single block so it does not interleave
+            if displayOutput:
+                print_report_output(reportResult)
+
+    return reportResults
+
+#------------------------------------------------------------
+def get_selected_reports(args):
+
+    reportSelection = report_selection.select_reports(report_repositories.reportCatalog, args.only, args.exclude)
+
+    for selector in reportSelection["unmatched"]:
+        logger.warning("    No reports match %s" %selector)
+        print("    **WARNING**  No reports match %s" %selector)
+
+    if not reportSelection["reports"]:
+        logger.error("    No reports were selected")
+        print("    **ERROR**  No reports were selected.  Please check the -only and -exclude values")
         sys.exit()
-    
-    # Now that we know th location is there already an existing properties file we can use?
-    propertiesFile = os.path.join(reportInstallationFolder, propertiesFileName)
 
-    # Does the properties file alrady exist?
-    if os.path.isfile(propertiesFile):
-        logger.info("    Properties file %s was found" %propertiesFile)
-        print("    Properties file %s was found" %propertiesFile)
-        
-        # Open the file up to see what's there and compare to what's provided
-        filePtr = open(propertiesFile, "r")
-        configData = json.load(filePtr)
-        filePtr.close
+    if args.only or args.exclude:
+        print("    Selected %s of %s report(s)" %(len(reportSelection["reports"]), len(report_repositories.reportCatalog)))
+
+    return reportSelection["reports"]
+
+#------------------------------------------------------------
+def install_report(report, systemDetails):
+
+    reportResult = update_report_source(report, systemDetails)
+
+    return complete_report_install(reportResult, systemDetails)
+
+#------------------------------------------------------------
+def update_report_source(report, systemDetails):
+
+    reportInstallationFolder = systemDetails["reportInstallationFolder"]
+
+    repository = report["repository"]
+    reportName = get_report_name(repository)
+    reportFolder = os.path.join(reportInstallationFolder, reportName)
+
+    reportResult = {}
+    reportResult["reportName"] = reportName
+    reportResult["repository"] = repository
+    reportResult["reportFolder"] = reportFolder
+    reportResult["action"] = None
+    reportResult["commit"] = None
+    reportResult["submodules"] = None
+    reportResult["version"] = None
+    reportResult["registration"] = None
+    reportResult["registrationFailed"] = False
+    reportResult["failureReason"] = None
+    reportResult["stagingFolder"] = None
+    reportResult["output"] = []
+
+    report_message(reportResult, "    Installing: %s" %repository)
+
+    # Reports limited to some Code Insight releases need the server release before anything is fetched
+    if (report["minimumRelease"] or report["maximumRelease"]) and "releaseCheck" in systemDetails:
+        if wait_for_release_check(systemDetails):
+            skipReason = report_selection.get_unsupported_reason(report, systemDetails["releaseVersion"])
+            if skipReason:
+                report_message(reportResult, "        Skipping %s since it %s" %(reportName, skipReason))
+                reportResult["action"] = "skipped"
+                reportResult["skipReason"] = skipReason
+                return reportResult
+
+    if "archiveManifest" in systemDetails:
+        return update_report_archive(reportResult, systemDetails)
+
+    # New versions are prepared in a staging folder next to the report and only swapped in once complete
+    stagingFolder = get_staging_folder(reportFolder)
+
+    # Does the directory repo already exist?  (A report installed from an archive has no repo to update)
+    if os.path.isdir(os.path.join(reportFolder, ".git")):
+        report_message(reportResult, "        The report folder for %s already exists. Checking for updates." %reportName)
+
+        # Was the report already found to be current by the remote update check?
+        remoteCheck = systemDetails.get("remoteChanges", {}).get(reportFolder)
+        if remoteCheck and remoteCheck["changed"] is False:
+            report_message(reportResult, "        The latest updates are already available.")
+            reportResult["action"] = "current"
+            reportResult["commit"] = remoteCheck["commit"]
+            reportResult["submodules"] = remoteCheck["submodules"]
+            return check_install_state(reportResult, systemDetails)
+
+        # Bring the shared object store up to date first so the fetch can borrow from it
+        if systemDetails.get("gitReferenceStore") and systemDetails["updateReferenceStore"]:
+            git_operations.update_reference_store(systemDetails["gitReferenceStore"], repository)
+            git_operations.update_submodule_reference_store(systemDetails["gitReferenceStore"], repository, reportFolder)
+
+        # Fetching leaves the installed checkout as it is
+        with timed_step(reportResult, "pull"):
+            fetchResponse = git_operations.fetch_report_updates(reportFolder, report["ref"], get_output_handler(reportResult, systemDetails))
+
+        if fetchResponse["returnCode"] != 0:
+            if fetchResponse["timedOut"]:
+                report_message(reportResult, "        Timed out while checking for updates.  Leaving the current version in place.", logging.ERROR)
+            else:
+                report_message(reportResult, "        Unable to check for updates.  Leaving the current version in place.", logging.ERROR)
+                logger.error(fetchResponse["output"])
+            reportResult["action"] = "current"
+            return reportResult
+
+        if fetchResponse["commit"] == git_operations.get_head_commit(reportFolder) and not git_operations.get_submodule_status(reportFolder)["drifted"]:
+            report_message(reportResult, "        The latest updates are already available.")
+            reportResult["action"] = "current"
+            return check_install_state(reportResult, systemDetails)
+
+        with timed_step(reportResult, "pull"):
+            stageResponse = stage_report_update(reportFolder, stagingFolder, fetchResponse["commit"], bool(report["ref"]), get_output_handler(reportResult, systemDetails))
+
+        if stageResponse["returnCode"] != 0:
+            report_message(reportResult, "        Unable to apply the updates.  Leaving the current version in place.", logging.ERROR)
+            logger.error(stageResponse["output"])
+            remove_folder(stagingFolder)
+            reportResult["action"] = "failed"
+            reportResult["failureReason"] = "Unable to apply the updates"
+            return reportResult
+
+        report_message(reportResult, "        Latest updates have been staged.")
+        reportResult["stagingFolder"] = stagingFolder
+        reportResult["action"] = "update"
+
+    elif os.path.isdir(os.path.join(stagingFolder, ".git")):
+        # An earlier install stopped after the clone so bring that copy up to date rather than cloning again
+        report_message(reportResult, "        Resuming the staged install of %s" %repository)
+
+        with timed_step(reportResult, "clone"):
+            cloneResponse = git_operations.fetch_report_updates(stagingFolder, report["ref"], get_output_handler(reportResult, systemDetails))
+            if cloneResponse["returnCode"] == 0:
+                cloneResponse = git_operations.checkout_report_commit(stagingFolder, cloneResponse["commit"], bool(report["ref"]), get_output_handler(reportResult, systemDetails))
+
+        record_clone_response(reportResult, cloneResponse, stagingFolder)
+
     else:
-        logger.info("    The properties file does not currently exist. Relying on command line arugments")
-        print("    The properties file does not currently exist. Relying on command line arugments")
-        configData = {}
+        report_message(reportResult, "        Cloning (recursively) %s" %repository)
 
-    if serverURL is None:
-        # There was no server information passed so check configData    
-        if "core.server.url" in configData:
-            if configData["core.server.url"] is None:
-                logger.error("    The Code Insight Server URL was not provided and is not contained in the properties file")
-                logger.error("               Please provide the server and port URL via the -server flag")
-                print("    **ERROR**  The Code Insight Server URL was not provided and is not contained in the properties file")
-                print("               Please provide the server and port URL via the -server flag")
-                sys.exit()
+        if os.path.isdir(stagingFolder):
+            remove_folder(stagingFolder)
+
+        # Pinned reports are cloned at their tag or branch
+        refOptions = ["--branch", report["ref"]] if report["ref"] else []
+
+        # Clone the repsoitory and bring in the submodules
+        with timed_step(reportResult, "clone"):
+            if systemDetails.get("gitReferenceStore"):
+                cloneOptions = gitBloblessCloneOptions if systemDetails.get("shallowClone") else []
+                cloneResponse = git_operations.clone_with_reference_store(repository, stagingFolder, systemDetails["gitReferenceStore"], cloneOptions + refOptions, systemDetails.get("shallowClone"), systemDetails["updateReferenceStore"])
             else:
-                serverURL = configData["core.server.url"]
-                print("    Using server details from properties file:  %s" %serverURL)
-                logger.info("    Using server details from properties file:  %s" %serverURL)
+                gitCloneCommand = gitCloneCommandBase + refOptions + [repository, stagingFolder]
+                if systemDetails.get("shallowClone"):
+                    gitCloneCommand = gitCloneCommandBase + gitShallowCloneOptions + refOptions + [repository, stagingFolder]
+
+                cloneResponse = run_command(gitCloneCommand, reportInstallationFolder, "clone", get_output_handler(reportResult, systemDetails))
+
+        record_clone_response(reportResult, cloneResponse, stagingFolder)
+
+    return reportResult
+
+#------------------------------------------------------------
+def update_report_archive(reportResult, systemDetails):
+
+    reportName = reportResult["reportName"]
+    reportFolder = reportResult["reportFolder"]
+    stagingFolder = get_staging_folder(reportFolder)
+
+    reportEntry = systemDetails["archiveManifest"]["reports"].get(reportName)
+    if reportEntry is None:
+        report_message(reportResult, "        %s is not listed in the archive manifest" %reportName, logging.ERROR)
+        reportResult["action"] = "failed"
+        reportResult["failureReason"] = "Not listed in the archive manifest"
+        return reportResult
+
+    # The archive checksum identifies the installed version so there is nothing to fetch if it has not changed
+    reportState = install_state.get_report_state(systemDetails.get("installState") or {"reports" : {}}, reportName)
+    if os.path.isdir(reportFolder) and reportState and reportState.get("archiveHash") == reportEntry["sha256"]:
+        report_message(reportResult, "        The latest version is already installed.")
+        reportResult["action"] = "current"
+        reportResult["commit"] = reportState.get("commit")
+        reportResult["archiveHash"] = reportEntry["sha256"]
+        if install_state.get_required_action(reportState, None, None, systemDetails["serverURL"]) == "register":
+            report_message(reportResult, "        The report has not been registered with %s" %systemDetails["serverURL"])
+            reportResult["action"] = "register"
+            reportResult["archiveVersion"] = reportState.get("version")
         else:
-            logger.error("               Server details not in properties file.  Please provide the server details via the -server flag")
-            print("    **ERROR**  Server details not in properties file.  Please provide the server details via the -server flag")
-            sys.exit()
+            reportResult["version"] = reportState.get("version")
+        return reportResult
+
+    if os.path.isdir(stagingFolder):
+        remove_folder(stagingFolder)
+
+    report_message(reportResult, "        Fetching %s %s from %s" %(reportEntry["archive"], reportEntry.get("version") or "", systemDetails["archiveSource"]))
 
+    with timed_step(reportResult, "clone" if not os.path.isdir(reportFolder) else "pull"):
+        archiveResponse = report_archives.fetch_report_archive(systemDetails["archiveSource"], reportEntry, stagingFolder)
+
+    if "error" in archiveResponse:
+        report_message(reportResult, "        Unable to fetch the report archive.  %s" %archiveResponse["error"], logging.ERROR)
+        remove_folder(stagingFolder)
+        reportResult["action"] = "failed"
+        reportResult["failureReason"] = "Unable to fetch the report archive"
+        return reportResult
+
+    report_message(reportResult, "        The report archive has been verified and staged.")
+    reportResult["action"] = "update" if os.path.isdir(reportFolder) else "clone"
+    reportResult["stagingFolder"] = stagingFolder
+    reportResult["commit"] = reportEntry.get("commit")
+    # The manifest version only becomes the report's version once it is installed and registered
+    reportResult["archiveVersion"] = archiveResponse["version"] or "Unknown"
+    reportResult["previousVersion"] = reportState.get("version") if reportState else None
+    reportResult["archiveHash"] = archiveResponse["sha256"]
+
+    return reportResult
+
+#------------------------------------------------------------
+def load_archive_manifest(archiveSource):
+
+    print("    Reading the report archive manifest from %s" %archiveSource)
+    archiveManifest = report_archives.load_archive_manifest(archiveSource)
+    if "error" in archiveManifest:
+        logger.error("    %s" %archiveManifest["error"])
+        print("    **ERROR**  %s" %archiveManifest["error"])
+        sys.exit()
+
+    return archiveManifest
+
+#------------------------------------------------------------
+def record_clone_response(reportResult, cloneResponse, stagingFolder):
+
+    if cloneResponse["returnCode"] != 0:
+        report_message(reportResult, "        Unable to clone %s" %reportResult["repository"], logging.ERROR)
+        logger.error(cloneResponse["output"])
+        if os.path.isdir(stagingFolder):
+            remove_folder(stagingFolder)
+        reportResult["action"] = "failed"
+        reportResult["failureReason"] = "Unable to clone the report"
     else:
-        if serverURL.endswith("/"):
-            serverURL = serverURL[:-1]
+        reportResult["stagingFolder"] = stagingFolder
+        reportResult["action"] = "update" if os.path.isdir(reportResult["reportFolder"]) else "clone"
 
-        print("    Using server details provided as argurment: %s" %serverURL)
-        logger.info("    Using server details provided as argurment: %s" %serverURL)
+#------------------------------------------------------------
+def stage_report_update(reportFolder, stagingFolder, commit, pinned, outputHandler):
 
-    if adminAuthToken is None:
-        # There was no token information passed so check configData    
-        if "core.server.token" in configData:
-            if configData["core.server.token"] is None:
-                logger.error("    **ERROR**  The Code Insight Admin authorization token was not provided and is not contained in the properties file")
-                logger.error("               Please provide the admin auth token the -token flag")
-                print("    **ERROR**  The Code Insight Admin authorization token was not provided and is not contained in the properties file")
-                print("               Please provide the admin auth token the -token flag")
-                sys.exit()
+    if os.path.isdir(stagingFolder):
+        remove_folder(stagingFolder)
+
+    # The copy keeps the fetched objects and submodules so only the checkout changes
+    try:
+        shutil.copytree(reportFolder, stagingFolder, symlinks=True)
+    except (OSError, shutil.Error) as error:
+        return {"returnCode" : None, "output" : str(error), "timedOut" : False}
+
+    return git_operations.checkout_report_commit(stagingFolder, commit, pinned, outputHandler)
+
+#------------------------------------------------------------
+def complete_report_install(reportResult, systemDetails, installRequirements=True):
+
+    reportName = reportResult["reportName"]
+    reportFolder = reportResult["reportFolder"]
+    registrationLogFile = os.path.join(reportFolder, defaultRegistrationLogFileName)
+
+    if reportResult["action"] in ("failed", "skipped"):
+        return reportResult
+
+    if reportResult["action"] in ("update", "clone", "register"):
+
+        if reportResult["action"] == "update":
+            requirementsMessage = "        Updating requirements"
+            registrationAction = "update"
+        else:
+            requirementsMessage = "        Installing requirements"
+            registrationAction = "register"
+
+        # Since there was an update verify requiremetns are met
+        if systemDetails.get("virtualEnvironmentFailed"):
+            return abandon_report_install(reportResult, "Unable to prepare the virtual environment")
+        elif systemDetails.get("registrationPython"):
+            report_message(reportResult, "        Requirements installed in the virtual environment")
+        elif not installRequirements:
+            report_message(reportResult, "        Requirements installed by the batched requirements install")
+        elif not install_report_requirements(reportResult, systemDetails, requirementsMessage, ["--quiet"] if registrationAction == "register" else []):
+            return abandon_report_install(reportResult, "Unable to install the requirements")
+
+        if not confirm_release_check(reportResult, systemDetails):
+            return reportResult
+
+        # Registration runs from the installed location so swap the staged version in first
+        if reportResult["stagingFolder"] and not activate_staged_report(reportResult):
+            return abandon_report_install(reportResult, "Unable to replace the installed version")
+
+        if registrationAction == "update":
+            report_message(reportResult, "        Updating report registration for %s" %reportName)
+        else:
+            report_message(reportResult, "        Registering report %s" %reportName)
+
+        with timed_step(reportResult, "registration"):
+            registrationResult = registration_scheduler.run_scheduled_registration(reportName, report_registration.run_registration, reportName, reportFolder, registrationAction, systemDetails, systemDetails.get("registrationPython", pythonCommand), systemDetails.get("inProcessRegistration"), get_output_handler(reportResult, systemDetails))
+        reportResult["registration"] = registrationResult
+        
+        if registrationResult["status"] == "succeeded":
+            report_message(reportResult, "        The report has been reigstered")
+            if registrationResult["attempts"] > 1:
+                report_message(reportResult, "        The server was busy so it took %s attempts" %registrationResult["attempts"])
+
+        elif registrationResult["status"] == "failed":
+            logger.error(registrationResult["message"])
+            reportResult["output"].append("        There was a probem encountered while attempting to register the report")
+            reportResult["output"].append("            %s" %registrationResult["message"])
+            reportResult["registrationFailed"] = True
+            if registrationResult["serverBusy"]:
+                reportResult["failureReason"] = "Registration failed, the server was busy after %s attempt(s)" %registrationResult["attempts"]
             else:
-                adminAuthToken = configData["core.server.token"]
-                print("    Using autorization token from properties file.")
-                logger.info("    Using autorization token from properties file.")
+                reportResult["failureReason"] = "Registration failed"
+
+            copy_registration_log(reportResult, registrationLogFile)
+
+            if reportResult.get("previousFolder"):
+                # Put the version that was working back in place
+                rollback_report(reportResult)
+            else:
+                # Keep the report so only the registration is retried by the next run
+                record_install_state(reportResult, systemDetails)
+
+            return reportResult
         else:
-            logger.error("               Token details not in properties file.  Please provide the token details via the -token flag")
-            print("    **ERROR**  Token details not in properties file.  Please provide the token details via the -token flag")
+            report_message(reportResult, "        Unknown response while attempting to register report", logging.ERROR)
+            logger.error(registrationResult["message"])
+
+
+    # Collect the report version for summary (unless it is already known from the install state or archive manifest)
+    if reportResult["version"] is None and reportResult.get("archiveVersion"):
+        reportResult["version"] = reportResult["archiveVersion"]
+    elif reportResult["version"] is None:
+        with timed_step(reportResult, "describe"):
+            reportResult["version"] = version_inventory.get_report_version(reportFolder)["version"]
+
+    record_install_state(reportResult, systemDetails)
+
+    copy_registration_log(reportResult, registrationLogFile)
+
+    return reportResult
+
+#------------------------------------------------------------
+def copy_registration_log(reportResult, registrationLogFile):
+
+    # Add the registration script's log to the report log.  There is only a new log if the registration
+    # script was run by this install (in process registrations log to the installer log)
+    if not reportResult["registration"] or reportResult["registration"]["method"] != "subprocess":
+        pass
+    elif os.path.isfile(registrationLogFile):
+    
+        reportLogFile = install_logging.get_report_log_file(reportResult["reportName"])
+        report_message(reportResult, "        Adding report registration logfile to %s" %reportLogFile)
+        try:
+            install_logging.append_report_log_file(reportResult["reportName"], registrationLogFile)
+        except OSError as error:
+            report_message(reportResult, "Unable to add logfile to %s: %s" %(reportLogFile, error), logging.ERROR)
+
+    else:
+        report_message(reportResult, "Log file does not exist: %s" %registrationLogFile, logging.ERROR)
+
+#------------------------------------------------------------
+def get_staging_folder(reportFolder):
+    return os.path.join(os.path.dirname(reportFolder), "." + os.path.basename(reportFolder) + ".staging")
+
+#------------------------------------------------------------
+def get_previous_folder(reportFolder):
+    return os.path.join(os.path.dirname(reportFolder), "." + os.path.basename(reportFolder) + ".previous")
+
+#------------------------------------------------------------
+def get_source_folder(reportResult):
+    # The staged version until it has been swapped in, otherwise the installed report
+    return reportResult.get("stagingFolder") or reportResult["reportFolder"]
+
+#------------------------------------------------------------
+def activate_staged_report(reportResult):
+
+    reportFolder = reportResult["reportFolder"]
+    stagingFolder = reportResult["stagingFolder"]
+    previousFolder = get_previous_folder(reportFolder)
+
+    # Each step is a rename so the installed version is never partly replaced
+    try:
+        if os.path.isdir(reportFolder):
+            if os.path.isdir(previousFolder):
+                remove_folder(previousFolder)
+            os.rename(reportFolder, previousFolder)
+            reportResult["previousFolder"] = previousFolder
+        os.rename(stagingFolder, reportFolder)
+    except OSError as error:
+        report_message(reportResult, "        Unable to swap in the new version of %s: %s" %(reportResult["reportName"], error), logging.ERROR)
+        if reportResult.get("previousFolder") and not os.path.isdir(reportFolder):
+            os.rename(previousFolder, reportFolder)
+        return False
+
+    reportResult["stagingFolder"] = None
+    return True
+
+#------------------------------------------------------------
+def rollback_report(reportResult):
+
+    reportFolder = reportResult["reportFolder"]
+    failedFolder = get_staging_folder(reportFolder)
+
+    report_message(reportResult, "        Restoring the previous version of %s" %reportResult["reportName"], logging.WARNING)
+    try:
+        os.rename(reportFolder, failedFolder)
+        os.rename(reportResult["previousFolder"], reportFolder)
+    except OSError as error:
+        report_message(reportResult, "        Unable to restore the previous version from %s: %s" %(reportResult["previousFolder"], error), logging.ERROR)
+        return False
+
+    reportResult["previousFolder"] = None
+    reportResult["version"] = reportResult.get("previousVersion")
+    reportResult["failureReason"] += ", the previous version was restored"
+    remove_folder(failedFolder)
+    return True
+
+#------------------------------------------------------------
+def abandon_report_install(reportResult, failureReason):
+
+    report_message(reportResult, "        %s.  %s was not installed." %(failureReason, reportResult["reportName"]), logging.ERROR)
+
+    # A new clone is kept so the next run carries on from it while a staged update
+    # is rebuilt from the installed version next time
+    if reportResult["stagingFolder"] and reportResult["action"] == "update":
+        remove_folder(reportResult["stagingFolder"])
+        reportResult["stagingFolder"] = None
+
+    # A staged archive leaves whatever was installed before in place
+    if "previousVersion" in reportResult:
+        reportResult["version"] = reportResult["previousVersion"]
+    reportResult["action"] = "failed"
+    reportResult["failureReason"] = failureReason
+    return reportResult
+
+#------------------------------------------------------------
+def remove_folder(folder):
+    try:
+        shutil.rmtree(folder, onerror=change_file_read_attribute)
+    except OSError as error:
+        logger.error("Unable to remove folder %s: %s" %(folder, error))
+
+#------------------------------------------------------------
+def confirm_release_check(reportResult, systemDetails):
+
+    # The source and requirements steps are local so they overlap with the server
+    # check but registration needs a server that is reachable with a valid token
+    if wait_for_release_check(systemDetails):
+        return True
+
+    report_message(reportResult, "        Skipping registration of %s since the server check failed" %reportResult["reportName"], logging.ERROR)
+    reportResult["registration"] = report_registration.create_registration_result("failed", "Server check failed", None)
+    reportResult["registrationFailed"] = True
+    reportResult["failureReason"] = "The server check failed"
+
+    # A staged version is left in place to pick up from next time and an installed
+    # report is recorded so the registration is retried by the next run
+    if not reportResult["stagingFolder"]:
+        record_install_state(reportResult, systemDetails)
+
+    return False
+
+#------------------------------------------------------------
+def check_install_state(reportResult, systemDetails):
+
+    installState = systemDetails.get("installState")
+    if installState is None:
+        return reportResult
+
+    reportName = reportResult["reportName"]
+    reportFolder = reportResult["reportFolder"]
+    reportState = install_state.get_report_state(installState, reportName)
+
+    if reportResult["commit"] is None:
+        reportResult["commit"] = git_operations.get_head_commit(reportFolder)
+    if reportResult["submodules"] is None:
+        reportResult["submodules"] = git_operations.get_submodule_status(reportFolder)["commits"]
+
+    requiredAction = install_state.get_required_action(reportState, reportResult["commit"], reportResult["submodules"], systemDetails["serverURL"])
+
+    if requiredAction == "update":
+        report_message(reportResult, "        The report changed since the last completed install.  Completing the update.")
+        reportResult["action"] = "update"
+    elif requiredAction == "register":
+        report_message(reportResult, "        The report has not been registered with %s" %systemDetails["serverURL"])
+        reportResult["action"] = "register"
+        reportResult["version"] = reportState.get("version")
+    elif reportState:
+        # Nothing has changed so the recorded version is still correct
+        reportResult["version"] = reportState.get("version")
+
+    return reportResult
+
+#------------------------------------------------------------
+def record_install_state(reportResult, systemDetails):
+
+    installState = systemDetails.get("installState")
+    if installState is None:
+        return
+
+    reportName = reportResult["reportName"]
+    reportFolder = reportResult["reportFolder"]
+    previousState = install_state.get_report_state(installState, reportName)
+
+    # Nothing to record if the report was current and already known
+    if reportResult["action"] == "current" and previousState:
+        return
+
+    reportState = {}
+    reportState["repository"] = reportResult["repository"]
+    if reportResult.get("archiveHash"):
+        # Archives have no git metadata so the archive checksum identifies what is installed
+        reportState["commit"] = reportResult["commit"]
+        reportState["submodules"] = None
+        reportState["archiveHash"] = reportResult["archiveHash"]
+    else:
+        reportState["commit"] = git_operations.get_head_commit(reportFolder)
+        reportState["submodules"] = git_operations.get_submodule_status(reportFolder)["commits"]
+    # An archive that is installed but not yet registered keeps its manifest version for the retry
+    reportState["version"] = reportResult["version"] or reportResult.get("archiveVersion")
+    reportState["serverURL"] = systemDetails["serverURL"]
+    # The step times are kept so a plan can estimate how long the next install will take
+    reportState["timings"] = dict(previousState.get("timings", {}) if previousState else {}, **reportResult.get("timings", {}))
+
+    requirementsFile = os.path.join(reportFolder, reportRequirementsFile)
+    reportState["requirementsHash"] = report_requirements.requirements_hash(requirementsFile) if os.path.isfile(requirementsFile) else None
+
+    if reportResult["registration"]:
+        reportState["registrationStatus"] = reportResult["registration"]["status"]
+    elif previousState:
+        reportState["registrationStatus"] = previousState.get("registrationStatus")
+    else:
+        reportState["registrationStatus"] = "unknown"  # Installed before the install state was tracked
+
+    install_state.update_report_state(installState, reportName, reportState)
+
+#------------------------------------------------------------
+def install_report_requirements(reportResult, systemDetails, message, pipOptions=[]):
+
+    reportName = reportResult["reportName"]
+    reportFolder = get_source_folder(reportResult)
+    requirementsFile = os.path.join(reportFolder, reportRequirementsFile)
+    requirementsCache = systemDetails["requirementsCache"]
+
+    if not os.path.isfile(requirementsFile):
+        report_message(reportResult, "        The report does not have a %s file" %reportRequirementsFile)
+        return True
+
+    if report_requirements.requirements_are_current(reportName, requirementsFile, requirementsCache):
+        report_message(reportResult, "        Requirements have not changed.  Skipping requirements install")
+        return True
+
+    report_message(reportResult, message)
+    requirementsCommand = pipCommand + ["install", "-r", requirementsFile] + pipOptions + systemDetails["pipInstallOptions"]
+    # Only the pip run is serialized so the clone, staging and registration of the other reports still overlap
+    with requirementsInstallLock, timed_step(reportResult, "requirements"):
+        requirementsResponse = run_command(requirementsCommand, reportFolder, "pip", get_output_handler(reportResult, systemDetails))
+
+    if requirementsResponse["returnCode"] != 0:
+        logger.error(requirementsResponse["output"])
+        return False
+
+    report_requirements.record_requirements(reportName, requirementsFile, requirementsCache)
+    return True
+
+#------------------------------------------------------------
+def install_batch_requirements(sourceResults, systemDetails):
+    logger.info("Entering install_batch_requirements")
+
+    reportInstallationFolder = systemDetails["reportInstallationFolder"]
+    requirementsCache = systemDetails["requirementsCache"]
+
+    # Only reports that were cloned or updated and have changed requirements need to be installed
+    reportRequirementsFiles = {}
+    for reportResult in sourceResults:
+        requirementsFile = os.path.join(get_source_folder(reportResult), reportRequirementsFile)
+        if reportResult["action"] in ("clone", "update", "register") and os.path.isfile(requirementsFile):
+            if not report_requirements.requirements_are_current(reportResult["reportName"], requirementsFile, requirementsCache):
+                reportRequirementsFiles[reportResult["reportName"]] = requirementsFile
+
+    print("\n+++++++++++++++++++++++++++++++++++++++++++++++++++++")
+    if not reportRequirementsFiles:
+        logger.info("    No report requirements need to be installed")
+        print("    No report requirements need to be installed")
+        return True
+
+    logger.info("    Merging requirements for %s report(s)" %len(reportRequirementsFiles))
+    print("    Merging requirements for %s report(s)" %len(reportRequirementsFiles))
+
+    mergedRequirements = report_requirements.merge_requirements(reportRequirementsFiles)
+
+    if mergedRequirements["conflicts"]:
+        logger.warning("    Conflicting report requirements were found")
+        print("    **WARNING**  Conflicting report requirements were found")
+        for conflict in mergedRequirements["conflicts"]:
+            logger.warning("        %s - %s" %(conflict["package"], conflict["reason"]))
+            print("        %s - %s" %(conflict["package"], conflict["reason"]))
+            for reportName in sorted(conflict["reports"]):
+                logger.warning("            %-60s %s" %(reportName, conflict["reports"][reportName]))
+                print("            %-60s %s" %(reportName, conflict["reports"][reportName]))
+        print("    Falling back to installing the requirements for each report individually")
+        return False
+
+    mergedRequirementsFile = os.path.join(reportInstallationFolder, mergedRequirementsFileName)
+    report_requirements.write_requirements_file(mergedRequirementsFile, mergedRequirements["requirements"], mergedRequirements["options"])
+
+    logger.info("    Installing %s merged requirement(s)" %len(mergedRequirements["requirements"]))
+    print("    Installing %s merged requirement(s)" %len(mergedRequirements["requirements"]))
+    sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
+
+    requirementsCommand = pipCommand + ["install", "-r", mergedRequirementsFile, "--quiet"] + systemDetails["pipInstallOptions"]
+    requirementsResponse = run_command(requirementsCommand, reportInstallationFolder, "pip")
+
+    if requirementsResponse["returnCode"] != 0:
+        logger.error("    The batched requirements install failed")
+        print("    The batched requirements install failed.  Falling back to installing the requirements for each report individually")
+        return False
+
+    for reportName in reportRequirementsFiles:
+        report_requirements.record_requirements(reportName, reportRequirementsFiles[reportName], requirementsCache)
+
+    return True
+
+#------------------------------------------------------------
+def prepare_virtual_environment(sourceResults, systemDetails):
+    logger.info("Entering prepare_virtual_environment")
+
+    # The environment holds the requirements of every installed report (not just the
+    # changed ones) so that it can be used for all of them once it is in place
+    reportRequirementsFiles = {}
+    for reportResult in sourceResults:
+        requirementsFile = os.path.join(get_source_folder(reportResult), reportRequirementsFile)
+        if reportResult["action"] not in ("failed", "skipped") and os.path.isfile(requirementsFile):
+            reportRequirementsFiles[reportResult["reportName"]] = requirementsFile
+
+    environmentsFolder = os.path.join(systemDetails["reportInstallationFolder"], virtualEnvironmentsFolderName)
+    if not os.path.isdir(environmentsFolder):
+        os.makedirs(environmentsFolder)
+
+    print("\n+++++++++++++++++++++++++++++++++++++++++++++++++++++")
+    print("    Preparing the virtual environment for %s report(s)" %len(reportRequirementsFiles))
+    sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
+
+    environmentDetails = virtual_environment.prepare_environment(environmentsFolder, reportRequirementsFiles, pythonCommand, systemDetails["pipInstallOptions"])
+
+    if "error" in environmentDetails:
+        logger.error("    %s" %environmentDetails["error"])
+        print("    **ERROR**  Unable to prepare the virtual environment.  Please see log for details")
+        systemDetails["virtualEnvironmentFailed"] = True
+        return False
+
+    for conflict in environmentDetails["conflicts"]:
+        logger.warning("    Conflicting requirement %s - %s" %(conflict["package"], conflict["reason"]))
+        print("    **WARNING**  Conflicting requirement %s - %s" %(conflict["package"], conflict["reason"]))
+
+    if environmentDetails["created"]:
+        logger.info("    Created virtual environment %s" %environmentDetails["folder"])
+        print("    Created virtual environment %s" %environmentDetails["folder"])
+    else:
+        logger.info("    Requirements unchanged, reusing virtual environment %s" %environmentDetails["folder"])
+        print("    Requirements unchanged, reusing virtual environment %s" %environmentDetails["folder"])
+
+    systemDetails["registrationPython"] = [environmentDetails["python"]]
+
+    return True
+
+#------------------------------------------------------------
+def prefetch_wheels(args, selectedReports):
+    logger.info("Entering prefetch_wheels")
+
+    if args.wheelhouse is None:
+        logger.error("    The -wheelhouse directory is required to prefetch the report requirements")
+        print("    **ERROR**  Please provide the directory to download the wheels to via the -wheelhouse flag")
+        sys.exit()
+
+    wheelhouse = os.path.abspath(args.wheelhouse)
+    if not os.path.isdir(wheelhouse):
+        os.makedirs(wheelhouse)
+
+    print("    Prefetching report requirements into %s" %wheelhouse)
+    logger.info("    Prefetching report requirements into %s" %wheelhouse)
+
+    # The reports are only needed long enough to read the requirements files
+    sourceFolder = tempfile.mkdtemp(prefix="report_sources_")
+    try:
+        sourceResults = fetch_report_sources(args, selectedReports, sourceFolder, shallowClone=True)
+        wheelsBuilt = build_wheelhouse(sourceResults, wheelhouse)
+    finally:
+        shutil.rmtree(sourceFolder, onerror=change_file_read_attribute)
+
+    if not wheelsBuilt:
+        logger.error("    Unable to build the wheelhouse")
+        print("    **ERROR**  Unable to build the wheelhouse.  Please see log for details")
+        sys.exit()
+
+    print("    The wheelhouse %s is ready to be copied to the Code Insight server" %wheelhouse)
+    logger.info("    The wheelhouse %s is ready" %wheelhouse)
+
+#------------------------------------------------------------
+def fetch_report_sources(args, selectedReports, sourceFolder, shallowClone):
+
+    # Clone (or extract) the reports into a scratch folder rather than an installation
+    systemDetails = {}
+    systemDetails["reportInstallationFolder"] = sourceFolder
+    systemDetails["shallowClone"] = shallowClone
+    if args.archiveSource:
+        systemDetails["archiveSource"] = args.archiveSource
+        systemDetails["archiveManifest"] = load_archive_manifest(args.archiveSource)
+
+    return run_report_tasks(update_report_source, [(report, systemDetails) for report in selectedReports], max(1, args.jobs), displayOutput=False)
+
+#------------------------------------------------------------
+def build_wheelhouse(sourceResults, wheelhouse):
+
+    reportRequirementsFiles = {}
+    for reportResult in sourceResults:
+        requirementsFile = os.path.join(get_source_folder(reportResult), reportRequirementsFile)
+        if os.path.isfile(requirementsFile):
+            reportRequirementsFiles[reportResult["reportName"]] = requirementsFile
+
+    mergedRequirements = report_requirements.merge_requirements(reportRequirementsFiles)
+    for conflict in mergedRequirements["conflicts"]:
+        logger.warning("    Conflicting requirement %s - %s" %(conflict["package"], conflict["reason"]))
+        print("    **WARNING**  Conflicting requirement %s - %s" %(conflict["package"], conflict["reason"]))
+
+    # Keep the merged requirements with the wheels so the contents of the wheelhouse are known
+    mergedRequirementsFile = os.path.join(wheelhouse, reportRequirementsFile)
+    report_requirements.write_requirements_file(mergedRequirementsFile, mergedRequirements["requirements"], mergedRequirements["options"])
+
+    print("    Downloading and building wheels for %s requirement(s)" %len(mergedRequirements["requirements"]))
+    sys.stdout.flush()  # Ensure that the message are flushed out before the os commands
+
+    wheelCommand = pythonCommand + ["-m", "pip", "wheel", "-r", mergedRequirementsFile, "--wheel-dir", wheelhouse]
+    wheelResponse = run_command(wheelCommand, wheelhouse, "pip")
+
+    return wheelResponse["returnCode"] == 0
+
+#------------------------------------------------------------
+def bundle_reports(args, selectedReports):
+    logger.info("Entering bundle_reports")
+
+    if args.bundleFile is None:
+        logger.error("    The -bundleFile path is required for the bundle command")
+        print("    **ERROR**  Please provide the file to write the bundle to via the -bundleFile flag")
+        sys.exit()
+
+    bundleFile = os.path.abspath(args.bundleFile)
+    print("    Bundling %s report(s) into %s" %(len(selectedReports), bundleFile))
+    logger.info("    Bundling %s report(s) into %s" %(len(selectedReports), bundleFile))
+
+    workFolder = tempfile.mkdtemp(prefix="report_bundle_")
+    try:
+        sourceFolder = os.path.join(workFolder, "sources")
+        bundleFolder = os.path.join(workFolder, "bundle")
+        archiveFolder = os.path.join(bundleFolder, install_bundle.bundleArchiveFolderName)
+        wheelhouse = os.path.join(bundleFolder, install_bundle.bundleWheelhouseFolderName)
+        for folder in [sourceFolder, archiveFolder, wheelhouse]:
+            os.makedirs(folder)
+
+        with timed_phase("report_sources"):
+            sourceResults = fetch_report_sources(args, selectedReports, sourceFolder, shallowClone=args.shallow)
+
+        failedReports = [reportResult["reportName"] for reportResult in sourceResults if reportResult["action"] == "failed"]
+        if failedReports:
+            logger.error("    Unable to fetch %s" %", ".join(failedReports))
+            print("    **ERROR**  Unable to fetch %s.  Please see log for details" %", ".join(sorted(failedReports)))
             sys.exit()
+
+        # Each checkout (submodules included) becomes an archive the archive fetch backend can install
+        archiveManifest = {"reports" : {}}
+        bundleReports = {}
+        with timed_phase("report_archives"):
+            for reportResult in sorted(sourceResults, key=lambda reportResult: reportResult["reportName"]):
+                reportName = reportResult["reportName"]
+                reportSourceFolder = get_source_folder(reportResult)
+                reportVersion = version_inventory.get_report_version(reportSourceFolder)
+
+                archiveName = "%s.tar.gz" %reportName
+                reportEntry = {}
+                reportEntry["version"] = reportVersion["version"]
+                reportEntry["commit"] = reportVersion["commit"]
+                reportEntry["archive"] = install_bundle.bundleArchiveFolderName + "/" + archiveName
+                reportEntry["prefix"] = reportName
+                reportEntry["sha256"] = install_bundle.write_report_archive(reportSourceFolder, os.path.join(archiveFolder, archiveName), reportName)
+                archiveManifest["reports"][reportName] = reportEntry
+
+                bundleReports[reportName] = {"repository" : reportResult["repository"], "version" : reportEntry["version"], "commit" : reportEntry["commit"]}
+                print("        %-70s %s" %(reportName, reportEntry["version"]))
+
+        with open(os.path.join(bundleFolder, report_archives.archiveManifestFileName), "w") as filePtr:
+            json.dump(archiveManifest, filePtr, indent=4, sort_keys=True)
+
+        with timed_phase("bundle_wheelhouse"):
+            if not build_wheelhouse(sourceResults, wheelhouse):
+                logger.error("    Unable to build the wheelhouse")
+                print("    **ERROR**  Unable to build the wheelhouse.  Please see log for details")
+                sys.exit()
+
+        bundleContents = {}
+        bundleContents["installerVersion"] = __version__
+        bundleContents["python"] = "%s.%s" %sys.version_info[:2]
+        bundleContents["platform"] = sys.platform
+        bundleContents["reports"] = bundleReports
+
+        with timed_phase("bundle_write"):
+            bundleHash = install_bundle.write_bundle(bundleFolder, bundleFile, bundleContents)
+    finally:
+        shutil.rmtree(workFolder, onerror=change_file_read_attribute)
+
+    print("    The bundle %s (sha256 %s) is ready to be copied to the Code Insight servers along with %s" %(bundleFile, bundleHash, os.path.basename(bundleFile) + install_bundle.bundleChecksumSuffix))
+    logger.info("    The bundle %s is ready" %bundleFile)
+
+#------------------------------------------------------------
+def open_install_bundle(args):
+    logger.info("Entering open_install_bundle")
+
+    bundleFile = os.path.abspath(args.fromBundle)
+    print("    Verifying the install bundle %s" %bundleFile)
+    sys.stdout.flush()
+
+    with timed_phase("bundle_extract"):
+        bundleDetails = install_bundle.extract_bundle(bundleFile, os.path.join(installerDirectory, bundlesFolderName))
+
+    if "error" in bundleDetails:
+        logger.error("    %s" %bundleDetails["error"])
+        print("    **ERROR**  %s" %bundleDetails["error"])
+        sys.exit()
+
+    bundleManifest = bundleDetails["manifest"]
+    if bundleManifest.get("platform") != sys.platform or bundleManifest.get("python") != "%s.%s" %sys.version_info[:2]:
+        logger.warning("    The bundle was built with python %s on %s" %(bundleManifest.get("python"), bundleManifest.get("platform")))
+        print("    **WARNING**  The bundle was built with python %s on %s so its wheels may not install here" %(bundleManifest.get("python"), bundleManifest.get("platform")))
+
+    print("    Installing %s report(s) from the bundle created %s" %(len(bundleManifest.get("reports", {})), bundleManifest.get("created")))
+
+    # Everything comes from the bundle so nothing is fetched from the remotes or a package index
+    args.archiveSource = bundleDetails["folder"]
+    args.wheelhouse = os.path.join(bundleDetails["folder"], install_bundle.bundleWheelhouseFolderName)
+
+#------------------------------------------------------------
+def install_fleet(args, selectedReports):
+    logger.info("Entering install_fleet")
+
+    if args.inventory is None:
+        logger.error("    The -inventory file is required for the fleet command")
+        print("    **ERROR**  Please provide the installations to update via the -inventory flag")
+        sys.exit()
+
+    inventory = fleet_inventory.load_inventory(args.inventory)
+    if "error" in inventory:
+        logger.error("    %s" %inventory["error"])
+        print("    **ERROR**  %s" %inventory["error"])
+        sys.exit()
+
+    installations = inventory["installations"]
+    numberOfJobs = max(1, args.fleetJobs)
+    print("    Installing reports on %s installation(s) using %s job(s)" %(len(installations), numberOfJobs))
+    logger.info("    Installing reports on %s installation(s) using %s job(s)" %(len(installations), numberOfJobs))
+
+    # Every installation clones from one shared reference store so each report and submodule
+    # is only downloaded once for the whole fleet (not needed when the reports come from archives)
+    if not args.archiveSource:
+        gitReferenceStore = os.path.join(installerDirectory, gitReferenceStoreFolderName)
+        print("    Updating the shared git reference store %s" %gitReferenceStore)
+        sys.stdout.flush()
+        with timed_phase("reference_store"):
+            if not git_operations.prime_reference_store(gitReferenceStore, [report["repository"] for report in selectedReports]):
+                print("    **WARNING**  Not all reports could be added to the shared git reference store")
+
+    fleetFolder = os.path.join(installerDirectory, fleetFolderName)
+    installerArguments = get_fleet_installer_arguments(args)
+
+    fleetResults = []
+    with timed_phase("fleet_installs"):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=numberOfJobs) as executor:
+            futures = [executor.submit(install_fleet_installation, installation, installerArguments, fleetFolder) for installation in installations]
+
+            for future in concurrent.futures.as_completed(futures):
+                fleetResult = future.result()
+                fleetResults.append(fleetResult)
+                with printLock:
+                    print("        %-40s %s" %(fleetResult["name"], fleetResult["status"]))
+                    sys.stdout.flush()
+
+    print("")
+    print("**************************************")
+    print("Fleet Installation Results")
+    print("    %-40s %-10s %8s %8s %8s %8s %10s" %("Installation", "Status", "Cloned", "Updated", "Current", "Failed", "Seconds"))
+    for fleetResult in sorted(fleetResults, key=lambda fleetResult: fleetResult["name"]):
+        actionCounts = fleetResult["actionCounts"]
+        print("    %-40s %-10s %8s %8s %8s %8s %10.1f" %(fleetResult["name"], fleetResult["status"], actionCounts["clone"], actionCounts["update"], actionCounts["current"], actionCounts["failed"], fleetResult["seconds"]))
+        if fleetResult["message"]:
+            print("        %s" %fleetResult["message"])
+    print("    Output for each installation is in %s" %fleetFolder)
+
+    if args.reportJson:
+        fleetReport = {}
+        fleetReport["installerVersion"] = __version__
+        fleetReport["fleetJobs"] = numberOfJobs
+        fleetReport["phases"] = dict(install_timing.runTimings["phases"])
+        fleetReport["installations"] = sorted(fleetResults, key=lambda fleetResult: fleetResult["name"])
+        try:
+            with open(args.reportJson, "w") as filePtr:
+                json.dump(fleetReport, filePtr, indent=4)
+            print("    Fleet report written to %s" %args.reportJson)
+        except OSError as error:
+            logger.error("Unable to write fleet report %s: %s" %(args.reportJson, error))
+            print("    **ERROR**  Unable to write fleet report %s: %s" %(args.reportJson, error))
+
+#------------------------------------------------------------
+def show_report_status(args, selectedReports):
+    logger.info("Entering show_report_status")
+
+    # Only the local checkouts and install state are read so the server and remotes are not contacted
+    reportInstallationFolder = verify_installation_directory(args.installationDirctory)
+    if "error" in reportInstallationFolder:
+        print(reportInstallationFolder["error"])
+        sys.exit()
+
+    installState = install_state.load_install_state(os.path.join(reportInstallationFolder, installStateFileName))
+
+    # The selected catalog reports along with anything else that has been installed into the folder
+    reportNames = set(get_report_name(report["repository"]) for report in selectedReports)
+    if not args.only and not args.exclude:
+        for folderName in os.listdir(reportInstallationFolder):
+            if not folderName.startswith((".", "_")) and os.path.exists(os.path.join(reportInstallationFolder, folderName, ".git")):
+                reportNames.add(folderName)
+        reportNames.update(installState["reports"])
+
+    installedFolders = [os.path.join(reportInstallationFolder, reportName) for reportName in reportNames if os.path.isdir(os.path.join(reportInstallationFolder, reportName))]
+    with timed_phase("version_inventory"):
+        reportVersions = version_inventory.collect_versions(installedFolders, checkWorktree=True, numberOfJobs=max(1, args.jobs))
+
+    statusResults = []
+    for reportName in sorted(reportNames):
+        reportStatus = reportVersions.get(reportName) or {"reportName" : reportName, "version" : None, "error" : "Not installed"}
+        reportState = install_state.get_report_state(installState, reportName) or {}
+        if reportState.get("archiveHash") and reportStatus.get("commit") is None and os.path.isdir(reportStatus.get("folder", "")):
+            # Installed from an archive so there are no refs to read
+            reportStatus.update({"version" : reportState.get("version"), "commit" : reportState.get("commit"), "versionSource" : "archive", "error" : None})
+        reportStatus["registrationStatus"] = reportState.get("registrationStatus")
+        reportStatus["serverURL"] = reportState.get("serverURL")
+        reportStatus["updated"] = reportState.get("updated")
+        statusResults.append(reportStatus)
+
+    print("")
+    print("**************************************")
+    print("Installed Report Status for %s" %reportInstallationFolder)
+    print("    %-60s %-16s %-10s %-6s %-8s %-12s" %("Report", "Version", "Commit", "Dirty", "Drifted", "Registration"))
+    for reportStatus in statusResults:
+        if reportStatus["error"] and reportStatus["version"] is None:
+            print("    %-60s %s" %(reportStatus["reportName"], reportStatus["error"]))
+            continue
+        print("    %-60s %-16s %-10s %-6s %-8s %-12s" %(reportStatus["reportName"], reportStatus["version"], (reportStatus["commit"] or "")[:10],
+            get_status_flag(reportStatus["dirty"]), get_status_flag(reportStatus["submodulesDrifted"]), reportStatus["registrationStatus"] or "unknown"))
+
+    if args.reportJson:
+        statusReport = {}
+        statusReport["installerVersion"] = __version__
+        statusReport["reportInstallationFolder"] = reportInstallationFolder
+        statusReport["phases"] = dict(install_timing.runTimings["phases"])
+        statusReport["reports"] = statusResults
+        try:
+            with open(args.reportJson, "w") as filePtr:
+                json.dump(statusReport, filePtr, indent=4)
+            print("    Status report written to %s" %args.reportJson)
+        except OSError as error:
+            logger.error("Unable to write status report %s: %s" %(args.reportJson, error))
+            print("    **ERROR**  Unable to write status report %s: %s" %(args.reportJson, error))
+
+#------------------------------------------------------------
+def get_status_flag(value):
+    if value is None:
+        return "?"
+    return "yes" if value else "no"
+
+#------------------------------------------------------------
+def plan_install(args, selectedReports):
+    logger.info("Entering plan_install")
+
+    # The plan only reads the checkouts, install state and requirements cache and queries the
+    # remotes and the server so nothing in the installation is fetched, written or registered
+    reportInstallationFolder = verify_installation_directory(args.installationDirctory, createFolder=False)
+    if "error" in reportInstallationFolder:
+        print(reportInstallationFolder["error"])
+        sys.exit()
+
+    planDetails = {}
+    planDetails["reportInstallationFolder"] = reportInstallationFolder
+    planDetails["installState"] = install_state.load_install_state(os.path.join(reportInstallationFolder, installStateFileName))
+    planDetails["requirementsCache"] = report_requirements.load_requirements_cache(os.path.join(reportInstallationFolder, requirementsCacheFileName))
+    if args.forceRequirements:
+        planDetails["requirementsCache"]["reports"] = {}
+    planDetails["virtualEnvironment"] = args.virtualEnvironment
+
+    serverURL, adminAuthToken, certificatePath = get_plan_server_details(args, reportInstallationFolder)
+    planDetails["serverURL"] = serverURL
+
+    # The archive manifest is read straight from the bundle rather than extracting it
+    if args.fromBundle:
+        bundleResponse = install_bundle.read_bundle_file(args.fromBundle, report_archives.archiveManifestFileName)
+        try:
+            planDetails["archiveManifest"] = json.loads(bundleResponse["content"].decode("utf-8")) if "content" in bundleResponse else bundleResponse
+        except ValueError as error:
+            planDetails["archiveManifest"] = {"error" : "Unable to read %s from %s: %s" %(report_archives.archiveManifestFileName, args.fromBundle, error)}
+    elif args.archiveSource:
+        planDetails["archiveManifest"] = report_archives.load_archive_manifest(args.archiveSource)
+    if "error" in planDetails.get("archiveManifest", {}):
+        logger.error("    %s" %planDetails["archiveManifest"]["error"])
+        print("    **ERROR**  %s" %planDetails["archiveManifest"]["error"])
+        sys.exit()
+
+    # A plan reports whether the server is reachable rather than waiting on retries
+    codeinsight_client.configure_client(connectTimeout=args.connectTimeout, readTimeout=args.readTimeout, maxRetries=args.retries if args.retries is not None else 0)
+
+    # The server check and the remote queries are network bound so they all run at once
+    with timed_phase("install_plan"):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(git_operations.maxRemoteQueries, len(selectedReports) + 1))) as executor:
+            serverFuture = executor.submit(check_plan_server, serverURL, adminAuthToken, certificatePath, args.serverCheckTTL)
+            reportFutures = [executor.submit(plan_report, report, planDetails) for report in selectedReports]
+            serverCheck = serverFuture.result()
+            reportPlans = [future.result() for future in reportFutures]
+
+    # Reports are estimated from their own recorded step times where there are any
+    stepEstimates = install_plan.get_step_estimates(planDetails["installState"])
+    for report, reportPlan in zip(selectedReports, reportPlans):
+        if serverCheck["releaseVersion"] and (report["minimumRelease"] or report["maximumRelease"]):
+            skipReason = report_selection.get_unsupported_reason(report, serverCheck["releaseVersion"])
+            if skipReason:
+                reportPlan["action"] = "skip"
+                reportPlan["details"] = "Not supported, it %s" %skipReason
+        reportState = install_state.get_report_state(planDetails["installState"], reportPlan["reportName"]) or {}
+        reportPlan["estimate"] = install_plan.estimate_action(reportPlan["action"], reportState.get("timings"), stepEstimates)
+
+    numberOfJobs = max(1, args.jobs)
+    totalSeconds = round(sum(reportPlan["estimate"]["seconds"] for reportPlan in reportPlans), 1)
+    wallClockSeconds = install_plan.estimate_wall_clock([reportPlan["estimate"]["seconds"] for reportPlan in reportPlans], numberOfJobs)
+
+    print("")
+    print("**************************************")
+    print("Install Plan for %s" %reportInstallationFolder)
+    if serverCheck["reachable"]:
+        print("    Code Insight server %s is reachable%s - Code Insight Version: %s" %(serverURL, " (cached)" if serverCheck["cached"] else "", serverCheck["releaseVersion"]))
     else:
-        print("    Using autorization token provided as argurment.")
-        logger.info("    Using autorization token provided as argurment.")
+        print("    **WARNING**  Code Insight server %s: %s" %(serverURL, serverCheck["error"]))
+        print("                 The reports would be fetched but not registered until the server check passes")
+    print("")
+    print("    %-3s %-60s %-13s %9s  %s" %("#", "Report", "Action", "Seconds", "Details"))
+    for planOrder, reportPlan in enumerate(reportPlans, 1):
+        print("    %-3s %-60s %-13s %8.1f%s  %s" %(planOrder, reportPlan["reportName"], reportPlan["action"], reportPlan["estimate"]["seconds"],
+            " " if reportPlan["estimate"]["recorded"] else "*", reportPlan["details"] or ""))
+
+    actionCounts = {}
+    for reportPlan in reportPlans:
+        actionCounts[reportPlan["action"]] = actionCounts.get(reportPlan["action"], 0) + 1
+    print("")
+    print("    %s" %", ".join("%s %s" %(actionCounts[action], action) for action in install_plan.actionSteps if action in actionCounts))
+    print("    Estimated %.1f seconds of work, about %.1f seconds with %s job(s)" %(totalSeconds, wallClockSeconds, numberOfJobs))
+    if not all(reportPlan["estimate"]["recorded"] for reportPlan in reportPlans):
+        print("    * No recorded time for some steps of this report so the average from other reports (or a default) is used")
+    print("    Planned in %.1f seconds.  Nothing was changed" %install_timing.runTimings["phases"]["install_plan"])
+    logger.info("Planned %s report(s): %s" %(len(reportPlans), actionCounts))
+
+    if args.reportJson:
+        planReport = {}
+        planReport["installerVersion"] = __version__
+        planReport["reportInstallationFolder"] = reportInstallationFolder
+        planReport["server"] = dict(serverCheck, serverURL=serverURL)
+        planReport["jobs"] = numberOfJobs
+        planReport["estimatedSeconds"] = totalSeconds
+        planReport["estimatedWallClockSeconds"] = wallClockSeconds
+        planReport["stepEstimates"] = stepEstimates
+        planReport["reports"] = reportPlans
+        try:
+            with open(args.reportJson, "w") as filePtr:
+                json.dump(planReport, filePtr, indent=4)
+            print("    Install plan written to %s" %args.reportJson)
+        except OSError as error:
+            logger.error("Unable to write install plan %s: %s" %(args.reportJson, error))
+            print("    **ERROR**  Unable to write install plan %s: %s" %(args.reportJson, error))
 
-    # Get the Code Insight release details to determine if the server and token are valid
-    releaseDetails = get_release_details(serverURL, adminAuthToken)
+#------------------------------------------------------------
+def get_plan_server_details(args, reportInstallationFolder):
 
-    if "fnci.release.name" in releaseDetails:
-        releaseVersion = releaseDetails["fnci.release.name"]
-        print("    Successfully verified connection to Code Insight server")
-        print("      -  Code Insight Version: %s" %releaseVersion)
-    elif "error" in releaseDetails:
-        errorMessage = str(releaseDetails["error"])
-        
-        if "Max retries exceeded" in errorMessage:
-            message = '''** There appears to be an issue commuincatiing with the Code Insight Server.  \n    ** Please check the host and port values.'''
-            logger.error("    %s" %message)
-            print("    %s" %message)
+    # The same server, token and certificate the install would use without writing the properties file
+    configData = {}
+    propertiesFile = os.path.join(reportInstallationFolder, propertiesFileName)
+    if os.path.isfile(propertiesFile):
+        try:
+            with open(propertiesFile, "r") as filePtr:
+                configData = json.load(filePtr)
+        except (ValueError, OSError) as error:
+            logger.warning("    Unable to read properties file %s: %s" %(propertiesFile, error))
+
+    serverURL = args.server or configData.get("core.server.url")
+    if serverURL and serverURL.endswith("/"):
+        serverURL = serverURL[:-1]
+
+    adminAuthToken = args.token or os.environ.get(tokenEnvironmentVariable) or configData.get("core.server.token")
+
+    # Passed to the check directly rather than through the certificate environment variables
+    certificatePath = args.certificatePath or configData.get("core.server.certificate")
+    if certificatePath:
+        certificatePath = os.path.normpath(certificatePath)
+
+    return serverURL, adminAuthToken, certificatePath
 
+#------------------------------------------------------------
+def check_plan_server(serverURL, adminAuthToken, certificatePath, cacheTTL):
+
+    serverCheck = {"reachable" : False, "releaseVersion" : None, "cached" : False, "error" : None}
+
+    if serverURL is None or adminAuthToken is None:
+        serverCheck["error"] = "The server URL and token were not provided and are not in the properties file"
+        return serverCheck
+
+    # A recent successful check is used but a new check is not recorded
+    releaseDetails = release_cache.get_cached_release(os.path.join(installerDirectory, releaseCacheFileName), serverURL, adminAuthToken, cacheTTL)
+    serverCheck["cached"] = releaseDetails is not None
+    if releaseDetails is None:
+        releaseDetails = get_release_details(serverURL, adminAuthToken, certificatePath)
+
+    if "fnci.release.name" in releaseDetails:
+        serverCheck["reachable"] = True
+        serverCheck["releaseVersion"] = releaseDetails["fnci.release.name"]
+    else:
+        errorMessage = str(releaseDetails.get("error", releaseDetails))
+        logger.error("    Server check failed: %s" %errorMessage)
+        if "Max retries exceeded" in errorMessage or "timed out" in errorMessage:
+            serverCheck["error"] = "Unable to communicate with the server.  Please check the host and port values"
         elif "Unauthorized" in errorMessage:
-            message = '''** The host and port values appear to be correct but the authorization token is not valid.  \n    ** Please check the token and ensure the user has admistrative perimssions.'''
-            logger.error("    %s" %message)
-            print("    %s" %message)
+            serverCheck["error"] = "The server is reachable but the authorization token is not valid"
+        else:
+            serverCheck["error"] = "The server check failed.  Please see log for details"
+
+    return serverCheck
 
+#------------------------------------------------------------
+def plan_report(report, planDetails):
+
+    reportName = get_report_name(report["repository"])
+    reportFolder = os.path.join(planDetails["reportInstallationFolder"], reportName)
+    reportState = install_state.get_report_state(planDetails["installState"], reportName)
+
+    reportPlan = {}
+    reportPlan["reportName"] = reportName
+    reportPlan["repository"] = report["repository"]
+    reportPlan["action"] = None
+    reportPlan["details"] = None
+    reportPlan["commit"] = None
+    reportPlan["remoteCommit"] = None
+    reportPlan["requirementsChanged"] = None
+
+    if "archiveManifest" in planDetails:
+        reportEntry = planDetails["archiveManifest"]["reports"].get(reportName)
+        if reportEntry is None:
+            reportPlan["action"] = "failed"
+            reportPlan["details"] = "Not listed in the archive manifest"
+        elif os.path.isdir(reportFolder) and reportState and reportState.get("archiveHash") == reportEntry["sha256"]:
+            # The archive checksum identifies what is installed so only the registration can be outstanding
+            reportPlan["commit"] = reportState.get("commit")
+            plan_installed_report(reportPlan, reportFolder, reportState, None, None, planDetails)
         else:
-            print("Unhandled exception.  Please check log for details")
-            logger.error(errorMessage)
-       
-        print("Exiting installer")
-        sys.exit()
+            reportPlan["action"] = "update" if os.path.isdir(reportFolder) else "clone"
+            reportPlan["details"] = "Fetch %s %s" %(reportEntry["archive"], reportEntry.get("version") or "")
+        return reportPlan
+
+    if not os.path.isdir(os.path.join(reportFolder, ".git")):
+        reportPlan["action"] = "clone"
+        if os.path.isdir(os.path.join(get_staging_folder(reportFolder), ".git")):
+            reportPlan["details"] = "Resume the staged clone"
+        elif os.path.isdir(reportFolder):
+            reportPlan["details"] = "Clone to replace the copy installed from an archive"
+        else:
+            reportPlan["details"] = "Clone %s" %(report["ref"] or "the default branch")
+        return reportPlan
+
+    # Pinned reports are compared with their ref and the others with the branch they track
+    if report["ref"]:
+        commit = git_operations.get_head_commit(reportFolder)
+        submoduleStatus = git_operations.get_submodule_status(reportFolder)
+        submodules = submoduleStatus["commits"]
+        remoteCommit = git_operations.get_remote_ref_commit(reportFolder, report["ref"])
+        drifted = submoduleStatus["drifted"]
+        changed = None if remoteCommit is None else (remoteCommit != commit or drifted)
+    else:
+        updateCheck = git_operations.check_report_for_updates(reportFolder)
+        commit, submodules, remoteCommit, changed = updateCheck["commit"], updateCheck["submodules"], updateCheck["remoteCommit"], updateCheck["changed"]
+        drifted = changed and remoteCommit == commit
+
+    reportPlan["commit"] = commit
+    reportPlan["remoteCommit"] = remoteCommit
+
+    if changed is None:
+        reportPlan["action"] = "update"
+        reportPlan["details"] = "Unable to check the remote so the report will be fetched"
+    elif changed:
+        reportPlan["action"] = "update"
+        if drifted:
+            reportPlan["details"] = "Submodules do not match the recorded commits"
+        else:
+            reportPlan["details"] = "Pull %s -> %s" %((commit or "")[:10], remoteCommit[:10])
+    else:
+        plan_installed_report(reportPlan, reportFolder, reportState, commit, submodules, planDetails)
+
+    return reportPlan
+
+#------------------------------------------------------------
+def plan_installed_report(reportPlan, reportFolder, reportState, commit, submodules, planDetails):
+
+    # The same comparison with the last install that check_install_state makes
+    requiredAction = install_state.get_required_action(reportState, commit, submodules, planDetails["serverURL"])
+    if requiredAction is None:
+        reportPlan["action"] = "current"
+        reportPlan["details"] = "Version %s is installed" %reportState.get("version") if reportState else "Installed before the install state was tracked"
+        return
+
+    # Requirements are only checked for reports that will be registered again
+    requirementsFile = os.path.join(reportFolder, reportRequirementsFile)
+    if not os.path.isfile(requirementsFile):
+        reportPlan["requirementsChanged"] = False
+    elif planDetails["virtualEnvironment"]:
+        reportPlan["requirementsChanged"] = reportState.get("requirementsHash") != report_requirements.requirements_hash(requirementsFile)
+    else:
+        reportPlan["requirementsChanged"] = not report_requirements.requirements_are_current(reportPlan["reportName"], requirementsFile, planDetails["requirementsCache"])
 
+    reportPlan["action"] = "requirements" if reportPlan["requirementsChanged"] else "register"
+    if requiredAction == "update":
+        reportPlan["details"] = "Complete the update an earlier run did not finish"
     else:
-        logger.error("Unknown Error: %s" %releaseDetails)
-        print("    Exiting installer due to unknown error. Please see log for details")
+        reportPlan["details"] = "Register with %s" %planDetails["serverURL"]
+    if reportPlan["requirementsChanged"]:
+        reportPlan["details"] += " after reinstalling the changed requirements"
 
+#------------------------------------------------------------
+def install_fleet_installation(installation, installerArguments, fleetFolder):
+
+    # Each installation is installed by its own installer process since the install
+    # changes process wide settings such as the certificate environment variables
+    installationFolder = os.path.join(fleetFolder, installation["folderName"])
+    if not os.path.isdir(installationFolder):
+        os.makedirs(installationFolder)
+
+    runReportFile = os.path.join(installationFolder, "run_report.json")
+    if os.path.isfile(runReportFile):
+        os.remove(runReportFile)
+
+    fleetResult = {}
+    fleetResult["name"] = installation["name"]
+    fleetResult["server"] = installation["server"]
+    fleetResult["installDir"] = installation["installDir"]
+    fleetResult["status"] = "failed"
+    fleetResult["message"] = None
+    fleetResult["seconds"] = 0
+    fleetResult["actionCounts"] = {"clone" : 0, "update" : 0, "current" : 0, "failed" : 0}
+    fleetResult["reports"] = {}
+
+    tokenDetails = fleet_inventory.resolve_token(installation["tokenReference"])
+    if "error" in tokenDetails:
+        logger.error("    %s: %s" %(installation["name"], tokenDetails["error"]))
+        fleetResult["message"] = tokenDetails["error"]
+        return fleetResult
+
+    # The token is passed in the environment so it is not visible in the process list or the log
+    installCommand = pythonCommand + [os.path.join(installerDirectory, os.path.basename(__file__)), "install"]
+    installCommand += ["-server", installation["server"], "-installDir", installation["installDir"]]
+    if installation["certificatePath"]:
+        installCommand += ["-certificatePath", installation["certificatePath"]]
+    installEnvironment = dict(os.environ)
+    installEnvironment[tokenEnvironmentVariable] = tokenDetails["token"]
+
+    # The store was updated before the installs started so each installation only borrows from it
+    installCommand += ["-gitCache", "-gitCacheReadOnly", "-reportJson", runReportFile] + installerArguments
+
+    logger.info("    Installing reports on %s (%s)" %(installation["name"], installation["server"]))
+
+    # The installer output is written out as it is produced
+    with open(os.path.join(installationFolder, "output.log"), "w") as filePtr:
+        installResponse = run_command(installCommand, installationFolder, None, lambda line: filePtr.write(line + "\n"), installEnvironment)
+
+    # The installation's run report has what happened to each report
     try:
+        with open(runReportFile, "r") as filePtr:
+            runReport = json.load(filePtr)
+    except (ValueError, OSError):
+        # The installer stopped before installing anything (server or token problem for example)
+        outputLines = [line.strip() for line in installResponse["output"].splitlines() if line.strip()]
+        errorLines = [line.strip("* ") for line in outputLines if line.startswith("**")]
+        if errorLines:
+            fleetResult["message"] = errorLines[0]
+        else:
+            fleetResult["message"] = outputLines[-1] if outputLines else "The installer did not complete"
+        logger.error("    %s: %s" %(installation["name"], fleetResult["message"]))
+        return fleetResult
+
+    fleetResult["seconds"] = runReport["totalSeconds"]
+    fleetResult["releaseVersion"] = runReport.get("releaseVersion")
+    fleetResult["status"] = "succeeded"
+
+    for reportName in runReport["reports"]:
+        reportDetails = runReport["reports"][reportName]
+        fleetResult["reports"][reportName] = {"action" : reportDetails["action"], "version" : reportDetails["version"], "registrationStatus" : reportDetails["registrationStatus"]}
+
+        if reportDetails["action"] == "failed" or reportDetails["registrationStatus"] == "failed":
+            fleetResult["actionCounts"]["failed"] += 1
+            fleetResult["status"] = "failed"
+        elif reportDetails["action"] in ("clone", "register"):
+            fleetResult["actionCounts"]["clone"] += 1
+        elif reportDetails["action"] == "update":
+            fleetResult["actionCounts"]["update"] += 1
+        elif reportDetails["action"] == "skipped":
+            continue
+        else:
+            fleetResult["actionCounts"]["current"] += 1
 
-        certificatePath = os.path.normpath(certificatePath)
-        os.environ["REQUESTS_CA_BUNDLE"] = certificatePath
-        os.environ["SSL_CERT_FILE"] = certificatePath
-        logger.info("Self signed certificate provied as argument")
-    except:
-        logger.info("No self signed certificate was provied as argument")
-        certificatePath = None
+    return fleetResult
 
-    systemDetails = {}
-    systemDetails["releaseVersion"] = releaseVersion
-    systemDetails["reportInstallationFolder"] = reportInstallationFolder
-    systemDetails["propertiesFile"] = propertiesFile
-    systemDetails["serverURL"] = serverURL
-    systemDetails["adminAuthToken"] = adminAuthToken
-    systemDetails["certificatePath"] = certificatePath
+#------------------------------------------------------------
+def get_fleet_installer_arguments(args):
 
-    return systemDetails
+    # Pass the install options along to the installer for each installation
+    installerArguments = ["-jobs", str(max(1, args.jobs))]
+
+    for option in ["batchRequirements", "forceRequirements", "shallow", "alwaysPull", "inProcessRegistration", "virtualEnvironment"]:
+        if getattr(args, option):
+            installerArguments.append("-" + option)
+
+    for option in ["connectTimeout", "readTimeout", "retries", "registrationJobs", "registrationRetries"]:
+        if getattr(args, option) is not None:
+            installerArguments += ["-" + option, str(getattr(args, option))]
+
+    for stepTimeout in args.stepTimeout:
+        installerArguments += ["-stepTimeout", stepTimeout]
+
+    for selector in args.only:
+        installerArguments += ["-only", selector]
+    for selector in args.exclude:
+        installerArguments += ["-exclude", selector]
+
+    # All installations install from the same wheelhouse and archives
+    if args.archiveSource:
+        archiveSource = args.archiveSource
+        if not archiveSource.startswith(("http://", "https://")):
+            archiveSource = os.path.abspath(archiveSource)
+        installerArguments += ["-archiveSource", archiveSource]
+    if args.wheelhouse:
+        installerArguments += ["-wheelhouse", os.path.abspath(args.wheelhouse)]
+
+    return installerArguments
+
+#------------------------------------------------------------
+def configure_step_timeouts(stepTimeouts):
+
+    timeouts = {}
+    for stepTimeout in stepTimeouts:
+        try:
+            stepType, seconds = stepTimeout.split("=", 1)
+            timeouts[stepType.strip()] = float(seconds) if float(seconds) > 0 else None
+        except ValueError:
+            print("    **ERROR**  Invalid step timeout %s.  Use STEP=SECONDS, for example clone=900" %stepTimeout)
+            sys.exit()
+
+    try:
+        command_runner.configure_timeouts(timeouts)
+    except ValueError as error:
+        print("    **ERROR**  %s.  Valid steps are: %s" %(error, ", ".join(sorted(command_runner.stepTimeouts))))
+        sys.exit()
+
+#------------------------------------------------------------
+def report_message(reportResult, message, level=logging.INFO):
+    # Log the message right away but hold the console output until the report is complete
+    logger.log(level, message)
+    install_logging.write_report_log(reportResult["reportName"], message)
+    reportResult["output"].append(message)
+
+#------------------------------------------------------------
+def get_output_handler(reportResult, systemDetails):
+    # Command output goes to the report log as it is produced.  It is only shown as it
+    # happens when asked for since it will interleave between reports
+    streamOutput = systemDetails.get("streamOutput")
+
+    def handle_command_output(line):
+        install_logging.write_report_log(reportResult["reportName"], "    " + line)
+        if streamOutput:
+            with printLock:
+                print("        [%s] %s" %(reportResult["reportName"], line))
+                sys.stdout.flush()
+
+    return handle_command_output
+
+#------------------------------------------------------------
+def print_report_output(reportResult):
+    with printLock:
+        print("\n+++++++++++++++++++++++++++++++++++++++++++++++++++++")
+        for message in reportResult["output"]:
+            print(message)
+        sys.stdout.flush()  # Ensure the block is written out before the next report completes
 
 #------------------------------------------------------------
 def validate_arguments(args):
@@ -395,7 +1743,11 @@ def validate_arguments(args):
         print("    Using server details provided as argurment: %s" %serverURL)
         logger.info("    Using server details provided as argurment: %s" %serverURL)
 
-    if adminAuthToken is None:
+    if adminAuthToken is None and os.environ.get(tokenEnvironmentVariable):
+        adminAuthToken = os.environ[tokenEnvironmentVariable]
+        print("    Using autorization token from the %s environment variable." %tokenEnvironmentVariable)
+        logger.info("    Using autorization token from the %s environment variable." %tokenEnvironmentVariable)
+    elif adminAuthToken is None:
         # There was no token information passed so check configData    
         if "core.server.token" in configData:
             if configData["core.server.token"] is None:
@@ -416,36 +1768,21 @@ def validate_arguments(args):
         print("    Using autorization token provided as argurment.")
         logger.info("    Using autorization token provided as argurment.")
 
-    # Get the Code Insight release details to determine if the server and token are valid
-    releaseDetails = get_release_details(serverURL, adminAuthToken)
-
-    if "fnci.release.name" in releaseDetails:
-        releaseVersion = releaseDetails["fnci.release.name"]
-        print("    Successfully verified connection to Code Insight server")
-        print("      -  Code Insight Version: %s" %releaseVersion)
-    elif "error" in releaseDetails:
-        errorMessage = str(releaseDetails["error"])
-        
-        if "Max retries exceeded" in errorMessage:
-            message = '''** There appears to be an issue commuincatiing with the Code Insight Server.  \n    ** Please check the host and port values.'''
-            logger.error("    %s" %message)
-            print("    %s" %message)
-
-        elif "Unauthorized" in errorMessage:
-            message = '''** The host and port values appear to be correct but the authorization token is not valid.  \n    ** Please check the token and ensure the user has admistrative perimssions.'''
-            logger.error("    %s" %message)
-            print("    %s" %message)
-
-        else:
-            print("Unhandled exception.  Please check log for details")
-            logger.error(errorMessage)
-       
-        print("Exiting installer")
-        sys.exit()
+    # All REST calls to the server share the same client settings
+    codeinsight_client.configure_client(connectTimeout=args.connectTimeout, readTimeout=args.readTimeout, maxRetries=args.retries)
 
+    # Install the requirements from a local wheelhouse rather than a package index?
+    if args.wheelhouse:
+        wheelhouse = os.path.abspath(args.wheelhouse)
+        if not os.path.isdir(wheelhouse):
+            logger.error("    The wheelhouse directory %s does not exist" %wheelhouse)
+            print("    **ERROR**  The wheelhouse directory %s does not exist" %wheelhouse)
+            sys.exit()
+        print("    Installing requirements from wheelhouse: %s" %wheelhouse)
+        logger.info("    Installing requirements from wheelhouse: %s" %wheelhouse)
+        pipInstallOptions = ["--no-index", "--find-links", wheelhouse]
     else:
-        logger.error("Unknown Error: %s" %releaseDetails)
-        print("    Exiting installer due to unknown error. Please see log for details")
+        pipInstallOptions = []
 
     try:
 
@@ -458,17 +1795,100 @@ def validate_arguments(args):
         certificatePath = None
 
     systemDetails = {}
-    systemDetails["releaseVersion"] = releaseVersion
+    systemDetails["releaseVersion"] = None  # Set once the server check completes
     systemDetails["reportInstallationFolder"] = reportInstallationFolder
     systemDetails["propertiesFile"] = propertiesFile
     systemDetails["serverURL"] = serverURL
     systemDetails["adminAuthToken"] = adminAuthToken
     systemDetails["certificatePath"] = certificatePath
+    systemDetails["pipInstallOptions"] = pipInstallOptions
+
+    # Check the server and token are valid in the background while the local steps run
+    systemDetails["releaseCheck"] = start_release_check(serverURL, adminAuthToken, args.serverCheckTTL)
 
     return systemDetails
 
 #-------------------------------------------------------------------
-def verify_installation_directory(installDir):
+def start_release_check(serverURL, adminAuthToken, cacheTTL):
+    logger.info("Entering start_release_check")
+
+    releaseCacheFile = os.path.join(installerDirectory, releaseCacheFileName)
+
+    releaseCheck = {}
+    releaseCheck["verified"] = None
+
+    cachedReleaseDetails = release_cache.get_cached_release(releaseCacheFile, serverURL, adminAuthToken, cacheTTL)
+    if cachedReleaseDetails:
+        releaseCheck["cached"] = True
+        releaseCheck["future"] = concurrent.futures.Future()
+        releaseCheck["future"].set_result(cachedReleaseDetails)
+        return releaseCheck
+
+    def check_release_details():
+        # Get the Code Insight release details to determine if the server and token are valid
+        with timed_phase("server_check"):
+            releaseDetails = get_release_details(serverURL, adminAuthToken)
+        if "fnci.release.name" in releaseDetails and cacheTTL:
+            release_cache.record_release(releaseCacheFile, serverURL, adminAuthToken, releaseDetails)
+        return releaseDetails
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    releaseCheck["cached"] = False
+    releaseCheck["future"] = executor.submit(check_release_details)
+    executor.shutdown(wait=False)
+
+    return releaseCheck
+
+#-------------------------------------------------------------------
+def wait_for_release_check(systemDetails):
+    # Returns True once the server is confirmed to be reachable with a valid token.  The
+    # result is only reported once no matter how many reports are waiting on it.
+    releaseCheck = systemDetails["releaseCheck"]
+
+    with releaseCheckLock:
+        if releaseCheck["verified"] is not None:
+            return releaseCheck["verified"]
+
+        releaseDetails = releaseCheck["future"].result()
+
+        with printLock:
+            if "fnci.release.name" in releaseDetails:
+                systemDetails["releaseVersion"] = releaseDetails["fnci.release.name"]
+                releaseCheck["verified"] = True
+                print("    Successfully verified connection to Code Insight server%s" %(" (cached)" if releaseCheck["cached"] else ""))
+                print("      -  Code Insight Version: %s" %systemDetails["releaseVersion"])
+                logger.info("    Code Insight Version: %s" %systemDetails["releaseVersion"])
+
+                # Create or update the properties files since the report registration script uses it 
+                with timed_phase("properties_file"):
+                    manage_properties_file(systemDetails)
+            elif "error" in releaseDetails:
+                releaseCheck["verified"] = False
+                errorMessage = str(releaseDetails["error"])
+                
+                if "Max retries exceeded" in errorMessage or "timed out" in errorMessage:
+                    message = '''** There appears to be an issue commuincatiing with the Code Insight Server.  \n    ** Please check the host and port values.'''
+                    logger.error("    %s" %message)
+                    print("    %s" %message)
+
+                elif "Unauthorized" in errorMessage:
+                    message = '''** The host and port values appear to be correct but the authorization token is not valid.  \n    ** Please check the token and ensure the user has admistrative perimssions.'''
+                    logger.error("    %s" %message)
+                    print("    %s" %message)
+
+                else:
+                    print("Unhandled exception.  Please check log for details")
+                    logger.error(errorMessage)
+            else:
+                releaseCheck["verified"] = False
+                logger.error("Unknown Error: %s" %releaseDetails)
+                print("    Unknown error while verifying the Code Insight server. Please see log for details")
+            sys.stdout.flush()
+
+    return releaseCheck["verified"]
+
+#-------------------------------------------------------------------
+def verify_installation_directory(installDir, createFolder=True):
     logger.info("Entering verify_installation_directory")
 
     # Was a directory supplied and if so is it valid?
@@ -509,6 +1929,8 @@ def verify_installation_directory(installDir):
     # Does the custom_report_scripts folder exist?
     if os.path.isdir(reportInstallationFolder):
         logger.info("reportInstallationFolder already exists")
+    elif not createFolder:
+        logger.info("reportInstallationFolder does not exist yet")
     else:
         logger.info("Creating reportInstallationFolder")
         os.mkdir(reportInstallationFolder) 
@@ -536,6 +1958,14 @@ def manage_properties_file(systemDetails):
     if not os.path.isfile(propertiesFile):
         print("    Creating properties file: %s" %propertiesFile)
     else:
+        # Leave the file alone if it already has the same details
+        try:
+            with open(propertiesFile, "r") as filePtr:
+                if json.load(filePtr) == serverDetails:
+                    logger.info("    Properties file %s is unchanged" %propertiesFile)
+                    return
+        except ValueError:
+            pass
         print("    Updating properties file: %s" %propertiesFile)
 
     filePtr = open(propertiesFile, 'w')
@@ -543,18 +1973,19 @@ def manage_properties_file(systemDetails):
     filePtr.close
 
 #----------------------------------------------------
-def get_release_details(baseURL, authToken):
+def get_release_details(baseURL, authToken, certificatePath=None):
     logger.debug("Entering get_release_details.")
 
     RESTAPI_BASEURL = "%s/codeinsight/api" %(baseURL)
     RESTAPI_URL = "%s/v1/agent/supports" %(RESTAPI_BASEURL)
 
-    headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + authToken}   
-
     ##########################################################################   
     # Make the REST API call with the project data           
+    # Without a certificate the REQUESTS_CA_BUNDLE set for the install (if any) is used
+    requestOptions = {"verify" : certificatePath} if certificatePath else {}
+
     try:
-        response = requests.get(RESTAPI_URL, headers=headers)
+        response = codeinsight_client.get(RESTAPI_URL, authToken, **requestOptions)
     except requests.exceptions.RequestException as error:  # Just catch all errors
         return {"error" : error}
 
@@ -0,0 +1,91 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : install_state.py
+'''
+import logging, os, json, threading, datetime
+
+logger = logging.getLogger(__name__)
+
+installStateVersion = 1
+installStateLock = threading.Lock()
+
+#------------------------------------------------------------------------------------------------------------------------------
+def load_install_state(stateFile):
+    logger.info("Entering load_install_state")
+
+    installState = {}
+    installState["stateFile"] = stateFile
+    installState["reports"] = {}
+
+    if not os.path.isfile(stateFile):
+        logger.info("    No install state found at %s" %stateFile)
+        return installState
+
+    try:
+        with open(stateFile, "r") as filePtr:
+            stateData = json.load(filePtr)
+    except (ValueError, OSError) as error:
+        logger.warning("    Unable to read install state %s: %s" %(stateFile, error))
+        return installState
+
+    if stateData.get("version") != installStateVersion:
+        logger.info("    Ignoring install state with unsupported version %s" %stateData.get("version"))
+        return installState
+
+    installState["reports"] = stateData.get("reports", {})
+
+    return installState
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_report_state(installState, reportName):
+    return installState["reports"].get(reportName)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def update_report_state(installState, reportName, reportState):
+
+    reportState["updated"] = datetime.datetime.now().isoformat()
+
+    # Reports finish concurrently so serialize the updates to the state file
+    with installStateLock:
+        installState["reports"][reportName] = reportState
+        write_install_state(installState)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_install_state(installState):
+
+    stateData = {}
+    stateData["version"] = installStateVersion
+    stateData["reports"] = installState["reports"]
+
+    # Write to a temporary file first so an interrupted run never leaves a partial state file
+    temporaryStateFile = installState["stateFile"] + ".tmp"
+    try:
+        with open(temporaryStateFile, "w") as filePtr:
+            json.dump(stateData, filePtr, indent=4, sort_keys=True)
+        os.replace(temporaryStateFile, installState["stateFile"])
+    except OSError as error:
+        logger.warning("Unable to write install state %s: %s" %(installState["stateFile"], error))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_required_action(reportState, commit, submodules, serverURL):
+    # Compare what is on disk with what was recorded by the last run.  Returns None if
+    # nothing needs to be done, "update" if the checkout changed outside of a completed
+    # install or "register" if the report still needs to be registered with this server.
+    if reportState is None:
+        return None
+
+    if commit is not None and reportState.get("commit") != commit:
+        return "update"
+
+    if submodules is not None and reportState.get("submodules") != submodules:
+        return "update"
+
+    if reportState.get("serverURL") != serverURL or reportState.get("registrationStatus") == "failed":
+        return "register"
+
+    return None
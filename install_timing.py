@@ -0,0 +1,90 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : install_timing.py
+'''
+import logging, json, sys, time, datetime, threading
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+runReportVersion = 1
+
+timingLock = threading.Lock()
+runTimings = {}
+runTimings["started"] = datetime.datetime.now().isoformat()
+runTimings["startTime"] = time.time()
+runTimings["phases"] = {}
+
+#------------------------------------------------------------------------------------------------------------------------------
+@contextlib.contextmanager
+def timed_phase(phaseName):
+    # Wall clock time for an installer wide phase such as the server check
+    startTime = time.time()
+    try:
+        yield
+    finally:
+        elapsedTime = round(time.time() - startTime, 3)
+        logger.info("Phase %s took %.3f seconds" %(phaseName, elapsedTime))
+        with timingLock:
+            runTimings["phases"][phaseName] = runTimings["phases"].get(phaseName, 0) + elapsedTime
+
+#------------------------------------------------------------------------------------------------------------------------------
+@contextlib.contextmanager
+def timed_step(reportResult, stepName):
+    # Wall clock time for one step of a single report (each report is only handled by one task at a time)
+    startTime = time.time()
+    try:
+        yield
+    finally:
+        elapsedTime = round(time.time() - startTime, 3)
+        logger.info("%s step %s took %.3f seconds" %(reportResult["reportName"], stepName, elapsedTime))
+        reportTimings = reportResult.setdefault("timings", {})
+        reportTimings[stepName] = round(reportTimings.get(stepName, 0) + elapsedTime, 3)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def create_run_report(reportResults, runDetails):
+
+    runReport = {}
+    runReport["version"] = runReportVersion
+    runReport["started"] = runTimings["started"]
+    runReport["finished"] = datetime.datetime.now().isoformat()
+    runReport["totalSeconds"] = round(time.time() - runTimings["startTime"], 3)
+    runReport["pythonVersion"] = sys.version.split()[0]
+    runReport["phases"] = dict(runTimings["phases"])
+    runReport.update(runDetails)
+
+    runReport["reports"] = {}
+    for reportResult in sorted(reportResults, key=lambda reportResult: reportResult["reportName"]):
+        reportDetails = {}
+        reportDetails["repository"] = reportResult["repository"]
+        reportDetails["action"] = reportResult["action"]
+        reportDetails["version"] = reportResult["version"]
+        reportDetails["registrationStatus"] = reportResult["registration"]["status"] if reportResult.get("registration") else None
+        reportDetails["registrationAttempts"] = reportResult["registration"].get("attempts") if reportResult.get("registration") else None
+        reportDetails["failureReason"] = reportResult.get("failureReason")
+        reportDetails["timings"] = reportResult.get("timings", {})
+        reportDetails["totalSeconds"] = round(sum(reportDetails["timings"].values()), 3)
+        runReport["reports"][reportResult["reportName"]] = reportDetails
+
+    return runReport
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_run_report(runReportFile, reportResults, runDetails):
+    logger.info("Writing run report to %s" %runReportFile)
+
+    runReport = create_run_report(reportResults, runDetails)
+
+    try:
+        with open(runReportFile, "w") as filePtr:
+            json.dump(runReport, filePtr, indent=4)
+    except OSError as error:
+        logger.error("Unable to write run report %s: %s" %(runReportFile, error))
+        print("    **ERROR**  Unable to write run report %s: %s" %(runReportFile, error))
+        return None
+
+    return runReport
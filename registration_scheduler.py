@@ -0,0 +1,101 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : registration_scheduler.py
+'''
+import logging, re, threading, time
+
+logger = logging.getLogger(__name__)
+
+# Default settings for running report registrations against the Code Insight server
+schedulerSettings = {}
+schedulerSettings["maxConcurrent"] = 4     # Registrations running at the same time
+schedulerSettings["maxRetries"] = 3        # Retries for a registration the server turned away
+schedulerSettings["backoffFactor"] = 2     # Seconds to wait before the first retry, doubled for each retry after that
+schedulerSettings["maxBackoff"] = 60       # Longest wait between retries
+
+# Output from a registration that shows the server was throttling or failing rather than the report being wrong
+serverBusyPatterns = [
+    r"\b(?:status(?: code)?|HTTP(?:/[\d.]+)?|response code)\s*[:=]?\s*(?:429|5\d\d)\b",
+    r"<Response \[(?:429|5\d\d)\]>",
+    r"Too Many Requests|Service Unavailable|Bad Gateway|Gateway Time-?out|Internal Server Error",
+]
+retryAfterPattern = r"Retry-After\W+(\d+)"
+
+schedulerLock = threading.Lock()
+registrationSlots = threading.BoundedSemaphore(schedulerSettings["maxConcurrent"])
+serverPausedUntil = 0    # No registration starts before this time once the server has pushed back
+
+#------------------------------------------------------------------------------------------------------------------------------
+def configure_scheduler(**settings):
+    global registrationSlots
+
+    for setting in settings:
+        if setting not in schedulerSettings:
+            raise ValueError("Unknown scheduler setting: %s" %setting)
+        if settings[setting] is not None:
+            schedulerSettings[setting] = settings[setting]
+
+    schedulerSettings["maxConcurrent"] = max(1, schedulerSettings["maxConcurrent"])
+    registrationSlots = threading.BoundedSemaphore(schedulerSettings["maxConcurrent"])
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_scheduled_registration(reportName, registrationFunction, *registrationArgs):
+    # Run a registration once a slot is free, retrying with an exponential backoff when the
+    # server throttles or fails.  Every registration waits out the backoff, not just the one
+    # that saw it, so the server gets a break.  Returns the registration result with the
+    # number of attempts made.
+    attempt = 0
+    while True:
+        wait_for_server()
+
+        with registrationSlots:
+            startTime = time.time()
+            registrationResult = registrationFunction(*registrationArgs)
+            registrationResult["seconds"] = round(time.time() - startTime, 3)
+
+        attempt += 1
+        registrationResult["attempts"] = attempt
+        registrationResult["serverBusy"] = registrationResult["status"] != "succeeded" and is_server_busy(registrationResult["message"])
+
+        if not registrationResult["serverBusy"] or attempt > schedulerSettings["maxRetries"]:
+            return registrationResult
+
+        backoff = get_backoff(registrationResult["message"], attempt)
+        logger.warning("    The server turned away the registration of %s.  Retrying in %s seconds (attempt %s of %s)" %(reportName, backoff, attempt, schedulerSettings["maxRetries"]))
+        pause_server(backoff)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def is_server_busy(message):
+    return any(re.search(pattern, message or "", re.IGNORECASE) for pattern in serverBusyPatterns)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_backoff(message, attempt):
+
+    # Use the server's own estimate if it gave one
+    retryAfter = re.search(retryAfterPattern, message or "", re.IGNORECASE)
+    if retryAfter:
+        return min(int(retryAfter.group(1)), schedulerSettings["maxBackoff"])
+
+    return min(schedulerSettings["backoffFactor"] * (2 ** (attempt - 1)), schedulerSettings["maxBackoff"])
+
+#------------------------------------------------------------------------------------------------------------------------------
+def pause_server(backoff):
+    global serverPausedUntil
+
+    with schedulerLock:
+        serverPausedUntil = max(serverPausedUntil, time.time() + backoff)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def wait_for_server():
+
+    while True:
+        with schedulerLock:
+            waitTime = serverPausedUntil - time.time()
+        if waitTime <= 0:
+            return
+        time.sleep(waitTime)
@@ -0,0 +1,85 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : release_cache.py
+'''
+import logging, os, json, hashlib, time
+
+logger = logging.getLogger(__name__)
+
+releaseCacheVersion = 1
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_cached_release(cacheFile, serverURL, authToken, cacheTTL):
+    # Returns the release details from a previous successful server check if it was made
+    # with the same token within the last cacheTTL seconds, otherwise None.  Only checks
+    # that reached the server with a valid token are cached so a failure is always rechecked.
+    if not cacheTTL:
+        return None
+
+    serverEntry = load_release_cache(cacheFile).get(serverURL)
+    if not serverEntry:
+        return None
+
+    if serverEntry.get("tokenHash") != get_token_hash(authToken):
+        logger.info("    Cached server check for %s was made with a different token" %serverURL)
+        return None
+
+    checkAge = time.time() - serverEntry.get("checked", 0)
+    if checkAge < 0 or checkAge > cacheTTL:
+        logger.info("    Cached server check for %s has expired" %serverURL)
+        return None
+
+    logger.info("    Using server check for %s from %.0f seconds ago" %(serverURL, checkAge))
+    return serverEntry["releaseDetails"]
+
+#------------------------------------------------------------------------------------------------------------------------------
+def record_release(cacheFile, serverURL, authToken, releaseDetails):
+
+    releaseCache = load_release_cache(cacheFile)
+
+    # Only a hash of the token is kept so the cache does not hold the token itself
+    serverEntry = {}
+    serverEntry["tokenHash"] = get_token_hash(authToken)
+    serverEntry["checked"] = time.time()
+    serverEntry["releaseDetails"] = {"fnci.release.name" : releaseDetails["fnci.release.name"]}
+    releaseCache[serverURL] = serverEntry
+
+    cacheData = {}
+    cacheData["version"] = releaseCacheVersion
+    cacheData["servers"] = releaseCache
+
+    # Several installers may share the cache so write a private file and swap it in
+    temporaryCacheFile = "%s.%s.tmp" %(cacheFile, os.getpid())
+    try:
+        with open(temporaryCacheFile, "w") as filePtr:
+            json.dump(cacheData, filePtr, indent=4, sort_keys=True)
+        os.replace(temporaryCacheFile, cacheFile)
+    except OSError as error:
+        logger.warning("Unable to write server check cache %s: %s" %(cacheFile, error))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def load_release_cache(cacheFile):
+
+    if not os.path.isfile(cacheFile):
+        return {}
+
+    try:
+        with open(cacheFile, "r") as filePtr:
+            cacheData = json.load(filePtr)
+    except (ValueError, OSError) as error:
+        logger.warning("    Unable to read server check cache %s: %s" %(cacheFile, error))
+        return {}
+
+    if cacheData.get("version") != releaseCacheVersion:
+        return {}
+
+    return cacheData.get("servers", {})
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_token_hash(authToken):
+    return hashlib.sha256(authToken.encode()).hexdigest()
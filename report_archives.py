@@ -0,0 +1,224 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : report_archives.py
+'''
+import logging, os, json, hashlib, shutil, tarfile, zipfile, tempfile, posixpath
+import requests
+
+import codeinsight_client
+
+logger = logging.getLogger(__name__)
+
+archiveManifestFileName = "archives.json"
+archiveChunkSize = 1024 * 1024
+
+# The archive source is a base URL or a local directory holding archives.json and the archives it lists
+#
+#    {"reports": {
+#        "sca-codeinsight-reports-spdx": {
+#            "version": "1.2.0",
+#            "commit": "<optional commit the archive was made from>",
+#            "archive": "sca-codeinsight-reports-spdx-1.2.0.tar.gz",
+#            "sha256": "<sha256 of the archive file>",
+#            "prefix": "<optional leading folder within the archive to strip>",
+#            "submodules": [{"path": "common", "archive": "...", "sha256": "...", "prefix": "..."}]
+#        }
+#    }}
+#
+# Archive paths are relative to the archive source.  tar archives (.tar, .tar.gz, .tgz,
+# .tar.bz2, .tar.xz) are extracted while they download; zip archives are spooled to a
+# temporary file first since their index is at the end of the file.
+
+#------------------------------------------------------------------------------------------------------------------------------
+def load_archive_manifest(archiveSource):
+    logger.info("Entering load_archive_manifest")
+
+    try:
+        with open_archive_file(archiveSource, archiveManifestFileName) as filePtr:
+            archiveManifest = json.loads(filePtr.read().decode("utf-8"))
+    except (OSError, ValueError, requests.exceptions.RequestException) as error:
+        return {"error" : "Unable to read %s from %s: %s" %(archiveManifestFileName, archiveSource, error)}
+
+    if not isinstance(archiveManifest, dict) or not isinstance(archiveManifest.get("reports"), dict):
+        return {"error" : "%s from %s does not list any reports" %(archiveManifestFileName, archiveSource)}
+
+    for reportName, reportEntry in archiveManifest["reports"].items():
+        for archiveEntry in [reportEntry] + reportEntry.get("submodules", []):
+            for requiredField in ["archive", "sha256"]:
+                if not archiveEntry.get(requiredField):
+                    return {"error" : "The archive entry for %s is missing %s" %(reportName, requiredField)}
+
+    logger.info("    Loaded %s report archive(s) from %s" %(len(archiveManifest["reports"]), archiveSource))
+
+    return archiveManifest
+
+#------------------------------------------------------------------------------------------------------------------------------
+def fetch_report_archive(archiveSource, reportEntry, reportFolder):
+    logger.info("Entering fetch_report_archive for %s" %reportFolder)
+
+    # The report itself and then each submodule into its path within the report
+    for archiveEntry in [reportEntry] + reportEntry.get("submodules", []):
+        targetFolder = reportFolder
+        if archiveEntry is not reportEntry:
+            targetFolder = get_member_path(reportFolder, archiveEntry.get("path", ""))
+            if targetFolder is None:
+                return {"error" : "Invalid submodule path %s" %archiveEntry.get("path")}
+
+        extractResponse = extract_archive(archiveSource, archiveEntry, targetFolder)
+        if "error" in extractResponse:
+            return extractResponse
+
+    return {"version" : reportEntry.get("version"), "sha256" : reportEntry["sha256"]}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def extract_archive(archiveSource, archiveEntry, targetFolder):
+
+    archiveName = archiveEntry["archive"]
+    prefix = archiveEntry.get("prefix", "").strip("/")
+
+    if not os.path.isdir(targetFolder):
+        os.makedirs(targetFolder)
+
+    try:
+        with open_archive_file(archiveSource, archiveName) as archiveStream:
+            hashingReader = HashingReader(archiveStream)
+
+            if archiveName.lower().endswith(".zip"):
+                with tempfile.TemporaryFile() as spoolFile:
+                    shutil.copyfileobj(hashingReader, spoolFile, archiveChunkSize)
+                    if hashingReader.hexdigest() != archiveEntry["sha256"].lower():
+                        return {"error" : "The checksum of %s does not match the expected sha256" %archiveName}
+                    spoolFile.seek(0)
+                    with zipfile.ZipFile(spoolFile) as zipFile:
+                        extract_zip_members(zipFile, prefix, targetFolder)
+            else:
+                with tarfile.open(fileobj=hashingReader, mode="r|*") as tarFile:
+                    extract_tar_members(tarFile, prefix, targetFolder)
+                # Read anything after the end of the tar data so the whole file is hashed
+                while hashingReader.read(archiveChunkSize):
+                    pass
+                if hashingReader.hexdigest() != archiveEntry["sha256"].lower():
+                    return {"error" : "The checksum of %s does not match the expected sha256" %archiveName}
+
+    except (OSError, tarfile.TarError, zipfile.BadZipFile, requests.exceptions.RequestException) as error:
+        return {"error" : "Unable to extract %s: %s" %(archiveName, error)}
+
+    logger.info("    Extracted %s (%s bytes) into %s" %(archiveName, hashingReader.size, targetFolder))
+
+    return {"sha256" : hashingReader.hexdigest()}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def extract_tar_members(tarFile, prefix, targetFolder):
+
+    for member in tarFile:
+        memberPath = get_member_path(targetFolder, strip_prefix(member.name, prefix))
+        if memberPath is None:
+            continue
+
+        if member.isdir():
+            if not os.path.isdir(memberPath):
+                os.makedirs(memberPath)
+        elif member.isfile():
+            write_member(tarFile.extractfile(member), memberPath, member.mode)
+        elif member.issym():
+            # Only links that stay within the report are kept
+            linkTarget = posixpath.normpath(posixpath.join(posixpath.dirname(strip_prefix(member.name, prefix)), member.linkname))
+            if posixpath.isabs(member.linkname) or linkTarget.startswith(".."):
+                logger.warning("    Skipping link %s which points outside of the report" %member.name)
+                continue
+            if os.path.lexists(memberPath):
+                os.remove(memberPath)
+            os.symlink(member.linkname, memberPath)
+        else:
+            logger.warning("    Skipping unsupported archive member %s" %member.name)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def extract_zip_members(zipFile, prefix, targetFolder):
+
+    for member in zipFile.infolist():
+        memberPath = get_member_path(targetFolder, strip_prefix(member.filename, prefix))
+        if memberPath is None:
+            continue
+
+        if member.filename.endswith("/"):
+            if not os.path.isdir(memberPath):
+                os.makedirs(memberPath)
+        else:
+            with zipFile.open(member) as memberStream:
+                write_member(memberStream, memberPath, (member.external_attr >> 16) & 0o777)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_member(memberStream, memberPath, mode):
+
+    if not os.path.isdir(os.path.dirname(memberPath)):
+        os.makedirs(os.path.dirname(memberPath))
+
+    with open(memberPath, "wb") as filePtr:
+        shutil.copyfileobj(memberStream, filePtr, archiveChunkSize)
+
+    # Keep scripts executable
+    if mode and mode & 0o111:
+        os.chmod(memberPath, os.stat(memberPath).st_mode | 0o111)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def strip_prefix(memberName, prefix):
+    while memberName.startswith("./"):
+        memberName = memberName[2:]
+    if not prefix:
+        return memberName
+    if memberName.rstrip("/") == prefix:
+        return ""
+    if memberName.startswith(prefix + "/"):
+        return memberName[len(prefix) + 1:]
+    return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_member_path(targetFolder, memberName):
+    # Returns where an archive member belongs within the target folder or None if it
+    # is outside of the prefix or would be written outside of the target folder
+    if memberName is None:
+        return None
+
+    memberName = posixpath.normpath(memberName.replace("\\", "/"))
+    if memberName == ".":
+        return targetFolder
+    if posixpath.isabs(memberName) or memberName.split("/")[0] == ".." or ":" in memberName:
+        logger.warning("    Skipping archive member %s which is outside of the report" %memberName)
+        return None
+
+    return os.path.join(targetFolder, *memberName.split("/"))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def open_archive_file(archiveSource, archiveName):
+
+    if archiveSource.startswith(("http://", "https://")):
+        archiveURL = archiveSource.rstrip("/") + "/" + archiveName
+        response = requests.get(archiveURL, stream=True, timeout=(codeinsight_client.clientSettings["connectTimeout"], codeinsight_client.clientSettings["readTimeout"]))
+        response.raise_for_status()
+        # Read the body as it arrives rather than holding the whole archive in memory
+        return response.raw
+
+    return open(os.path.join(archiveSource, *archiveName.split("/")), "rb")
+
+#------------------------------------------------------------------------------------------------------------------------------
+class HashingReader(object):
+    # Hashes the archive as it is read so it is only read once
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size if size is not None and size >= 0 else None)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
@@ -0,0 +1,148 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : report_registration.py
+'''
+import logging, os, sys, threading
+import importlib.util
+
+import codeinsight_client
+from command_runner import run_command
+
+logger = logging.getLogger(__name__)
+
+reportRegistrationFile = "registration.py"
+
+# Entry points a report's registration.py can expose to be registered in process.
+# Each is called with the installer context dictionary and returns a dictionary
+# with a boolean "success" and a "message".
+registrationEntryPoints = {}
+registrationEntryPoints["register"] = "register_report"
+registrationEntryPoints["update"] = "update_report"
+
+registrationCommandOptions = {}
+registrationCommandOptions["register"] = "-reg"
+registrationCommandOptions["update"] = "-update"
+
+# Importing changes sys.path and sys.modules so only load one registration module at a time
+registrationImportLock = threading.Lock()
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_registration(reportName, reportFolder, action, serverDetails, pythonCommand, inProcess=False, outputHandler=None):
+    logger.info("Entering run_registration for %s (%s)" %(reportName, action))
+
+    if inProcess:
+        registrationEntryPoint = get_registration_entry_point(reportName, reportFolder, action)
+        if registrationEntryPoint:
+            return run_in_process_registration(reportName, registrationEntryPoint, serverDetails)
+        logger.info("    %s does not provide %s so running %s" %(reportName, registrationEntryPoints[action], reportRegistrationFile))
+
+    return run_subprocess_registration(reportName, reportFolder, action, pythonCommand, outputHandler)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_registration_entry_point(reportName, reportFolder, action):
+
+    registrationFile = os.path.join(reportFolder, reportRegistrationFile)
+
+    with registrationImportLock:
+        # Registration scripts import modules from their own folder (and submodules).  Modules
+        # with the same names loaded by the installer or by another report (_version, common
+        # submodules) are set aside so the report gets its own copies, and the report's copies
+        # are dropped afterwards so they are not handed to the next report
+        localNames = get_local_module_names(reportFolder)
+        hiddenModules = dict((moduleName, module) for moduleName, module in sys.modules.items() if moduleName.split(".")[0] in localNames)
+        for moduleName in hiddenModules:
+            del sys.modules[moduleName]
+        loadedModules = set(sys.modules)
+
+        sys.path.insert(0, reportFolder)
+        try:
+            moduleSpec = importlib.util.spec_from_file_location("registration_" + reportName.replace("-", "_"), registrationFile)
+            registrationModule = importlib.util.module_from_spec(moduleSpec)
+            moduleSpec.loader.exec_module(registrationModule)
+        except (Exception, SystemExit) as error:
+            logger.warning("    Unable to import %s for %s: %s" %(reportRegistrationFile, reportName, error))
+            return None
+        finally:
+            sys.path.remove(reportFolder)
+            for moduleName in set(sys.modules) - loadedModules:
+                if moduleName.split(".")[0] in localNames or is_report_module(sys.modules[moduleName], reportFolder):
+                    del sys.modules[moduleName]
+            sys.modules.update(hiddenModules)
+
+    return getattr(registrationModule, registrationEntryPoints[action], None)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_local_module_names(reportFolder):
+    # The top level modules and packages a script in the report folder can import
+    localNames = set()
+    for entryName in os.listdir(reportFolder):
+        if entryName.endswith(".py"):
+            localNames.add(entryName[:-3])
+        elif os.path.isdir(os.path.join(reportFolder, entryName)) and not entryName.startswith("."):
+            localNames.add(entryName)
+    return localNames
+
+#------------------------------------------------------------------------------------------------------------------------------
+def is_report_module(module, reportFolder):
+    moduleFile = getattr(module, "__file__", None)
+    if not moduleFile:
+        return False
+    return os.path.abspath(moduleFile).startswith(os.path.join(os.path.abspath(reportFolder), ""))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_in_process_registration(reportName, registrationEntryPoint, serverDetails):
+
+    installerContext = {}
+    installerContext["reportName"] = reportName
+    installerContext["serverURL"] = serverDetails["serverURL"]
+    installerContext["adminAuthToken"] = serverDetails["adminAuthToken"]
+    installerContext["certificatePath"] = serverDetails.get("certificatePath")
+    installerContext["session"] = codeinsight_client.get_session()
+    installerContext["headers"] = codeinsight_client.get_headers(serverDetails["adminAuthToken"])
+
+    try:
+        response = registrationEntryPoint(installerContext)
+    except (Exception, SystemExit) as error:
+        logger.error("    In process registration for %s failed: %s" %(reportName, error))
+        return create_registration_result("failed", str(error), "in-process")
+
+    if isinstance(response, dict):
+        success = response.get("success", False)
+        message = response.get("message", "")
+    else:
+        success = bool(response)
+        message = ""
+
+    return create_registration_result("succeeded" if success else "failed", message, "in-process")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def run_subprocess_registration(reportName, reportFolder, action, pythonCommand, outputHandler=None):
+
+    registrationFile = os.path.join(reportFolder, reportRegistrationFile)
+    registrationCommand = pythonCommand + [registrationFile, registrationCommandOptions[action]]
+
+    registrationResponse = run_command(registrationCommand, reportFolder, "registration", outputHandler)
+
+    if registrationResponse["timedOut"]:
+        status = "failed"
+    elif "Report registration succeeded!" in registrationResponse["output"]:
+        status = "succeeded"
+    elif "Report registration failed!" in registrationResponse["output"]:
+        status = "failed"
+    else:
+        status = "unknown"
+
+    return create_registration_result(status, registrationResponse["output"], "subprocess")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def create_registration_result(status, message, method):
+    registrationResult = {}
+    registrationResult["status"] = status   # succeeded, failed or unknown
+    registrationResult["message"] = message
+    registrationResult["method"] = method   # in-process or subprocess
+    return registrationResult
@@ -8,21 +8,40 @@ Created On : Sun May 22 2022
 File : report_repositories.py
 '''
 
+# The catalog of reports the installer manages.  Each report may record
+#     minimumRelease / maximumRelease  - The Code Insight releases the report supports, for example 2022R4 (None for no limit)
+#     tags                             - Groups the report belongs to for the -only and -exclude selectors
+#     ref                              - A tag or branch to install instead of the default branch
+reportCatalog = []
+
+# The repository URLs in catalog order for scripts that used the list before the catalog
 repositories = []
 
+#------------------------------------------------------------------------------------------------------------------------------
+def add_report(repository, minimumRelease=None, maximumRelease=None, tags=[], ref=None):
+    report = {}
+    report["repository"] = repository
+    report["minimumRelease"] = minimumRelease
+    report["maximumRelease"] = maximumRelease
+    report["tags"] = list(tags)
+    report["ref"] = ref
+    reportCatalog.append(report)
+    repositories.append(repository)
+
 
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-project-sbom.git")
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-spdx.git")
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-cyclonedx.git")
+# None of the reports document the Code Insight releases they support yet so no release limits are set
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-project-sbom.git", tags=["sbom"])
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-spdx.git", tags=["sbom"])
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-cyclonedx.git", tags=["sbom"])
 
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-third-party-notices.git")
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-third-party-notices.git", tags=["notices"])
 
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-project-inventory.git")
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-project-vulnerabilities.git")
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-project-vulnerability-exclusions.git")
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-project-inventory.git", tags=["inventory"])
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-project-vulnerabilities.git", tags=["vulnerabilities"])
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-project-vulnerability-exclusions.git", tags=["vulnerabilities"])
 
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-project-tasks.git")
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-third-party-evidence.git")
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-project-tasks.git", tags=["project"])
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-third-party-evidence.git", tags=["evidence"])
 
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-project-comparison.git")
-repositories.append("https://github.com/flexera-public/sca-codeinsight-reports-claim-files.git")
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-project-comparison.git", tags=["project"])
+add_report("https://github.com/flexera-public/sca-codeinsight-reports-claim-files.git", tags=["evidence"])
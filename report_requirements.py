@@ -0,0 +1,343 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : report_requirements.py
+'''
+import logging, re, hashlib, json, os, threading
+
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:  # Python < 3.8
+    importlib_metadata = None
+    import pkg_resources
+
+logger = logging.getLogger(__name__)
+
+requirementsCacheVersion = 1
+requirementsCacheLock = threading.Lock()
+
+# The version specifiers must start with an operator so direct references (name @ URL, URLs and
+# paths) do not match and are kept as options rather than being reduced to the bare name
+requirementExpression = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*((?:(?:===|==|!=|~=|>=|<=|>|<)[^;]*?)?)\s*(;.*)?$")
+specifierExpression = re.compile(r"^(===|==|!=|~=|>=|<=|>|<)\s*(\S+)$")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def parse_requirements_file(requirementsFile):
+    logger.debug("Entering parse_requirements_file for %s" %requirementsFile)
+
+    requirements = []
+    options = []
+
+    with open(requirementsFile, "r") as filePtr:
+        for line in filePtr:
+            line = line.split(" #")[0].strip()
+
+            if not line or line.startswith("#"):
+                continue
+
+            # Options such as --index-url or -r can not be merged so keep them as they are
+            if line.startswith("-"):
+                options.append(line)
+                continue
+
+            match = requirementExpression.match(line)
+            if not match:
+                # Direct references (URLs, paths) are passed through untouched
+                options.append(line)
+                continue
+
+            name, extras, specifiers, marker = match.groups()
+
+            requirement = {}
+            requirement["name"] = name
+            requirement["canonicalName"] = canonicalize_name(name)
+            requirement["extras"] = set([extra.strip() for extra in extras[1:-1].split(",") if extra.strip()]) if extras else set()
+            requirement["specifiers"] = parse_specifiers(specifiers)
+            requirement["marker"] = marker[1:].strip() if marker else None
+            requirement["line"] = line
+
+            requirements.append(requirement)
+
+    return {"requirements" : requirements, "options" : options}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def merge_requirements(reportRequirementsFiles):
+    logger.info("Entering merge_requirements")
+
+    # reportRequirementsFiles is a dictionary of report name to requirements file
+    mergedPackages = {}
+    mergedOptions = []
+
+    for reportName in sorted(reportRequirementsFiles):
+        parsedRequirements = parse_requirements_file(reportRequirementsFiles[reportName])
+
+        for option in parsedRequirements["options"]:
+            if option not in mergedOptions:
+                mergedOptions.append(option)
+
+        for requirement in parsedRequirements["requirements"]:
+            packageKey = (requirement["canonicalName"], requirement["marker"])
+
+            if packageKey not in mergedPackages:
+                mergedPackages[packageKey] = {}
+                mergedPackages[packageKey]["name"] = requirement["name"]
+                mergedPackages[packageKey]["marker"] = requirement["marker"]
+                mergedPackages[packageKey]["extras"] = set()
+                mergedPackages[packageKey]["specifiers"] = []
+                mergedPackages[packageKey]["reports"] = {}
+
+            mergedPackages[packageKey]["extras"].update(requirement["extras"])
+            for specifier in requirement["specifiers"]:
+                if specifier not in mergedPackages[packageKey]["specifiers"]:
+                    mergedPackages[packageKey]["specifiers"].append(specifier)
+            mergedPackages[packageKey]["reports"][reportName] = requirement["line"]
+
+    mergedRequirements = []
+    conflicts = []
+
+    for packageKey in sorted(mergedPackages, key=lambda key: (key[0], key[1] or "")):
+        package = mergedPackages[packageKey]
+
+        conflictReason = find_specifier_conflict(package["specifiers"])
+        if conflictReason:
+            conflict = {}
+            conflict["package"] = package["name"]
+            conflict["reason"] = conflictReason
+            conflict["reports"] = package["reports"]
+            conflicts.append(conflict)
+
+        mergedRequirements.append(format_requirement(package))
+
+    return {"requirements" : mergedRequirements, "options" : mergedOptions, "conflicts" : conflicts}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def write_requirements_file(requirementsFile, requirements, options=[]):
+    logger.info("Writing requirements to %s" %requirementsFile)
+
+    with open(requirementsFile, "w") as filePtr:
+        for line in options + requirements:
+            filePtr.write(line + "\n")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def canonicalize_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+#------------------------------------------------------------------------------------------------------------------------------
+def parse_specifiers(specifiers):
+    parsedSpecifiers = []
+
+    for specifier in specifiers.split(","):
+        specifier = specifier.strip()
+        if not specifier:
+            continue
+
+        match = specifierExpression.match(specifier)
+        if match:
+            parsedSpecifiers.append((match.group(1), match.group(2)))
+        else:
+            logger.warning("Unable to parse version specifier: %s" %specifier)
+
+    return parsedSpecifiers
+
+#------------------------------------------------------------------------------------------------------------------------------
+def format_requirement(package):
+    requirementLine = package["name"]
+
+    if package["extras"]:
+        requirementLine += "[%s]" %",".join(sorted(package["extras"]))
+
+    requirementLine += ",".join([operator + version for operator, version in package["specifiers"]])
+
+    if package["marker"]:
+        requirementLine += "; %s" %package["marker"]
+
+    return requirementLine
+
+#------------------------------------------------------------------------------------------------------------------------------
+def version_key(version, stripZeros=True):
+    # A simplified version ordering that is good enough to compare the
+    # release numbers used within report requirements (1.2.3, 2.28, ...)
+    versionKey = []
+    for part in re.split(r"[.+-]", version):
+        if part.isdigit():
+            versionKey.append((int(part), ""))
+        elif part == "*":
+            break
+        else:
+            digits = re.match(r"^(\d*)(.*)$", part)
+            versionKey.append((int(digits.group(1) or 0), digits.group(2)))
+
+    # Ignore trailing zeros so 2.0 and 2.0.0 compare as equal
+    while stripZeros and versionKey and versionKey[-1] == (0, ""):
+        versionKey.pop()
+
+    return versionKey
+
+#------------------------------------------------------------------------------------------------------------------------------
+def find_specifier_conflict(specifiers):
+    # Return a description of why the specifiers can not be satisfied together, otherwise None
+    pinnedVersions = set([version for operator, version in specifiers if operator in ("==", "===") and "*" not in version])
+
+    if len(pinnedVersions) > 1:
+        return "Multiple pinned versions: %s" %", ".join(sorted(pinnedVersions))
+
+    if pinnedVersions:
+        pinnedVersion = pinnedVersions.pop()
+        for operator, version in specifiers:
+            if not version_satisfies(pinnedVersion, operator, version):
+                return "Pinned version %s does not satisfy %s%s" %(pinnedVersion, operator, version)
+        return None
+
+    # No pins so make sure the lower and upper bounds still leave a usable range
+    lowerBound = None
+    upperBound = None
+
+    for operator, version in specifiers:
+        if operator in (">=", ">", "~="):
+            if lowerBound is None or version_key(version) > version_key(lowerBound[1]):
+                lowerBound = (operator, version)
+        elif operator in ("<=", "<"):
+            if upperBound is None or version_key(version) < version_key(upperBound[1]):
+                upperBound = (operator, version)
+
+    if lowerBound and upperBound:
+        lowerKey = version_key(lowerBound[1])
+        upperKey = version_key(upperBound[1])
+
+        if lowerKey > upperKey or (lowerKey == upperKey and (lowerBound[0] != ">=" or upperBound[0] != "<=")):
+            return "No version satisfies both %s%s and %s%s" %(lowerBound[0], lowerBound[1], upperBound[0], upperBound[1])
+
+    return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def version_satisfies(candidateVersion, operator, version):
+    candidateKey = version_key(candidateVersion)
+
+    if "*" in version:
+        # Prefix matching such as ==2.* or !=1.4.*
+        prefixMatch = version_prefix_matches(candidateVersion, version.split(".*")[0])
+        return prefixMatch if operator == "==" else not prefixMatch
+
+    versionKey = version_key(version)
+
+    if operator in ("==", "==="):
+        return candidateKey == versionKey
+    elif operator == "!=":
+        return candidateKey != versionKey
+    elif operator == ">=":
+        return candidateKey >= versionKey
+    elif operator == "<=":
+        return candidateKey <= versionKey
+    elif operator == ">":
+        return candidateKey > versionKey
+    elif operator == "<":
+        return candidateKey < versionKey
+    elif operator == "~=":
+        # Compatible release: >= version and matching all but the last release segment
+        prefixVersion = ".".join(version.split(".")[:-1]) or version
+        return candidateKey >= versionKey and version_prefix_matches(candidateVersion, prefixVersion)
+
+    return True
+
+#------------------------------------------------------------------------------------------------------------------------------
+def version_prefix_matches(candidateVersion, prefixVersion):
+    prefixKey = version_key(prefixVersion, stripZeros=False)
+    candidateKey = version_key(candidateVersion, stripZeros=False)
+
+    # Pad the candidate so 2 is treated the same as 2.0 when matching 2.0.*
+    candidateKey += [(0, "")] * (len(prefixKey) - len(candidateKey))
+
+    return candidateKey[:len(prefixKey)] == prefixKey
+
+#------------------------------------------------------------------------------------------------------------------------------
+def requirements_hash(requirementsFile):
+    with open(requirementsFile, "rb") as filePtr:
+        return hashlib.sha256(filePtr.read()).hexdigest()
+
+#------------------------------------------------------------------------------------------------------------------------------
+def installed_distribution_version(distributionName):
+    # Return the installed version of a distribution or None if it is not installed
+    try:
+        if importlib_metadata:
+            return importlib_metadata.version(distributionName)
+        else:
+            return pkg_resources.get_distribution(distributionName).version
+    except Exception:
+        return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def load_requirements_cache(cacheFile):
+    logger.info("Entering load_requirements_cache")
+
+    requirementsCache = {}
+    requirementsCache["cacheFile"] = cacheFile
+    requirementsCache["reports"] = {}
+
+    if os.path.isfile(cacheFile):
+        try:
+            with open(cacheFile, "r") as filePtr:
+                cacheData = json.load(filePtr)
+            if cacheData.get("version") == requirementsCacheVersion:
+                requirementsCache["reports"] = cacheData.get("reports", {})
+            else:
+                logger.info("    Ignoring requirements cache with unsupported version")
+        except (ValueError, OSError) as error:
+            logger.warning("    Unable to read requirements cache %s: %s" %(cacheFile, error))
+
+    return requirementsCache
+
+#------------------------------------------------------------------------------------------------------------------------------
+def requirements_are_current(reportName, requirementsFile, requirementsCache):
+
+    cachedRequirements = requirementsCache["reports"].get(reportName)
+    if not cachedRequirements:
+        logger.info("    No cached requirements for %s" %reportName)
+        return False
+
+    if cachedRequirements["requirementsHash"] != requirements_hash(requirementsFile):
+        logger.info("    The requirements for %s have changed" %reportName)
+        return False
+
+    # The file is unchanged but make sure nothing was removed from the environment or
+    # changed to another version (by another report or install) since
+    recordedVersions = cachedRequirements.get("installedVersions", {})
+    for requirement in parse_requirements_file(requirementsFile)["requirements"]:
+        installedVersion = installed_distribution_version(requirement["name"])
+        if installedVersion is None:
+            logger.info("    %s required by %s is not installed" %(requirement["name"], reportName))
+            return False
+        recordedVersion = recordedVersions.get(requirement["canonicalName"])
+        if recordedVersion is not None and recordedVersion != installedVersion:
+            logger.info("    %s required by %s changed from %s to %s" %(requirement["name"], reportName, recordedVersion, installedVersion))
+            return False
+
+    return True
+
+#------------------------------------------------------------------------------------------------------------------------------
+def record_requirements(reportName, requirementsFile, requirementsCache):
+
+    installedVersions = {}
+    for requirement in parse_requirements_file(requirementsFile)["requirements"]:
+        installedVersions[requirement["canonicalName"]] = installed_distribution_version(requirement["name"])
+
+    cachedRequirements = {}
+    cachedRequirements["requirementsHash"] = requirements_hash(requirementsFile)
+    cachedRequirements["installedVersions"] = installedVersions
+
+    # Reports are processed concurrently so serialize the updates to the cache file
+    with requirementsCacheLock:
+        requirementsCache["reports"][reportName] = cachedRequirements
+
+        cacheData = {}
+        cacheData["version"] = requirementsCacheVersion
+        cacheData["reports"] = requirementsCache["reports"]
+
+        try:
+            with open(requirementsCache["cacheFile"], "w") as filePtr:
+                json.dump(cacheData, filePtr, indent=4, sort_keys=True)
+        except OSError as error:
+            logger.warning("Unable to write requirements cache %s: %s" %(requirementsCache["cacheFile"], error))
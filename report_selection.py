@@ -0,0 +1,96 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : report_selection.py
+'''
+import logging, re, fnmatch
+
+logger = logging.getLogger(__name__)
+
+reportNamePrefix = "sca-codeinsight-reports-"
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_report_name(repository):
+    return repository.split("/")[-1].split(".")[0]  # Remove the base and .git from the repo name
+
+#------------------------------------------------------------------------------------------------------------------------------
+def select_reports(reportCatalog, onlySelectors, excludeSelectors):
+    logger.info("Entering select_reports")
+
+    # Selectors may be repeated or comma separated and match a report name (with or
+    # without the sca-codeinsight-reports- prefix, wildcards allowed) or a tag
+    onlySelectors = split_selectors(onlySelectors)
+    excludeSelectors = split_selectors(excludeSelectors)
+
+    matchedSelectors = set()
+    selectedReports = []
+    for report in reportCatalog:
+        onlyMatches = [selector for selector in onlySelectors if report_matches_selector(report, selector)]
+        excludeMatches = [selector for selector in excludeSelectors if report_matches_selector(report, selector)]
+        matchedSelectors.update(onlyMatches + excludeMatches)
+
+        if onlySelectors and not onlyMatches:
+            continue
+        if excludeMatches:
+            logger.info("    Excluding %s" %get_report_name(report["repository"]))
+            continue
+
+        selectedReports.append(report)
+
+    selection = {}
+    selection["reports"] = selectedReports
+    selection["unmatched"] = [selector for selector in onlySelectors + excludeSelectors if selector not in matchedSelectors]
+
+    return selection
+
+#------------------------------------------------------------------------------------------------------------------------------
+def split_selectors(selectors):
+    splitSelectors = []
+    for selector in selectors or []:
+        splitSelectors += [value.strip() for value in selector.split(",") if value.strip()]
+    return splitSelectors
+
+#------------------------------------------------------------------------------------------------------------------------------
+def report_matches_selector(report, selector):
+
+    reportName = get_report_name(report["repository"])
+    shortName = reportName[len(reportNamePrefix):] if reportName.startswith(reportNamePrefix) else reportName
+
+    if fnmatch.fnmatch(reportName, selector) or fnmatch.fnmatch(shortName, selector):
+        return True
+
+    return selector in report["tags"]
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_unsupported_reason(report, releaseName):
+    # Returns why the report can not be used with the Code Insight release or None if it can
+    if not report["minimumRelease"] and not report["maximumRelease"]:
+        return None
+
+    release = parse_release(releaseName)
+    if release is None:
+        logger.warning("    Unable to compare Code Insight release %s with the supported releases" %releaseName)
+        return None
+
+    minimumRelease = parse_release(report["minimumRelease"])
+    if minimumRelease and release < minimumRelease:
+        return "requires Code Insight %s or later" %report["minimumRelease"]
+
+    maximumRelease = parse_release(report["maximumRelease"])
+    if maximumRelease and release > maximumRelease:
+        return "supports Code Insight %s and earlier" %report["maximumRelease"]
+
+    return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def parse_release(releaseName):
+    # Code Insight releases are named like 2023R3 with an optional service pack (2023R3 SP1)
+    releaseMatch = re.match(r"^\s*(\d{4})\s*R(\d+)(?:\s*SP(\d+))?", releaseName or "", re.IGNORECASE)
+    if not releaseMatch:
+        return None
+
+    return (int(releaseMatch.group(1)), int(releaseMatch.group(2)), int(releaseMatch.group(3) or 0))
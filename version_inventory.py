@@ -0,0 +1,273 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : version_inventory.py
+'''
+import logging, os, re, zlib, concurrent.futures
+
+from command_runner import run_command
+
+logger = logging.getLogger(__name__)
+
+# The versions are read from the refs and tag objects in each report's .git folder
+# so no git process is needed for a report that is checked out at a tag.  git is only
+# run to describe a report between tags (or when its refs can not be read directly)
+# and, when requested, to check the working tree for local changes.
+
+#------------------------------------------------------------------------------------------------------------------------------
+def collect_versions(reportFolders, checkWorktree=False, numberOfJobs=8):
+    logger.info("Entering collect_versions")
+
+    reportVersions = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, numberOfJobs)) as executor:
+        futures = {executor.submit(get_report_version, reportFolder, checkWorktree) : reportFolder for reportFolder in reportFolders}
+        for future in concurrent.futures.as_completed(futures):
+            reportVersion = future.result()
+            reportVersions[reportVersion["reportName"]] = reportVersion
+
+    return reportVersions
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_report_version(reportFolder, checkWorktree=False):
+
+    reportVersion = {}
+    reportVersion["reportName"] = os.path.basename(os.path.normpath(reportFolder))
+    reportVersion["folder"] = reportFolder
+    reportVersion["commit"] = None
+    reportVersion["branch"] = None
+    reportVersion["tag"] = None
+    reportVersion["version"] = None
+    reportVersion["versionSource"] = None
+    reportVersion["dirty"] = None
+    reportVersion["submodulesDrifted"] = None
+    reportVersion["error"] = None
+
+    gitFolder = get_git_folder(reportFolder)
+    if gitFolder is None:
+        reportVersion["error"] = "Not a git repository"
+        return reportVersion
+
+    references = read_references(gitFolder)
+    head = read_head(gitFolder, references)
+    reportVersion["commit"] = head["commit"]
+    reportVersion["branch"] = head["branch"]
+
+    if head["commit"]:
+        headTags = [tagName for tagName, tagCommit in get_tag_commits(gitFolder, references).items() if tagCommit == head["commit"]]
+        if headTags:
+            reportVersion["tag"] = sorted(headTags, key=get_tag_sort_key)[-1]
+            reportVersion["version"] = reportVersion["tag"]
+            reportVersion["versionSource"] = "refs"
+
+    if reportVersion["version"] is None:
+        # Between tags (or refs that could not be read) so let git work out the nearest tag.
+        # --always falls back to the abbreviated commit so a report without tags still has a version
+        describeResponse = run_command(["git", "describe", "--tags", "--always"], reportFolder, "describe")
+        if describeResponse["returnCode"] == 0:
+            reportVersion["version"] = describeResponse["output"].strip()
+            reportVersion["versionSource"] = "describe"
+        else:
+            logger.error("Unable to determine version for %s: %s" %(reportFolder, describeResponse["output"]))
+            reportVersion["version"] = "Unknown"
+            reportVersion["error"] = describeResponse["output"].strip()
+
+    if checkWorktree:
+        worktreeStatus = get_worktree_status(reportFolder)
+        reportVersion["dirty"] = worktreeStatus["dirty"]
+        reportVersion["submodulesDrifted"] = worktreeStatus["submodulesDrifted"]
+        if worktreeStatus["error"]:
+            reportVersion["error"] = worktreeStatus["error"]
+
+    return reportVersion
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_git_folder(reportFolder):
+
+    gitFolder = os.path.join(reportFolder, ".git")
+    if os.path.isdir(gitFolder):
+        return gitFolder
+
+    # Submodules and worktrees have a .git file pointing at the real folder
+    if os.path.isfile(gitFolder):
+        with open(gitFolder, "r") as filePtr:
+            gitLink = filePtr.readline().strip()
+        if gitLink.startswith("gitdir:"):
+            return os.path.normpath(os.path.join(reportFolder, gitLink[len("gitdir:"):].strip()))
+
+    return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def read_references(gitFolder):
+    # Returns {refName : {"commit" : sha, "peeled" : sha or None, "peeledKnown" : bool}} from packed-refs
+    # and the loose refs.  Loose refs are newer than packed ones so they are read second.
+    references = {}
+
+    packedRefsFile = os.path.join(gitFolder, "packed-refs")
+    if os.path.isfile(packedRefsFile):
+        lastRef = None
+        packTraits = []
+        with open(packedRefsFile, "r") as filePtr:
+            for line in filePtr:
+                line = line.strip()
+                if line.startswith("# pack-refs with:"):
+                    packTraits = line[len("# pack-refs with:"):].split()
+                    continue
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("^") and lastRef:
+                    references[lastRef]["peeled"] = line[1:]
+                    continue
+                commit, _, refName = line.partition(" ")
+                # With the fully-peeled trait (or peeled for tags) every annotated tag has a ^ line
+                # so a ref without one points straight at the commit (a lightweight tag)
+                peeledKnown = "fully-peeled" in packTraits or ("peeled" in packTraits and refName.startswith("refs/tags/"))
+                references[refName] = {"commit" : commit, "peeled" : None, "peeledKnown" : peeledKnown}
+                lastRef = refName
+
+    refsFolder = os.path.join(gitFolder, "refs")
+    for folder, _, files in os.walk(refsFolder):
+        for fileName in files:
+            refFile = os.path.join(folder, fileName)
+            refName = os.path.relpath(refFile, gitFolder).replace(os.sep, "/")
+            try:
+                with open(refFile, "r") as filePtr:
+                    refValue = filePtr.readline().strip()
+            except OSError:
+                continue
+            if re.match(r"^[0-9a-f]{40,64}$", refValue):
+                references[refName] = {"commit" : refValue, "peeled" : None, "peeledKnown" : False}
+
+    return references
+
+#------------------------------------------------------------------------------------------------------------------------------
+def read_head(gitFolder, references):
+
+    head = {"commit" : None, "branch" : None}
+
+    try:
+        with open(os.path.join(gitFolder, "HEAD"), "r") as filePtr:
+            headValue = filePtr.readline().strip()
+    except OSError:
+        return head
+
+    if headValue.startswith("ref:"):
+        refName = headValue[len("ref:"):].strip()
+        if refName.startswith("refs/heads/"):
+            head["branch"] = refName[len("refs/heads/"):]
+        if refName in references:
+            head["commit"] = references[refName]["commit"]
+    else:
+        head["commit"] = headValue  # Detached, as pinned reports are
+
+    return head
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_tag_commits(gitFolder, references):
+    # Returns {tagName : commit}.  Annotated tags point at a tag object so they are peeled
+    # to the commit, either from packed-refs or by reading the loose tag object.  Packed
+    # lightweight tags (GitHub release tags in a fresh clone) need neither.
+    tagCommits = {}
+
+    for refName, reference in references.items():
+        if not refName.startswith("refs/tags/"):
+            continue
+
+        tagCommit = reference["peeled"]
+        if tagCommit is None and reference["peeledKnown"]:
+            tagCommit = reference["commit"]
+        elif tagCommit is None:
+            objectDetails = read_loose_object(gitFolder, reference["commit"])
+            if objectDetails is None:
+                continue  # Packed object so leave this tag to git describe
+            if objectDetails["type"] == "commit":
+                tagCommit = reference["commit"]
+            elif objectDetails["type"] == "tag":
+                tagCommit = get_tagged_object(gitFolder, objectDetails["content"])
+
+        if tagCommit:
+            tagCommits[refName[len("refs/tags/"):]] = tagCommit
+
+    return tagCommits
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_tagged_object(gitFolder, tagContent):
+
+    # Follow tags of tags until the commit is reached
+    for _ in range(10):
+        objectMatch = re.match(rb"^object ([0-9a-f]+)\ntype (\w+)\n", tagContent)
+        if not objectMatch:
+            return None
+        if objectMatch.group(2) == b"commit":
+            return objectMatch.group(1).decode()
+        objectDetails = read_loose_object(gitFolder, objectMatch.group(1).decode())
+        if objectDetails is None or objectDetails["type"] != "tag":
+            return None
+        tagContent = objectDetails["content"]
+
+    return None
+
+#------------------------------------------------------------------------------------------------------------------------------
+def read_loose_object(gitFolder, objectId):
+
+    objectFile = os.path.join(gitFolder, "objects", objectId[:2], objectId[2:])
+    if not os.path.isfile(objectFile):
+        return None
+
+    try:
+        with open(objectFile, "rb") as filePtr:
+            objectData = zlib.decompress(filePtr.read())
+    except (OSError, zlib.error):
+        return None
+
+    header, _, content = objectData.partition(b"\0")
+    return {"type" : header.split(b" ")[0].decode(), "content" : content}
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_tag_sort_key(tagName):
+    # Prefer the highest version when several tags point at the same commit
+    return [int(part) if part.isdigit() else -1 for part in re.split(r"[.\-]", tagName.lstrip("vV"))]
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_worktree_status(reportFolder):
+    # Local changes to tracked files and submodules that are not at the commit the report records
+    worktreeStatus = {"dirty" : None, "submodulesDrifted" : None, "error" : None}
+
+    statusResponse = run_command(["git", "status", "--porcelain=v2", "--untracked-files=no", "--ignore-submodules=none"], reportFolder, "git")
+    if statusResponse["returnCode"] != 0:
+        worktreeStatus["error"] = statusResponse["output"].strip()
+        return worktreeStatus
+
+    worktreeStatus["dirty"] = False
+    worktreeStatus["submodulesDrifted"] = False
+
+    for line in statusResponse["output"].splitlines():
+        statusFields = line.split(" ")
+        if statusFields[0] in ("1", "2") and len(statusFields) > 2 and statusFields[2].startswith("S"):
+            # S<c><m><u> - the submodule commit changed, or it has modified or untracked content
+            if statusFields[2][1] == "C":
+                worktreeStatus["submodulesDrifted"] = True
+            if statusFields[2][2] == "M":
+                worktreeStatus["dirty"] = True
+        elif statusFields[0] in ("1", "2", "u"):
+            worktreeStatus["dirty"] = True
+
+    # git status does not list submodules that were never checked out
+    for submodulePath in get_submodule_paths(reportFolder):
+        if not os.path.exists(os.path.join(reportFolder, submodulePath, ".git")):
+            worktreeStatus["submodulesDrifted"] = True
+
+    return worktreeStatus
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_submodule_paths(reportFolder):
+
+    gitModulesFile = os.path.join(reportFolder, ".gitmodules")
+    if not os.path.isfile(gitModulesFile):
+        return []
+
+    with open(gitModulesFile, "r") as filePtr:
+        return re.findall(r"^\s*path\s*=\s*(.+?)\s*$", filePtr.read(), re.MULTILINE)
@@ -0,0 +1,141 @@
+'''
+Copyright 2023 Flexera Software LLC
+See LICENSE.TXT for full license text
+SPDX-License-Identifier: MIT
+
+Author : sgeary
+Created On : Tue Oct 17 2023
+File : virtual_environment.py
+'''
+import logging, os, sys, json, hashlib, shutil, stat, datetime
+
+import report_requirements
+from command_runner import run_command
+
+logger = logging.getLogger(__name__)
+
+environmentMarkerFileName = "_environment.json"   # Written once the environment is complete
+currentEnvironmentLinkName = "current"             # Stable path to the environment in use
+
+#------------------------------------------------------------------------------------------------------------------------------
+def prepare_environment(environmentsFolder, reportRequirementsFiles, pythonCommand, pipInstallOptions=[], outputHandler=None):
+    logger.info("Entering prepare_environment")
+
+    # Environments are keyed by the requirements they were built from so an unchanged
+    # set of requirements reuses the existing environment without running pip at all
+    mergedRequirements = report_requirements.merge_requirements(reportRequirementsFiles)
+    environmentKey = get_environment_key(reportRequirementsFiles, mergedRequirements)
+
+    environmentFolder = os.path.join(environmentsFolder, environmentKey[:16])
+    environmentPython = get_environment_python(environmentFolder)
+
+    environmentDetails = {}
+    environmentDetails["folder"] = environmentFolder
+    environmentDetails["python"] = environmentPython
+    environmentDetails["conflicts"] = mergedRequirements["conflicts"]
+    environmentDetails["created"] = False
+
+    if is_environment_complete(environmentFolder, environmentKey):
+        logger.info("    Reusing environment %s" %environmentFolder)
+        update_current_environment(environmentsFolder, environmentFolder)
+        return environmentDetails
+
+    # Anything left in the folder is from an interrupted build
+    if os.path.isdir(environmentFolder):
+        shutil.rmtree(environmentFolder, onerror=change_file_read_attribute)
+    os.makedirs(environmentFolder)
+
+    logger.info("    Creating environment %s" %environmentFolder)
+    venvResponse = run_command(pythonCommand + ["-m", "venv", environmentFolder], environmentsFolder, "pip", outputHandler)
+    if venvResponse["returnCode"] != 0:
+        return {"error" : "Unable to create the virtual environment: %s" %venvResponse["output"]}
+
+    pipCommand = [environmentPython, "-m", "pip", "install", "--quiet", "--disable-pip-version-check"]
+
+    if mergedRequirements["conflicts"]:
+        # The reports can not share one resolution so install them one after another as pip would have globally
+        requirementsFiles = [reportRequirementsFiles[reportName] for reportName in sorted(reportRequirementsFiles)]
+    else:
+        mergedRequirementsFile = os.path.join(environmentFolder, "requirements.txt")
+        report_requirements.write_requirements_file(mergedRequirementsFile, mergedRequirements["requirements"], mergedRequirements["options"])
+        requirementsFiles = [mergedRequirementsFile]
+
+    for requirementsFile in requirementsFiles:
+        requirementsResponse = run_command(pipCommand + ["-r", requirementsFile] + pipInstallOptions, environmentFolder, "pip", outputHandler)
+        if requirementsResponse["returnCode"] != 0:
+            return {"error" : "Unable to install %s into the virtual environment: %s" %(requirementsFile, requirementsResponse["output"])}
+
+    environmentMarker = {}
+    environmentMarker["key"] = environmentKey
+    environmentMarker["created"] = datetime.datetime.now().isoformat()
+    environmentMarker["reports"] = sorted(reportRequirementsFiles)
+    with open(os.path.join(environmentFolder, environmentMarkerFileName), "w") as filePtr:
+        json.dump(environmentMarker, filePtr, indent=4)
+
+    environmentDetails["created"] = True
+    update_current_environment(environmentsFolder, environmentFolder)
+
+    return environmentDetails
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_environment_key(reportRequirementsFiles, mergedRequirements):
+
+    environmentHash = hashlib.sha256()
+    environmentHash.update(sys.platform.encode())
+
+    if mergedRequirements["conflicts"]:
+        # Each report is installed separately so every file (and the order) matters
+        for reportName in sorted(reportRequirementsFiles):
+            environmentHash.update(("%s %s\n" %(reportName, report_requirements.requirements_hash(reportRequirementsFiles[reportName]))).encode())
+    else:
+        for line in mergedRequirements["options"] + mergedRequirements["requirements"]:
+            environmentHash.update((line + "\n").encode())
+
+    return environmentHash.hexdigest()
+
+#------------------------------------------------------------------------------------------------------------------------------
+def get_environment_python(environmentFolder):
+    if sys.platform.startswith("win"):
+        return os.path.join(environmentFolder, "Scripts", "python.exe")
+    return os.path.join(environmentFolder, "bin", "python")
+
+#------------------------------------------------------------------------------------------------------------------------------
+def is_environment_complete(environmentFolder, environmentKey):
+
+    try:
+        with open(os.path.join(environmentFolder, environmentMarkerFileName), "r") as filePtr:
+            environmentMarker = json.load(filePtr)
+    except (ValueError, OSError):
+        return False
+
+    return environmentMarker.get("key") == environmentKey and os.path.isfile(get_environment_python(environmentFolder))
+
+#------------------------------------------------------------------------------------------------------------------------------
+def update_current_environment(environmentsFolder, environmentFolder):
+
+    currentLink = os.path.join(environmentsFolder, currentEnvironmentLinkName)
+    previousEnvironment = os.path.realpath(currentLink) if os.path.islink(currentLink) else None
+
+    # Point the stable link at the environment in use (replacing the link in one step)
+    temporaryLink = currentLink + ".tmp"
+    try:
+        if os.path.lexists(temporaryLink):
+            os.remove(temporaryLink)
+        os.symlink(os.path.basename(environmentFolder), temporaryLink)
+        os.replace(temporaryLink, currentLink)
+    except (OSError, NotImplementedError) as error:
+        logger.warning("    Unable to link %s to %s: %s" %(currentLink, environmentFolder, error))
+
+    # Keep the environment that was in use before this one for the reports that have not been updated yet
+    keepEnvironments = [os.path.realpath(environmentFolder), previousEnvironment]
+    for folderName in os.listdir(environmentsFolder):
+        folder = os.path.join(environmentsFolder, folderName)
+        if os.path.islink(folder) or not os.path.isdir(folder) or os.path.realpath(folder) in keepEnvironments:
+            continue
+        logger.info("    Removing unused environment %s" %folder)
+        shutil.rmtree(folder, onerror=change_file_read_attribute)
+
+#------------------------------------------------------------------------------------------------------------------------------
+def change_file_read_attribute(func, path, exc_info):
+    os.chmod(path, stat.S_IWRITE)
+    os.unlink(path)